@@ -1,17 +1,28 @@
 # analysis_engine.py
 # v12.0: Added advanced spread and quote freeze analysis.
 
-from typing import List, Dict
+from typing import List, Dict, Optional
 import numpy as np
-import pandas as pd
 from scipy.stats import shapiro
-import time
 
+import clock
+import runtime_config
 from state_manager import BrokerState
-from config import (
-    FEED_FREEZE_THRESHOLD, LEADER_FOLLOWER_WINDOW_MS, GLITCH_VERIFICATION_THRESHOLD_PIPS,
-    QUOTE_FREEZE_TICKS_WINDOW, QUOTE_FREEZE_UNIQUENESS_RATIO
-)
+from correlation import asof_align, pearson
+from config import CORRELATION_MODE, NORMALITY_TEST, NORMALITY_RECOMPUTE_INTERVALS
+
+def correlate_with_leader(leader: BrokerState, follower: BrokerState) -> Optional[float]:
+    """
+    Correlation of the follower's bids with the leader's on an as-of aligned time grid.
+    Returns None when there are fewer than 10 aligned points or the feeds are identical.
+    """
+    if CORRELATION_MODE == "batch":
+        grid, aligned_leader, aligned_follower = asof_align(leader.ticks.timestamp, leader.ticks.bid, follower.ticks.timestamp, follower.ticks.bid)
+        if grid.size < 10 or np.array_equal(aligned_leader, aligned_follower):
+            return None
+        return pearson(aligned_leader, aligned_follower)
+    # Streaming: only ticks newer than the previous pass are aligned and folded in
+    return follower.correlation_tracker.update(leader.broker_name, leader.ticks.timestamp, leader.ticks.bid, follower.ticks.timestamp, follower.ticks.bid)
 
 def analyze_glitches_and_correlation(brokers: List[BrokerState]):
     """Analyzes glitches, correlation, and sets the leader flag."""
@@ -24,62 +35,53 @@ def analyze_glitches_and_correlation(brokers: List[BrokerState]):
 
     leader = max(active_brokers, key=lambda b: len(b.ticks))
     leader.is_leader = True # Set leader flag
-    leader_prices = pd.Series([t['bid'] for t in leader.ticks], index=[t['timestamp'] for t in leader.ticks])
-    if leader_prices.empty: return
+    if len(leader.ticks) == 0: return
 
     for follower in active_brokers:
         if follower == leader:
             follower.correlation_with_leader = 1.0
             continue
         
-        follower_prices = pd.Series([t['bid'] for t in follower.ticks], index=[t['timestamp'] for t in follower.ticks])
-        if follower_prices.empty:
+        if len(follower.ticks) == 0:
             follower.correlation_with_leader = 0.0
             continue
         
-        combined = pd.concat([leader_prices, follower_prices], axis=1).ffill().bfill()
-        if combined.shape[0] < 10 or combined.iloc[:, 0].equals(combined.iloc[:, 1]):
+        correlation = correlate_with_leader(leader, follower)
+        if correlation is None:
              follower.correlation_with_leader = 1.0
              continue
         
-        correlation = combined.iloc[:, 0].corr(combined.iloc[:, 1])
         follower.correlation_with_leader = correlation if not np.isnan(correlation) else 0.0
 
-        glitches_to_verify = follower.potential_glitches
-        follower.potential_glitches = []
-        for glitch in glitches_to_verify:
-            leader_ticks_window = [t for t in leader.ticks if abs(t['timestamp'] - glitch['timestamp']) * 1000 <= LEADER_FOLLOWER_WINDOW_MS]
-            if not leader_ticks_window: continue
-            
-            avg_leader_price = np.mean([t['bid'] for t in leader_ticks_window])
-            deviation_pips = abs(glitch['bid'] - avg_leader_price) * 100000
-            
-            if deviation_pips > GLITCH_VERIFICATION_THRESHOLD_PIPS:
-                severity = min(deviation_pips / 5, 25)
-                follower.add_verified_glitch(glitch, severity)
-
-def get_base_kpis(state: BrokerState) -> Dict:
-    """Calculates basic KPIs like TPS, feed stability, and latency."""
-    now = time.time()
-    seconds_since_last_tick = now - state.last_update_time
-    is_frozen = seconds_since_last_tick > FEED_FREEZE_THRESHOLD
-    feed_stability_score = max(0, 100 - (seconds_since_last_tick * 5))
-    ticks_in_last_sec = len([t for t in state.ticks if t['timestamp'] > now - 1])
-    avg_latency_ms = np.mean(state.latency_samples) if state.latency_samples else 0
-
-    return {
-        "feed_stability_score": feed_stability_score,
-        "is_frozen": is_frozen,
-        "tps": ticks_in_last_sec,
-        "avg_latency_ms": avg_latency_ms
-    }
+        verify_glitches(leader, follower)
+
+def verify_glitches(leader: BrokerState, follower: BrokerState):
+    """
+    Checks all pending glitch candidates of a follower against the leader's average
+    bid within LEADER_FOLLOWER_WINDOW_MS of each candidate, in one vectorized batch.
+    """
+    glitches_to_verify = follower.potential_glitches
+    follower.potential_glitches = []
+    if not glitches_to_verify: return
+
+    glitch_times = np.array([g['timestamp'] for g in glitches_to_verify])
+    glitch_bids = np.array([g['bid'] for g in glitches_to_verify])
+    settings = runtime_config.current
+    avg_leader_prices, leader_tick_counts = leader.ticks.window_means('bid', glitch_times, settings.LEADER_FOLLOWER_WINDOW_MS / 1000)
+    deviations_pips = np.abs(glitch_bids - avg_leader_prices) * 100000
+
+    for glitch, tick_count, deviation_pips in zip(glitches_to_verify, leader_tick_counts.tolist(), deviations_pips.tolist()):
+        if tick_count == 0: continue
+        if deviation_pips > settings.GLITCH_VERIFICATION_THRESHOLD_PIPS:
+            severity = min(deviation_pips / 5, 25)
+            follower.add_verified_glitch(glitch, severity)
 
 def get_advanced_spread_kpis(state: BrokerState) -> Dict:
     """Calculates advanced spread KPIs."""
-    if not state.spread_samples:
+    spreads = state.spread_samples
+    if spreads.size == 0:
         return {"avg_spread": 0, "spread_std_dev": 0, "max_spread": 0}
     
-    spreads = list(state.spread_samples)
     return {
         "avg_spread": np.mean(spreads),
         "spread_std_dev": np.std(spreads),
@@ -88,36 +90,52 @@ def get_advanced_spread_kpis(state: BrokerState) -> Dict:
 
 def get_quote_freeze_kpi(state: BrokerState) -> Dict:
     """Calculates a KPI for quote freezing."""
-    ticks_to_check = list(state.ticks)[-QUOTE_FREEZE_TICKS_WINDOW:]
-    if len(ticks_to_check) < QUOTE_FREEZE_TICKS_WINDOW / 2:
+    window = runtime_config.current.QUOTE_FREEZE_TICKS_WINDOW
+    bids_to_check = state.ticks.last('bid', window)
+    if bids_to_check.size < window / 2:
         return {"uniqueness_ratio": 1.0} # Not enough data, assume OK
 
-    unique_prices = len(set(t['bid'] for t in ticks_to_check))
-    uniqueness_ratio = unique_prices / len(ticks_to_check)
+    unique_prices = np.unique(bids_to_check).size
+    uniqueness_ratio = unique_prices / bids_to_check.size
     return {"uniqueness_ratio": uniqueness_ratio}
 
-def get_authenticity_kpis(state: BrokerState) -> Dict:
+def get_tick_distribution_kpi(state: BrokerState) -> Dict:
+    """
+    Normality p-value of the recent tick intervals. Shapiro-Wilk results are reused
+    until NORMALITY_RECOMPUTE_INTERVALS new intervals have arrived; "jarque_bera"
+    reads the streaming moments instead.
+    """
     normality_p_value = 0.5
     if len(state.tick_intervals) >= 50:
-        try:
-            _, p_val = shapiro(list(state.tick_intervals))
-            normality_p_value = p_val if not np.isnan(p_val) else 0.0
-        except:
-            normality_p_value = 0.0
+        if NORMALITY_TEST == "jarque_bera":
+            normality_p_value = state.interval_moments.jarque_bera_p_value()
+        else:
+            tested_at, normality_p_value = state.normality_cache
+            interval_count = state.interval_moments.total
+            if tested_at is None or interval_count - tested_at >= NORMALITY_RECOMPUTE_INTERVALS:
+                try:
+                    _, p_val = shapiro(np.asarray(state.tick_intervals, dtype=np.float64))
+                    normality_p_value = p_val if not np.isnan(p_val) else 0.0
+                except:
+                    normality_p_value = 0.0
+                state.normality_cache = (interval_count, normality_p_value)
+
+    return {"tick_distribution_p_value": normality_p_value}
 
+def get_authenticity_kpis(state: BrokerState) -> Dict:
     return {
-        "tick_distribution_p_value": normality_p_value,
+        **get_tick_distribution_kpi(state),
         "correlation_with_leader": state.correlation_with_leader
     }
 
 def get_execution_kpis(state: BrokerState) -> Dict:
     asymmetric_slippage_ratio = 1.0
-    if len(state.slippage_samples) > 10:
-        all_slippages = [s['slippage_pips'] for s in state.slippage_samples]
-        positive_client_slippage = [s for s in all_slippages if s < -1e-9]
-        negative_client_slippage = [s for s in all_slippages if s > 1e-9]
-        avg_positive_client = abs(np.mean(positive_client_slippage)) if positive_client_slippage else 0
-        avg_negative_client = abs(np.mean(negative_client_slippage)) if negative_client_slippage else 0
+    all_slippages = state.slippage_pips()
+    if all_slippages.size > 10:
+        positive_client_slippage = all_slippages[all_slippages < -1e-9]
+        negative_client_slippage = all_slippages[all_slippages > 1e-9]
+        avg_positive_client = abs(np.mean(positive_client_slippage)) if positive_client_slippage.size else 0
+        avg_negative_client = abs(np.mean(negative_client_slippage)) if negative_client_slippage.size else 0
         
         if avg_positive_client > 1e-9:
             asymmetric_slippage_ratio = avg_negative_client / avg_positive_client
@@ -126,5 +144,45 @@ def get_execution_kpis(state: BrokerState) -> Dict:
             
     return {"asymmetric_slippage_ratio": asymmetric_slippage_ratio}
 
+def get_data_kpis(state: BrokerState) -> np.ndarray:
+    """
+    KPIs that depend only on the data a broker received (tick-interval normality,
+    slippage asymmetry, spread stats, quote freeze), as a vector over
+    DATA_KPI_COLUMNS. Cached per generation, so brokers without new data skip
+    the heavy work.
+    """
+    generation, kpis = state.data_kpi_cache
+    if generation != state.generation:
+        merged = {**get_tick_distribution_kpi(state), **get_execution_kpis(state), **get_advanced_spread_kpis(state), **get_quote_freeze_kpi(state)}
+        kpis = np.array([merged[name] for name in DATA_KPI_COLUMNS], dtype=np.float64)
+        state.data_kpi_cache = (state.generation, kpis)
+    return kpis
+
+# --- KPI stage ---
+DATA_KPI_COLUMNS = ('tick_distribution_p_value', 'asymmetric_slippage_ratio', 'avg_spread', 'spread_std_dev', 'max_spread', 'uniqueness_ratio')
+# Columns of the per-symbol KPI matrix; flags are stored as 0/1
+KPI_COLUMNS = ('is_leader', 'data_integrity_score', 'feed_stability_score', 'is_frozen', 'tps', 'avg_latency_ms', 'correlation_with_leader') + DATA_KPI_COLUMNS
+KPI_INDEX = {name: i for i, name in enumerate(KPI_COLUMNS)}
+
+def kpi_matrix(brokers: List[BrokerState], now: Optional[float] = None) -> np.ndarray:
+    """
+    All KPIs of one symbol as a dense brokers x KPI_COLUMNS matrix. The
+    time-dependent feed KPIs are computed for every broker at once; the data
+    KPIs are each broker's cached vector.
+    """
+    now = clock.now() if now is None else now
+    kpis = np.empty((len(brokers), len(KPI_COLUMNS)), dtype=np.float64)
+    seconds_since_last_tick = now - np.array([b.last_update_time for b in brokers], dtype=np.float64)
+    kpis[:, KPI_INDEX['is_leader']] = [b.is_leader for b in brokers]
+    kpis[:, KPI_INDEX['data_integrity_score']] = [100.0 - b.penalty_score for b in brokers]
+    kpis[:, KPI_INDEX['feed_stability_score']] = np.maximum(0, 100 - (seconds_since_last_tick * 5))
+    kpis[:, KPI_INDEX['is_frozen']] = seconds_since_last_tick > runtime_config.current.FEED_FREEZE_THRESHOLD
+    kpis[:, KPI_INDEX['tps']] = [np.count_nonzero(b.ticks.timestamp > now - 1) for b in brokers]
+    kpis[:, KPI_INDEX['avg_latency_ms']] = [np.mean(b.latency_samples) if len(b.latency_samples) else 0 for b in brokers]
+    kpis[:, KPI_INDEX['correlation_with_leader']] = [b.correlation_with_leader for b in brokers]
+    if brokers:
+        kpis[:, KPI_INDEX[DATA_KPI_COLUMNS[0]]:] = [get_data_kpis(b) for b in brokers]
+    return kpis
+
 def is_broker_frozen(state: BrokerState) -> bool:
-    return (time.time() - state.last_update_time) > FEED_FREEZE_THRESHOLD
+    return (clock.now() - state.last_update_time) > runtime_config.current.FEED_FREEZE_THRESHOLD
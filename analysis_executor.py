@@ -0,0 +1,169 @@
+# analysis_executor.py
+# v14.0: Runs each analysis cycle inline, in a worker thread, or sharded by symbol across worker processes.
+
+import asyncio
+import logging
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Tuple
+
+import analysis_engine
+import clock
+import runtime_config
+import scoring_engine
+from state_manager import BrokerState, BrokerSnapshot
+from correlation import LeaderCorrelationTracker
+from config import (
+    ANALYSIS_EXECUTOR, ANALYSIS_WORKERS, CORRELATION_MODE, CORRELATION_WINDOW,
+    CORRELATION_HALFLIFE, CORRELATION_LAG_MS
+)
+
+def symbol_signature(brokers: List[BrokerState]) -> Tuple:
+    """What the leader/glitch/correlation pass depends on: the runtime config version and each broker's data generation and frozen flag."""
+    return (runtime_config.current.version,) + tuple((b.broker_name, b.generation, analysis_engine.is_broker_frozen(b)) for b in brokers)
+
+def analyze_symbol(brokers: List[BrokerState], dirty: bool = True) -> Dict[str, Dict]:
+    """
+    Glitch/correlation analysis, penalty decay and scoring for one symbol (no history).
+    A clean symbol keeps its previous leader and correlations; decay and scoring always run.
+    """
+    if dirty:
+        analysis_engine.analyze_glitches_and_correlation(brokers)
+    for broker_state in brokers:
+        broker_state.apply_penalty_decay()
+    return scoring_engine.score_symbol(brokers)
+
+def analyze_snapshots(symbols: List[Tuple[str, List[BrokerSnapshot], bool]]) -> List[Tuple[str, Dict, Dict[str, Dict[str, Any]]]]:
+    """Analyzes detached snapshots and returns results plus per-broker state updates."""
+    output = []
+    for symbol, snapshots, dirty in symbols:
+        symbol_results = analyze_symbol(snapshots, dirty)
+        updates = {snapshot.broker_name: snapshot.analysis_updates() for snapshot in snapshots}
+        output.append((symbol, symbol_results, updates))
+    return output
+
+# --- Worker process side ---
+# Each shard is a single-process pool and always receives the same symbols, so
+# streaming correlation state can stay in the worker between cycles.
+_worker_trackers: Dict[Tuple[str, str], LeaderCorrelationTracker] = {}
+
+def analyze_shard(symbols: List[Tuple[str, List[BrokerSnapshot], bool]], settings: runtime_config.RuntimeConfig) -> List[Tuple[str, Dict, Dict[str, Dict[str, Any]]]]:
+    """Worker process entry point: adopts the cycle's runtime config, attaches the worker's trackers, then analyzes."""
+    runtime_config.current = settings
+    for symbol, snapshots, _ in symbols:
+        for snapshot in snapshots:
+            key = (symbol, snapshot.broker_name)
+            if key not in _worker_trackers:
+                _worker_trackers[key] = LeaderCorrelationTracker(CORRELATION_MODE, CORRELATION_WINDOW, CORRELATION_HALFLIFE, CORRELATION_LAG_MS / 1000)
+            snapshot.correlation_tracker = _worker_trackers[key]
+    return analyze_snapshots(symbols)
+
+# --- Event loop side ---
+class AnalysisExecutor:
+    """
+    Runs one analysis cycle over all symbols.
+
+    "inline" analyzes the live BrokerStates on the event loop (the original
+    behaviour). The other modes copy each broker into a BrokerSnapshot on the
+    event loop, analyze the snapshots elsewhere while ingestion keeps running,
+    and then merge the returned updates back in one step with no await in
+    between, so handlers never see a half-applied cycle:
+      - "thread": one background thread (NumPy/SciPy release the GIL); the
+        live correlation trackers are lent to the snapshots, since nothing
+        else touches them.
+      - "process": symbols are sharded over ANALYSIS_WORKERS single-process
+        pools by a stable hash; each worker keeps its own trackers.
+
+    In every mode a symbol whose brokers received nothing new (and none froze
+    or thawed) since the last cycle skips the leader/glitch/correlation pass.
+    """
+    def __init__(self, mode: str = ANALYSIS_EXECUTOR, workers: int = ANALYSIS_WORKERS):
+        self.mode = mode
+        self.workers = max(1, int(workers))
+        self._shards: List[ProcessPoolExecutor] = [] # created on the first sharded cycle
+        self._thread: ThreadPoolExecutor = None
+        self._signatures: Dict[str, Tuple] = {}  # symbol -> signature at its last full analysis
+
+    def shard_of(self, symbol: str) -> int:
+        return zlib.crc32(symbol.encode('utf-8')) % self.workers
+
+    async def run_cycle(self, all_brokers_by_symbol: Dict[str, List[BrokerState]]) -> Dict[str, Dict]:
+        signatures = {symbol: symbol_signature(brokers) for symbol, brokers in all_brokers_by_symbol.items()}
+        dirty = {symbol: self._signatures.get(symbol) != signature for symbol, signature in signatures.items()}
+        if self.mode == "process":
+            final_results = self._merge(all_brokers_by_symbol, await self._run_sharded(all_brokers_by_symbol, dirty))
+        elif self.mode == "thread":
+            final_results = self._merge(all_brokers_by_symbol, await self._run_threaded(all_brokers_by_symbol, dirty))
+        else:
+            final_results = {}
+            for symbol, brokers in all_brokers_by_symbol.items():
+                final_results[symbol] = analyze_symbol(brokers, dirty[symbol])
+                scoring_engine.record_score_history(brokers, final_results[symbol], clock.now())
+        self._signatures = signatures
+        return final_results
+
+    async def _run_threaded(self, all_brokers_by_symbol: Dict[str, List[BrokerState]], dirty: Dict[str, bool]) -> List[List]:
+        if self._thread is None:
+            self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+        payload = []
+        for symbol, brokers in all_brokers_by_symbol.items():
+            snapshots = []
+            for broker_state in brokers:
+                snapshot = broker_state.snapshot()
+                snapshot.correlation_tracker = broker_state.correlation_tracker
+                snapshots.append(snapshot)
+            payload.append((symbol, snapshots, dirty[symbol]))
+        loop = asyncio.get_running_loop()
+        return [await loop.run_in_executor(self._thread, analyze_snapshots, payload)]
+
+    def _new_shard(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+    async def _run_sharded(self, all_brokers_by_symbol: Dict[str, List[BrokerState]], dirty: Dict[str, bool]) -> List[List]:
+        if not self._shards:
+            self._shards = [self._new_shard() for _ in range(self.workers)]
+        payloads: List[List[Tuple[str, List[BrokerSnapshot], bool]]] = [[] for _ in self._shards]
+        for symbol, brokers in all_brokers_by_symbol.items():
+            payloads[self.shard_of(symbol)].append((symbol, [b.snapshot() for b in brokers], dirty[symbol]))
+
+        return await asyncio.gather(*[self._run_shard(index, payload) for index, payload in enumerate(payloads) if payload])
+
+    async def _run_shard(self, index: int, payload: List[Tuple[str, List[BrokerSnapshot], bool]]) -> List:
+        """
+        Runs one shard's payload. If its worker has died, the pool is replaced and
+        the payload re-sent with every symbol marked dirty, since the new worker
+        starts without correlation trackers.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._shards[index], analyze_shard, payload, runtime_config.current)
+        except BrokenProcessPool:
+            logging.warning(f"Analysis worker {index} died; restarting it")
+            self._shards[index].shutdown(wait=False, cancel_futures=True)
+            self._shards[index] = self._new_shard()
+            full = [(symbol, snapshots, True) for symbol, snapshots, _ in payload]
+            return await loop.run_in_executor(self._shards[index], analyze_shard, full, runtime_config.current)
+
+    def _merge(self, all_brokers_by_symbol: Dict[str, List[BrokerState]], outputs: List[List]) -> Dict[str, Dict]:
+        """Applies every snapshot's updates to the live states and records score history."""
+        final_results = {}
+        now = clock.now()
+        for output in outputs:
+            for symbol, symbol_results, updates in output:
+                brokers = all_brokers_by_symbol[symbol]
+                for broker_state in brokers:
+                    if broker_state.broker_name in updates:
+                        broker_state.apply_analysis_updates(updates[broker_state.broker_name])
+                scoring_engine.record_score_history(brokers, symbol_results, now)
+                final_results[symbol] = symbol_results
+        return final_results
+
+    def shutdown(self):
+        for shard in self._shards:
+            shard.shutdown(wait=False, cancel_futures=True)
+        self._shards = []
+        if self._thread is not None:
+            self._thread.shutdown(wait=False, cancel_futures=True)
+            self._thread = None
@@ -0,0 +1,173 @@
+# backtest.py
+# v14.0: Offline re-scoring of recorded ticks on a simulated clock.
+
+import argparse
+import logging
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+import clock
+import journal as tick_journal
+from state_manager import BrokerState, normalize_symbol
+from analysis_executor import analyze_symbol, symbol_signature
+from config import ANALYSIS_INTERVAL
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# One broker's recorded events, as parallel arrays sorted by time:
+# tick_time/bid/ask, slippage_time/slippage_pips/slippage_type, latency_time/latency_ms
+Feed = Dict[str, np.ndarray]
+
+SCORE_FIELDS = (
+    'quality_score', 'score_authenticity', 'score_integrity', 'score_execution',
+    'score_spread_level', 'score_spread_stability', 'score_feed_stability',
+    'score_quote_freeze', 'score_tps', 'is_frozen', 'is_leader',
+)
+
+def _feed(tick_time: np.ndarray, bid: np.ndarray, ask: np.ndarray) -> Feed:
+    empty = np.zeros(0)
+    return {'tick_time': tick_time, 'bid': bid, 'ask': ask,
+            'slippage_time': empty, 'slippage_pips': empty, 'slippage_type': np.zeros(0, dtype=np.uint8),
+            'latency_time': empty, 'latency_ms': empty}
+
+def load_csv(path: str) -> Dict[Tuple[str, str], Feed]:
+    """
+    Reads a tick CSV with `timestamp` (epoch seconds or ms, or a date string) or
+    MT5's `time_msc`, plus `bid` and `ask`. Without `broker`/`symbol` columns
+    the file must be named <broker>_<symbol>.csv.
+    """
+    frame = pd.read_csv(path)
+    frame.columns = [str(c).strip().strip('<>').lower() for c in frame.columns]
+    if 'time_msc' in frame.columns:
+        timestamps = frame['time_msc'].to_numpy(dtype=np.float64) / 1000
+    elif not pd.api.types.is_numeric_dtype(frame['timestamp']):
+        timestamps = pd.to_datetime(frame['timestamp']).to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+    else:
+        timestamps = frame['timestamp'].to_numpy(dtype=np.float64)
+        if timestamps.size and np.median(timestamps) > 1e11: timestamps = timestamps / 1000
+    if 'broker' not in frame.columns or 'symbol' not in frame.columns:
+        broker, _, symbol = os.path.splitext(os.path.basename(path))[0].rpartition('_')
+        frame['broker'], frame['symbol'] = frame.get('broker', broker), frame.get('symbol', symbol)
+    frame['time'] = timestamps
+    feeds = {}
+    for (broker, symbol), group in frame.groupby(['broker', 'symbol'], sort=False):
+        group = group.sort_values('time', kind='stable')
+        feeds[(str(broker), normalize_symbol(str(symbol)))] = _feed(
+            group['time'].to_numpy(dtype=np.float64), group['bid'].to_numpy(dtype=np.float64), group['ask'].to_numpy(dtype=np.float64))
+    return feeds
+
+def load_journal(directory: str) -> Dict[Tuple[str, str], Feed]:
+    """Reads every retained segment of a Griffin journal directory (ticks, slippage and latency samples)."""
+    streams, records = tick_journal.load(directory, -math.inf)
+    feeds = {}
+    for stream, names in enumerate(streams):
+        own = records[records['stream'] == stream]
+        ticks = own[own['kind'] == tick_journal.KIND_TICK]
+        ticks = ticks[np.argsort(ticks['timestamp'], kind='stable')]
+        feed = _feed(ticks['timestamp'], ticks['a'], ticks['b'])
+        slippage, latency = own[own['kind'] == tick_journal.KIND_SLIPPAGE], own[own['kind'] == tick_journal.KIND_LATENCY]
+        feed.update(slippage_time=slippage['timestamp'], slippage_pips=slippage['a'], slippage_type=slippage['flag'],
+                    latency_time=latency['timestamp'], latency_ms=latency['a'])
+        feeds[names] = feed
+    return feeds
+
+def load_feeds(paths: List[str]) -> Dict[str, Dict[str, Feed]]:
+    """Loads CSV files and journal directories, grouped as {symbol: {broker: feed}}."""
+    symbols: Dict[str, Dict[str, Feed]] = {}
+    for path in paths:
+        feeds = load_journal(path) if os.path.isdir(path) else load_csv(path)
+        for (broker, symbol), feed in feeds.items():
+            if broker in symbols.get(symbol, {}):
+                raise ValueError(f"{broker}/{symbol} appears in more than one input")
+            symbols.setdefault(symbol, {})[broker] = feed
+    return symbols
+
+def run_symbol(symbol: str, feeds: Dict[str, Feed], interval: float, fields: Tuple[str, ...] = SCORE_FIELDS) -> Dict[str, np.ndarray]:
+    """
+    Replays one symbol on a simulated clock: every `interval` seconds the ticks
+    and samples recorded up to that moment are applied in bulk, then the same
+    analysis and scoring as a live cycle runs. Returns one row per broker and
+    cycle with the requested KPI `fields`.
+    """
+    first = min((feed['tick_time'][0] for feed in feeds.values() if feed['tick_time'].size), default=None)
+    if first is None: return {}
+    last = max(feed['tick_time'][-1] for feed in feeds.values() if feed['tick_time'].size)
+    steps = np.arange(math.floor(first / interval) * interval + interval, last + interval, interval)
+
+    simulated = clock.SimulatedClock(first)
+    clock.set_source(simulated)
+    try:
+        brokers = [BrokerState(name, symbol) for name in feeds]
+        cursors = {name: {'tick': 0, 'slippage': 0, 'latency': 0} for name in feeds}
+        bounds = {name: {kind: np.searchsorted(feed[f'{kind}_time'], steps, side='right') for kind in ('tick', 'slippage', 'latency')}
+                  for name, feed in feeds.items()}
+        rows = {field: [] for field in fields}
+        row_time, row_broker = [], []
+        signature = None
+        for step, now in enumerate(steps.tolist()):
+            simulated.set(now)
+            for state in brokers:
+                feed, cursor, bound = feeds[state.broker_name], cursors[state.broker_name], bounds[state.broker_name]
+                lo, hi = cursor['tick'], bound['tick'][step]
+                if hi > lo: state.add_ticks(feed['bid'][lo:hi], feed['ask'][lo:hi], feed['tick_time'][lo:hi])
+                lo, hi = cursor['slippage'], bound['slippage'][step]
+                for kind, pips in zip(feed['slippage_type'][lo:hi].tolist(), feed['slippage_pips'][lo:hi].tolist()):
+                    state.slippage_samples.append({'type': tick_journal.ORDER_TYPES[kind] if kind < len(tick_journal.ORDER_TYPES) else '', 'slippage_pips': pips})
+                    state.generation += 1
+                lo, hi = cursor['latency'], bound['latency'][step]
+                for latency_ms in feed['latency_ms'][lo:hi].tolist(): state.add_latency_sample(latency_ms)
+                cursor.update(tick=bound['tick'][step], slippage=bound['slippage'][step], latency=bound['latency'][step])
+
+            previous, signature = signature, symbol_signature(brokers)
+            results = analyze_symbol(brokers, dirty=signature != previous)
+            for name, kpis in results.items():
+                row_time.append(now)
+                row_broker.append(name)
+                for field in fields: rows[field].append(kpis[field])
+    finally:
+        clock.set_source(time.time)
+
+    columns = {'timestamp': np.array(row_time), 'symbol': np.full(len(row_time), symbol), 'broker': np.array(row_broker)}
+    for field in fields:
+        columns[field] = np.array(rows[field], dtype=bool if field.startswith('is_') else np.float64)
+    return columns
+
+def run(symbols: Dict[str, Dict[str, Feed]], interval: float, workers: int) -> Dict[str, np.ndarray]:
+    """Runs every symbol (in parallel across processes when workers > 1) and concatenates the rows."""
+    if workers > 1 and len(symbols) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(symbols)), mp_context=multiprocessing.get_context("spawn")) as pool:
+            parts = list(pool.map(run_symbol, symbols.keys(), symbols.values(), [interval] * len(symbols)))
+    else:
+        parts = [run_symbol(symbol, feeds, interval) for symbol, feeds in symbols.items()]
+    parts = [part for part in parts if part]
+    if not parts: return {}
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score recorded ticks offline on a simulated clock.")
+    parser.add_argument('inputs', nargs='+', help="tick CSV files and/or journal directories")
+    parser.add_argument('-o', '--output', default='backtest_scores.npz', help="columnar output (.npz)")
+    parser.add_argument('--interval', type=float, default=ANALYSIS_INTERVAL, help="simulated seconds between analysis cycles")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="processes (symbols run in parallel)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    symbols = load_feeds(args.inputs)
+    ticks = sum(feed['tick_time'].size for feeds in symbols.values() for feed in feeds.values())
+    logging.info(f"Loaded {ticks} ticks for {len(symbols)} symbols in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    columns = run(symbols, args.interval, args.workers)
+    elapsed = time.perf_counter() - started
+    np.savez(args.output, **columns)
+    cycles = len(np.unique(columns['timestamp'])) if columns else 0
+    logging.info(f"Scored {len(columns.get('timestamp', []))} rows ({cycles} cycles) in {elapsed:.2f}s -> {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# checkpoint.py
+# v14.0: Periodic columnar checkpoints of all broker state for fast warm restarts.
+
+import json
+import os
+import weakref
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+import state_manager
+from state_manager import BrokerState
+from tick_buffer import TICK_FIELDS
+from score_history import RollupTier
+from journal import JournalPosition, ORDER_TYPES
+from config import CORRELATION_MODE, SCORE_HISTORY_TIERS, SPREAD_HISTORY_TIERS
+
+FORMAT_VERSION = 1
+GLITCH_COLUMNS = ('timestamp', 'bid', 'severity')
+
+def _ragged(arrays: List[np.ndarray], dtype=np.float64) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenates per-broker arrays into one column plus offsets (len = brokers + 1)."""
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=offsets[1:])
+    values = np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.zeros(0, dtype=dtype)
+    return values, offsets
+
+class _RingMirror:
+    """
+    The checkpoint's own copy of a ring's arrays (same slot layout), brought up to
+    date by copying only the slots written since the previous capture.
+    """
+    def __init__(self):
+        self.source: Optional[np.ndarray] = None
+        self.columns: Dict[str, np.ndarray] = {}
+        self.total = 0
+
+    def sync(self, columns: Dict[str, np.ndarray], total: int, reopened: int) -> Dict[str, np.ndarray]:
+        """`reopened`: slots before the previous total that may have changed since (a rollup's open bucket)."""
+        source = next(iter(columns.values()))
+        if source is not self.source or total < self.total: # new or replaced ring
+            self.source, self.columns = source, {name: column.copy() for name, column in columns.items()}
+        else:
+            first = max(self.total - reopened, total - len(source), 0)
+            if first < total:
+                slots = np.arange(first, total) % len(source)
+                for name, column in columns.items(): self.columns[name][slots] = column[slots]
+        self.total = total
+        return self.columns
+
+class _RingView(NamedTuple):
+    """The newest `count` slots of a mirrored ring column, put in order by the writer."""
+    column: np.ndarray
+    total: int
+    count: int
+
+    def resolve(self) -> np.ndarray:
+        return self.column[np.arange(self.total - self.count, self.total) % len(self.column)]
+
+# Keyed by the live ring (TimeframeAverager or RollupTier); dropped with it
+_mirrors: 'weakref.WeakKeyDictionary[Any, _RingMirror]' = weakref.WeakKeyDictionary()
+
+def _mirror(ring, total: int, reopened: int) -> Dict[str, np.ndarray]:
+    mirror = _mirrors.get(ring)
+    if mirror is None: mirror = _mirrors[ring] = _RingMirror()
+    return mirror.sync(ring.ring_columns(), total, reopened)
+
+def capture(instrument_states: Dict[str, Dict[str, BrokerState]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Takes what a checkpoint needs from every broker, plus a small JSON-able
+    metadata dict. Runs on the event loop, so it only takes references and
+    small copies: the score and spread history rings are mirrored by copying
+    the slots written since the last capture. write() builds the columns.
+    The parts stay valid until the next capture, which must not start before
+    the previous write has finished.
+    """
+    states = [state for brokers in instrument_states.values() for state in brokers.values()]
+    ragged: Dict[str, List[Any]] = {}
+    def add(name: str, values):
+        ragged.setdefault(name, []).append(values)
+
+    scalars: Dict[str, List[float]] = {name: [] for name in (
+        'last_update_time', 'last_tick_time', 'current_spread', 'penalty_score',
+        'last_penalty_decay_time', 'is_leader', 'correlation_with_leader', 'ticks_total',
+        'corr_cutoff', 'corr_mismatch', 'corr_total')}
+    meta = {'version': FORMAT_VERSION, 'correlation_mode': CORRELATION_MODE, 'brokers': [],
+            'rollup_resolutions': [resolution for resolution, _ in SCORE_HISTORY_TIERS],
+            'spread_resolutions': [resolution for resolution, _ in SPREAD_HISTORY_TIERS],
+            'leaders': [], 'verified_glitches': [], 'potential_glitches': []}
+    for state in states:
+        state.fold_spread_history()
+        meta['brokers'].append([state.broker_name, state.symbol])
+        add('ticks', state.ticks_copy()) # detached and never appended to; shared with analysis snapshots
+        add('tick_intervals', list(state.tick_intervals))
+        add('price_changes', list(state.price_change_stats.values))
+        add('slippage_pips', state.slippage_pips())
+        add('slippage_type', [ORDER_TYPES.index(s['type']) if s['type'] in ORDER_TYPES else 255 for s in state.slippage_samples])
+        add('latency', list(state.latency_samples))
+        raw = state.quality_score_history.raw
+        columns = _mirror(raw, raw.total, 0)
+        add('scores/timestamp', _RingView(columns['timestamp'], raw.total, len(raw)))
+        add('scores/value', _RingView(columns['value'], raw.total, len(raw)))
+        for prefix, tiers in (('rollup', state.quality_score_history.rollups), ('spread', state.spread_history)):
+            for i, tier in enumerate(tiers):
+                columns = _mirror(tier, tier.opened, 1)
+                for name in RollupTier.ROLLUP_COLUMNS: add(f'{prefix}{i}/{name}', _RingView(columns[name], tier.opened, len(tier)))
+        add('glitches', list(state.glitch_history))
+        stream = state.correlation_tracker.stream.export_state()
+        for name in ('shift', 'sums', 'x', 'y', 'neq'): add(f'corr/{name}', stream[name])
+        meta['leaders'].append(state.correlation_tracker.leader_name)
+        meta['verified_glitches'].append([dict(g) for g in state.verified_glitches])
+        meta['potential_glitches'].append([dict(g) for g in state.potential_glitches])
+
+        scalars['last_update_time'].append(state.last_update_time)
+        scalars['last_tick_time'].append(np.nan if state.last_tick_time is None else state.last_tick_time)
+        scalars['current_spread'].append(state.current_spread)
+        scalars['penalty_score'].append(state.penalty_score)
+        scalars['last_penalty_decay_time'].append(state.last_penalty_decay_time)
+        scalars['is_leader'].append(state.is_leader)
+        scalars['correlation_with_leader'].append(state.correlation_with_leader)
+        scalars['ticks_total'].append(state.ticks.total)
+        scalars['corr_cutoff'].append(state.correlation_tracker.cutoff)
+        scalars['corr_mismatch'].append(stream['mismatch'])
+        scalars['corr_total'].append(stream['total'])
+
+    return {'ragged': ragged, 'scalars': scalars}, meta
+
+def _columns(parts: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """One array per field holding all brokers back to back (with offsets), from capture()'s parts."""
+    ragged = dict(parts['ragged'])
+    if 'ticks' in ragged:
+        ticks = [buffer.__getstate__()['columns'] for buffer in ragged.pop('ticks')]
+        for name in TICK_FIELDS: ragged[f'ticks/{name}'] = [columns[name] for columns in ticks]
+    if 'glitches' in ragged:
+        glitches = [np.array(records, dtype=np.float64).reshape(-1, 3) for records in ragged.pop('glitches')]
+        for i, name in enumerate(GLITCH_COLUMNS): ragged[f'glitches/{name}'] = [records[:, i] for records in glitches]
+    columns = {f'scalar/{name}': np.array(values, dtype=np.float64) for name, values in parts['scalars'].items()}
+    for name, arrays in ragged.items():
+        dtype = np.uint8 if name == 'slippage_type' else (bool if name == 'corr/neq' else np.float64)
+        arrays = [np.asarray(a.resolve() if isinstance(a, _RingView) else a) for a in arrays]
+        columns[name], columns[f'{name}#offsets'] = _ragged(arrays, dtype)
+    return columns
+
+def write(path: str, parts: Dict[str, Any], meta: Dict[str, Any]):
+    """Builds the columns from capture()'s parts, writes them to a temporary file and atomically renames it over `path`."""
+    columns = _columns(parts)
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as f:
+        np.savez(f, meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8), **columns)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(temporary, path)
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(directory, os.O_DIRECTORY)
+        try: os.fsync(fd)
+        finally: os.close(fd)
+
+def load(path: str) -> Optional[JournalPosition]:
+    """
+    Restores every broker from the checkpoint at `path` into state_manager.instrument_states.
+    Returns the journal position the checkpoint covers, or None without a usable checkpoint.
+    """
+    if not os.path.exists(path): return None
+    with np.load(path) as archive:
+        columns = {name: archive[name] for name in archive.files}
+    meta = json.loads(columns.pop('meta').tobytes().decode('utf-8'))
+    if meta.get('version') != FORMAT_VERSION: return None
+
+    def ragged(name: str, i: int) -> np.ndarray:
+        offsets = columns[f'{name}#offsets']
+        return columns[name][offsets[i]:offsets[i + 1]]
+    def scalar(name: str, i: int) -> float:
+        return float(columns[f'scalar/{name}'][i])
+
+    for i, (broker, symbol) in enumerate(meta['brokers']):
+        state = state_manager.get_or_create_broker_state(broker, symbol)
+        state.ticks.restore({name: ragged(f'ticks/{name}', i) for name in TICK_FIELDS}, int(scalar('ticks_total', i)))
+        state.spreads_folded = state.ticks.total # restored ticks are already in the restored spread rollups
+        for value in ragged('tick_intervals', i).tolist(): state.interval_moments.push(value)
+        for value in ragged('price_changes', i).tolist(): state.price_change_stats.push(value)
+        state.slippage_samples.extend({'type': ORDER_TYPES[kind] if kind < len(ORDER_TYPES) else '', 'slippage_pips': pips}
+                                      for kind, pips in zip(ragged('slippage_type', i).tolist(), ragged('slippage_pips', i).tolist()))
+        state.latency_samples.extend(ragged('latency', i).tolist())
+        history = state.quality_score_history
+        history.raw.extend(ragged('scores/timestamp', i), ragged('scores/value', i))
+        for t, tier in enumerate(history.rollups):
+            if t < len(meta['rollup_resolutions']) and meta['rollup_resolutions'][t] == tier.resolution:
+                tier.restore_state({name: ragged(f'rollup{t}/{name}', i) for name in RollupTier.ROLLUP_COLUMNS})
+        spread_resolutions = meta.get('spread_resolutions', []) # absent in checkpoints written before spread history
+        for t, tier in enumerate(state.spread_history):
+            if t < len(spread_resolutions) and spread_resolutions[t] == tier.resolution:
+                tier.restore_state({name: ragged(f'spread{t}/{name}', i) for name in RollupTier.ROLLUP_COLUMNS})
+        if 'glitches/timestamp' in columns:
+            state.glitch_history.extend(zip(*(ragged(f'glitches/{name}', i).tolist() for name in GLITCH_COLUMNS)))
+        if meta.get('correlation_mode') == CORRELATION_MODE and meta['leaders'][i] is not None:
+            tracker = state.correlation_tracker
+            tracker.leader_name, tracker.cutoff = meta['leaders'][i], scalar('corr_cutoff', i)
+            stream = {name: ragged(f'corr/{name}', i) for name in ('shift', 'sums', 'x', 'y', 'neq')}
+            tracker.stream.restore_state({**stream, 'mismatch': scalar('corr_mismatch', i), 'total': scalar('corr_total', i)})
+        state.verified_glitches.extend(meta['verified_glitches'][i])
+        state.potential_glitches = meta['potential_glitches'][i]
+
+        last_tick_time = scalar('last_tick_time', i)
+        state.last_tick_time = None if np.isnan(last_tick_time) else last_tick_time
+        state.last_update_time = scalar('last_update_time', i)
+        state.current_spread = scalar('current_spread', i)
+        state.penalty_score = scalar('penalty_score', i)
+        state.last_penalty_decay_time = scalar('last_penalty_decay_time', i)
+        state.is_leader = bool(scalar('is_leader', i))
+        state.correlation_with_leader = scalar('correlation_with_leader', i)
+    position = meta.get('journal_position')
+    return tuple(position) if position else None
@@ -0,0 +1,26 @@
+# clock.py
+# v14.0: The time source read by analysis and scoring, so backtests can run on a simulated clock.
+
+import time
+from typing import Callable
+
+_source: Callable[[], float] = time.time
+
+def now() -> float:
+    return _source()
+
+def set_source(source: Callable[[], float]):
+    """Replaces the time source (e.g. with a SimulatedClock); time.time restores wall time."""
+    global _source
+    _source = source
+
+class SimulatedClock:
+    """A clock that only moves when told to."""
+    def __init__(self, start: float = 0.0):
+        self.time = float(start)
+
+    def __call__(self) -> float:
+        return self.time
+
+    def set(self, timestamp: float):
+        self.time = float(timestamp)
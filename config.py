@@ -2,23 +2,124 @@
 # v13.0: Added Timeframe Analysis
 # Central configuration file for the Griffin Engine.
 
+import os
+
 # --- Server Configuration ---
 HOST = "127.0.0.1"
 PORT = 5000
 ANALYSIS_INTERVAL = 1.0  # seconds
+# "inline" analyzes on the event loop; "thread" analyzes snapshots in a background
+# thread; "process" shards symbols across worker processes
+ANALYSIS_EXECUTOR = "thread"
+ANALYSIS_WORKERS = 4
+# Streaming ingest (/ws/ingest): frames waiting to be applied per collector connection
+INGEST_QUEUE_SIZE = 256
+INGEST_QUEUE_HIGH_WATERMARK = 192 # acks ask the collector to slow down above this depth
+SPREAD_BROADCAST_HZ = 10.0 # rate of coalesced spread_updates messages to dashboards
+# Dashboard WebSockets: outgoing messages buffered per client, and what to do when
+# a client falls behind ("drop" disconnects it, "latest" keeps only the newest message)
+CLIENT_QUEUE_SIZE = 64
+SLOW_CLIENT_POLICY = "drop"
+
+# --- Analysis Broadcast Deltas ---
+# analysis_delta patches are taken after rounding these fields to the given step
+# (one decimal is what the dashboard shows; feed stability moves 5 points per second
+# without ticks), so sub-display noise does not resend them every cycle.
+DELTA_FIELD_STEPS = {
+    'quality_score': 0.1, 'data_integrity_score': 0.1, 'avg_latency_ms': 0.1,
+    'avg_spread': 0.1, 'spread_std_dev': 0.1, 'max_spread': 0.1, 'correlation_with_leader': 0.01,
+    'feed_stability_score': 5.0, 'score_feed_stability': 5.0,
+    'score_authenticity': 0.1, 'score_integrity': 0.1, 'score_execution': 0.1, 'score_spread_level': 0.1,
+    'score_spread_stability': 0.1, 'score_quote_freeze': 0.1, 'score_tps': 0.1,
+    'timeframe_averages': 0.1, 'score_history': 0.1,
+}
+# Fields that change every cycle but only feed trend widgets are refreshed at most this often
+DELTA_SLOW_FIELDS = ('score_history', 'timeframe_averages', 'tps')
+DELTA_SLOW_INTERVAL = 5.0 # seconds
+# current_spread already streams through spread_updates, so deltas leave it out
+DELTA_SKIP_FIELDS = ('current_spread',)
+
+# --- Tick Timestamps ---
+# "server" stamps ticks on receipt; "event" uses the collector's timestamp (3rd CSV
+# field / frame record, epoch milliseconds on the same clock as /latency_test's
+# client_send_time_ms) shifted onto the server clock by a per-broker offset.
+TICK_TIME_SOURCE = "server"
+CLOCK_OFFSET_WINDOW = 500 # recent delay samples the offset estimate is taken from
+REORDER_WINDOW_MS = 250   # event-time slack before a tick is released to analysis
+REORDER_BUFFER_SIZE = 1000 # pending ticks per broker before the oldest are released early
 
 # --- Core Analysis Thresholds ---
 FEED_FREEZE_THRESHOLD = 10.0 # seconds
 LEADER_FOLLOWER_WINDOW_MS = 750 # milliseconds
 GLITCH_VERIFICATION_THRESHOLD_PIPS = 10.0
 DYNAMIC_THRESHOLD_STD_FACTOR = 3.5
+GLITCH_DETECTION_WINDOW = 50 # ticks of price change used for the dynamic threshold
 QUOTE_FREEZE_TICKS_WINDOW = 50 
 QUOTE_FREEZE_UNIQUENESS_RATIO = 0.1
+# Tick-interval normality: "shapiro" (cached, re-run after NORMALITY_RECOMPUTE_INTERVALS
+# new intervals) or "jarque_bera" (streaming skewness/kurtosis, updated every tick)
+NORMALITY_TEST = "shapiro"
+NORMALITY_RECOMPUTE_INTERVALS = 20
 
 # --- Data Buffer Sizes ---
 TICK_BUFFER_SIZE = 500
 # New: Increased history size for timeframe analysis (8 hours * 3600 seconds)
 MAX_SCORE_HISTORY_RECORDS = 8 * 3600 
+# Trailing windows (seconds) reported as `timeframe_averages`
+SCORE_TIMEFRAMES = {
+    "15m": 15 * 60,
+    "30m": 30 * 60,
+    "1h": 60 * 60,
+    "4h": 4 * 60 * 60,
+    "8h": 8 * 60 * 60,
+}
+# Rolled-up score history beyond the raw 1s records: (bucket seconds, bucket count)
+SCORE_HISTORY_TIERS = [
+    (10, 24 * 360),      # 10s buckets for 24 hours
+    (60, 7 * 24 * 60),   # 1m buckets for 7 days
+]
+# The journal only reaches JOURNAL_RETENTION back; older spread and glitch
+# history is served from these per-broker buffers (kept in checkpoints)
+SPREAD_HISTORY_TIERS = [
+    (10, 24 * 360),      # 10s buckets for 24 hours
+    (60, 7 * 24 * 60),   # 1m buckets for 7 days
+]
+GLITCH_HISTORY_SIZE = 5000 # newest verified glitches kept per broker
+
+# --- Journal (survives restarts) ---
+JOURNAL_ENABLED = True
+JOURNAL_DIR = "journal"
+JOURNAL_FLUSH_INTERVAL = 1.0 # seconds between batched writes (each followed by fsync)
+JOURNAL_SEGMENT_BYTES = 64 * 1024 * 1024
+JOURNAL_RETENTION = MAX_SCORE_HISTORY_RECORDS # seconds of journal kept on disk and replayed
+# Full-state checkpoint; startup loads it and replays only the journal written after it
+CHECKPOINT_PATH = JOURNAL_DIR + "/checkpoint.npz"
+CHECKPOINT_INTERVAL = 300 # seconds
+
+# --- History API ---
+HISTORY_DEFAULT_RANGE = 60 * 60 # seconds queried when no start is given
+HISTORY_DEFAULT_BUCKETS = 300
+HISTORY_MAX_BUCKETS = 5000
+HISTORY_GLITCH_LIMIT = 500
+
+# --- Runtime Configuration ---
+# Weights, thresholds and buffer sizes (see runtime_config.TUNABLES) can change
+# without a restart, through POST /api/admin/config or by editing this JSON file
+# (polled every analysis cycle). Changes apply at the start of the next cycle.
+RUNTIME_CONFIG_FILE = "runtime_config.json"
+# Admin endpoints are refused unless a token is configured; requests must then send
+# it in the X-Admin-Token header.
+ADMIN_TOKEN = os.environ.get("GRIFFIN_ADMIN_TOKEN") or None
+
+# --- Leader/Follower Correlation ---
+# "batch" re-aligns both full tick buffers every pass; "window" and "ewm" update a
+# streaming estimator with only the ticks that arrived since the previous pass.
+CORRELATION_MODE = "window"
+CORRELATION_WINDOW = 2 * TICK_BUFFER_SIZE # aligned samples kept in "window" mode
+CORRELATION_HALFLIFE = TICK_BUFFER_SIZE # samples, "ewm" mode
+# Streaming modes hold back this much of the newest data, since event-time ticks
+# can be released up to the reorder window out of order across brokers
+CORRELATION_LAG_MS = REORDER_WINDOW_MS if TICK_TIME_SOURCE == "event" else 0
 
 # --- Algorithmic Scoring Configuration ---
 PENALTY_DECAY_RATE = 0.995
@@ -0,0 +1,189 @@
+# correlation.py
+# v14.0: NumPy as-of alignment and correlation of leader/follower price feeds.
+
+from typing import Optional, Tuple
+import numpy as np
+
+def sorted_unique_series(timestamps: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the series ordered by time with one value per timestamp (the last
+    one received), which is what an as-of lookup needs.
+    """
+    if timestamps.size > 1 and np.any(timestamps[1:] < timestamps[:-1]):
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+    if timestamps.size > 1:
+        keep = np.empty(timestamps.size, dtype=bool)
+        keep[-1] = True
+        np.not_equal(timestamps[1:], timestamps[:-1], out=keep[:-1])
+        if not keep.all():
+            timestamps, values = timestamps[keep], values[keep]
+    return timestamps, values
+
+def asof_values(timestamps: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """
+    Samples a sorted, de-duplicated series at `grid`: the latest value at or before
+    each grid point, or the first value for grid points before the series starts
+    (forward fill, then back fill).
+    """
+    index = np.searchsorted(timestamps, grid, side='right') - 1
+    return values[np.maximum(index, 0)]
+
+def asof_align(leader_ts: np.ndarray, leader_values: np.ndarray,
+               follower_ts: np.ndarray, follower_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Aligns two price series on the union of their timestamps."""
+    leader_ts, leader_values = sorted_unique_series(leader_ts, leader_values)
+    follower_ts, follower_values = sorted_unique_series(follower_ts, follower_values)
+    grid = np.union1d(leader_ts, follower_ts)
+    return grid, asof_values(leader_ts, leader_values, grid), asof_values(follower_ts, follower_values, grid)
+
+def pearson(x: np.ndarray, y: np.ndarray) -> float:
+    """Pearson correlation; NaN when either side has no variance."""
+    x_dev, y_dev = x - x.mean(), y - y.mean()
+    denominator = np.sqrt(np.dot(x_dev, x_dev) * np.dot(y_dev, y_dev))
+    return float(np.dot(x_dev, y_dev) / denominator) if denominator > 0 else float('nan')
+
+class StreamingCorrelation:
+    """
+    Online Pearson correlation over aligned (x, y) samples.
+
+    "window" mode keeps exact co-moments of the last `window` samples (the
+    oldest samples are subtracted as they slide out); "ewm" mode decays every
+    sample's weight by half after `halflife` newer samples. Values are shifted
+    by the first sample seen so prices near 1.1 do not cancel catastrophically.
+    """
+    def __init__(self, mode: str = "window", window: int = 1000, halflife: float = 500):
+        self.mode = mode
+        self.window = int(window)
+        self.decay = 0.5 ** (1.0 / halflife)
+        self.reset()
+
+    def reset(self):
+        self._shift = None
+        self._sums = np.zeros(6)  # weight, x, y, xx, yy, xy
+        self._mismatch = 0.0      # weight of samples where x != y
+        self._x = np.zeros(self.window)
+        self._y = np.zeros(self.window)
+        self._neq = np.zeros(self.window, dtype=bool)
+        self.total = 0
+
+    @property
+    def count(self) -> int:
+        """Samples currently contributing (all samples seen in ewm mode)."""
+        return min(self.total, self.window) if self.mode == "window" else self.total
+
+    @staticmethod
+    def _moments(x: np.ndarray, y: np.ndarray, weights=None) -> np.ndarray:
+        w = np.ones_like(x) if weights is None else weights
+        return np.array([w.sum(), np.dot(w, x), np.dot(w, y), np.dot(w, x * x), np.dot(w, y * y), np.dot(w, x * y)])
+
+    def push(self, x: np.ndarray, y: np.ndarray):
+        if x.size == 0: return
+        if self._shift is None:
+            self._shift = (float(x[0]), float(y[0]))
+        neq = x != y
+        x, y = x - self._shift[0], y - self._shift[1]
+        if self.mode == "ewm":
+            weights = self.decay ** np.arange(x.size - 1, -1, -1, dtype=np.float64)
+            scale = self.decay ** x.size
+            self._sums = self._sums * scale + self._moments(x, y, weights)
+            self._mismatch = self._mismatch * scale + float(np.dot(weights, neq))
+            self.total += x.size
+            return
+
+        if x.size >= self.window:
+            # The whole window is replaced; keep ring slots aligned with sample indices.
+            self.total += x.size
+            slots = (self.total - self.window + np.arange(self.window)) % self.window
+            self._x[slots], self._y[slots], self._neq[slots] = x[-self.window:], y[-self.window:], neq[-self.window:]
+            self._resync()
+            return
+        offsets = self.total + np.arange(x.size)
+        slots = offsets % self.window
+        # Samples about to be overwritten leave the window.
+        leaving = slots[offsets >= self.window]
+        if leaving.size:
+            self._sums -= self._moments(self._x[leaving], self._y[leaving])
+            self._mismatch -= np.count_nonzero(self._neq[leaving])
+        self._x[slots], self._y[slots], self._neq[slots] = x, y, neq
+        self._sums += self._moments(x, y)
+        self._mismatch += np.count_nonzero(neq)
+        wrapped = (self.total + x.size) // self.window > self.total // self.window
+        self.total += x.size
+        if wrapped: self._resync()
+
+    def _resync(self):
+        """Recomputes the window's co-moments exactly (once per wrap) to bound drift."""
+        n = self.count
+        self._sums = self._moments(self._x[:n], self._y[:n]) if n < self.window else self._moments(self._x, self._y)
+        self._mismatch = float(np.count_nonzero(self._neq[:n]))
+
+    def export_state(self) -> dict:
+        """Everything needed to resume the stream (for checkpoints)."""
+        shift = self._shift if self._shift is not None else (np.nan, np.nan)
+        return {'shift': np.array(shift), 'sums': self._sums.copy(), 'mismatch': self._mismatch, 'total': self.total,
+                'x': self._x.copy(), 'y': self._y.copy(), 'neq': self._neq.copy()}
+
+    def restore_state(self, state: dict):
+        if state['x'].size != self.window: return # window size changed; start over
+        self._shift = None if np.isnan(state['shift'][0]) else tuple(float(v) for v in state['shift'])
+        self._sums, self._mismatch, self.total = np.array(state['sums'], dtype=np.float64), float(state['mismatch']), int(state['total'])
+        self._x, self._y, self._neq = state['x'].copy(), state['y'].copy(), state['neq'].astype(bool)
+
+    @property
+    def identical(self) -> bool:
+        return self._mismatch <= 0
+
+    def value(self) -> float:
+        """Pearson correlation of the current samples; NaN without variance."""
+        w, sx, sy, sxx, syy, sxy = self._sums
+        if w <= 0: return float('nan')
+        mx, my = sx / w, sy / w
+        cov, var_x, var_y = sxy / w - mx * my, sxx / w - mx * mx, syy / w - my * my
+        if var_x <= 0 or var_y <= 0: return float('nan')
+        return float(np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0))
+
+def _series_from(timestamps: np.ndarray, values: np.ndarray, cutoff: float) -> Tuple[np.ndarray, np.ndarray]:
+    """The part of a feed needed to sample it after `cutoff`: the last tick at or before it onwards."""
+    start = max(int(np.searchsorted(timestamps, cutoff, side='right')) - 1, 0)
+    return sorted_unique_series(timestamps[start:], values[start:])
+
+class LeaderCorrelationTracker:
+    """
+    Incremental correlation of one follower with the current leader.
+
+    Each pass only aligns the ticks that arrived after the previous pass (on the
+    union of both feeds' new timestamps, as-of sampled) and feeds them into a
+    StreamingCorrelation, so the cost is O(new ticks) instead of O(window).
+    The tracker starts over whenever the leader changes.
+
+    Only the time up to `lag` seconds before the newest tick of either feed is
+    consumed. Event-time ticks can be released up to the reorder window late,
+    and a tick stamped before the cutoff could no longer be aligned.
+    """
+    def __init__(self, mode: str, window: int, halflife: float, lag: float = 0.0):
+        self.stream = StreamingCorrelation(mode, window, halflife)
+        self.lag = float(lag)
+        self.leader_name = None
+        self.cutoff = -np.inf
+
+    def update(self, leader_name: str, leader_ts: np.ndarray, leader_values: np.ndarray,
+               follower_ts: np.ndarray, follower_values: np.ndarray) -> Optional[float]:
+        if leader_name != self.leader_name:
+            self.leader_name, self.cutoff = leader_name, -np.inf
+            self.stream.reset()
+        leader_ts, leader_values = _series_from(leader_ts, leader_values, self.cutoff)
+        follower_ts, follower_values = _series_from(follower_ts, follower_values, self.cutoff)
+        grid = np.union1d(leader_ts[leader_ts > self.cutoff], follower_ts[follower_ts > self.cutoff])
+        if grid.size and self.lag > 0:
+            grid = grid[grid <= grid[-1] - self.lag]
+        if grid.size:
+            self.stream.push(asof_values(leader_ts, leader_values, grid), asof_values(follower_ts, follower_values, grid))
+            self.cutoff = float(grid[-1])
+        return self.correlation()
+
+    def correlation(self) -> Optional[float]:
+        """The current correlation, or None with fewer than 10 aligned points or identical feeds."""
+        if self.stream.count < 10 or self.stream.identical:
+            return None
+        return self.stream.value()
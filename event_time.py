@@ -0,0 +1,71 @@
+# event_time.py
+# v14.0: Collector clock offsets and tick reordering for event-time ingestion.
+
+import heapq
+import math
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
+
+class ClockOffsetEstimator:
+    """
+    Offset (seconds) that maps one collector's clock onto the server clock.
+
+    Every sample is `server receipt time - collector send time`, i.e. the clock
+    offset plus that message's transport and queueing delay. The least delayed
+    recent sample is the best estimate, so the offset is the minimum over the
+    last `window` samples (kept with a monotonic deque, O(1) amortized).
+    """
+    def __init__(self, window: int):
+        self.window = int(window)
+        self._samples: Deque[Tuple[int, float]] = deque() # (sequence, delay), delays increasing
+        self._seq = 0
+
+    def add(self, delay: float):
+        while self._samples and self._samples[-1][1] >= delay:
+            self._samples.pop()
+        self._samples.append((self._seq, delay))
+        self._seq += 1
+        while self._samples[0][0] < self._seq - self.window:
+            self._samples.popleft()
+
+    @property
+    def offset(self) -> Optional[float]:
+        return self._samples[0][1] if self._samples else None
+
+class ReorderBuffer:
+    """
+    Holds ticks back until event time has moved `window` seconds past them, so
+    slightly out-of-order arrivals are released in timestamp order. When more
+    than `capacity` ticks are pending the oldest are released early. Ticks older
+    than the last released one can no longer be placed and are counted as late.
+    """
+    def __init__(self, window: float, capacity: int):
+        self.window = float(window)
+        self.capacity = int(capacity)
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._seq = 0
+        self.newest = -math.inf          # newest event time seen
+        self.released_until = -math.inf  # event time of the last released tick
+        self.late = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, timestamp: float, item: Any) -> List[Tuple[float, Any]]:
+        """Adds a tick and returns the ticks that are now safe to apply, oldest first."""
+        if timestamp < self.released_until:
+            self.late += 1
+            return []
+        heapq.heappush(self._heap, (timestamp, self._seq, item))
+        self._seq += 1
+        if timestamp > self.newest: self.newest = timestamp
+        return self.release(self.newest - self.window)
+
+    def release(self, until: float) -> List[Tuple[float, Any]]:
+        """Pops every tick at or before `until` (and any overflow beyond capacity)."""
+        released = []
+        while self._heap and (self._heap[0][0] <= until or len(self._heap) > self.capacity):
+            timestamp, _, item = heapq.heappop(self._heap)
+            self.released_until = timestamp
+            released.append((timestamp, item))
+        return released
@@ -21,6 +21,8 @@ function normalizeSpreadValues(data) {
     for (const symbol in newData) {
         for (const brokerName in newData[symbol]) {
             const brokerData = newData[symbol][brokerName];
+            // Delta payloads may carry null for removed entries
+            if (!brokerData || typeof brokerData !== 'object') continue;
             const fieldsToNormalize = ['avg_spread', 'max_spread', 'spread_std_dev', 'current_spread'];
 
             fieldsToNormalize.forEach(field => {
@@ -36,6 +38,23 @@ function normalizeSpreadValues(data) {
     return newData;
 }
 
+// Applies a JSON merge patch (RFC 7386) from an `analysis_delta` message in place.
+// Nested objects are merged, null removes a key, anything else replaces the value.
+function applyMergePatch(target, patch) {
+    for (const key in patch) {
+        const value = patch[key];
+        if (value === null) {
+            delete target[key];
+        } else if (typeof value === 'object' && !Array.isArray(value)
+            && typeof target[key] === 'object' && target[key] !== null && !Array.isArray(target[key])) {
+            applyMergePatch(target[key], value);
+        } else {
+            target[key] = value;
+        }
+    }
+    return target;
+}
+
 
 export const liveData = readable(initialState, (set) => {
     if (!browser) return;
@@ -71,6 +90,25 @@ export const liveData = readable(initialState, (set) => {
                         // با ارسال یک کپی جدید از آبجکت، Svelte را مجبور به آپدیت می‌کنیم
                         set({ status: 'connected', data: { ...currentData } });
                     }
+                } else if (messageData.type === 'spread_updates') {
+                    // Batched spread updates, flushed by the server at a fixed rate
+                    let changed = false;
+                    for (const { symbol, broker, current_spread } of messageData.updates) {
+                        if (currentData[symbol] && currentData[symbol][broker]) {
+                            currentData[symbol][broker].current_spread = current_spread / SPREAD_DIVISOR;
+                            changed = true;
+                        }
+                    }
+                    if (changed) {
+                        set({ status: 'connected', data: { ...currentData } });
+                    }
+                } else if (messageData.type === 'analysis_delta') {
+                    // Only the fields that changed since the previous analysis cycle
+                    if (Object.keys(currentData).length === 0) {
+                        socket.send(JSON.stringify({ type: 'request_full_analysis' }));
+                    }
+                    currentData = applyMergePatch(currentData, normalizeSpreadValues(messageData.payload));
+                    set({ status: 'connected', data: { ...currentData } });
                 } else if (messageData.type === 'full_analysis') {
                     // اگر پیام حاوی تحلیل کامل است
                     const normalizedData = normalizeSpreadValues(messageData.payload);
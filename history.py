@@ -0,0 +1,138 @@
+# history.py
+# v14.0: Time-range queries over score, spread and glitch history with server-side downsampling.
+
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+import clock
+import state_manager
+from state_manager import BrokerState
+from score_history import RollupTier
+from journal import JournalReader, JOURNAL_RECORD, KIND_TICK, KIND_GLITCH
+from config import JOURNAL_DIR, JOURNAL_RETENTION
+
+SERIES_FIELDS = ('timestamp', 'min', 'max', 'avg', 'count')
+
+_reader = JournalReader(JOURNAL_DIR)
+
+def downsample_buckets(timestamps: np.ndarray, totals: np.ndarray, counts: np.ndarray, mins: np.ndarray,
+                       maxs: np.ndarray, start: float, end: float, buckets: int) -> Dict[str, np.ndarray]:
+    """
+    Folds pre-aggregated points (sum, count, min, max at a timestamp) within
+    [start, end) into `buckets` equal-width buckets. Empty buckets are omitted;
+    `timestamp` is each bucket's start.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    mask = (timestamps >= start) & (timestamps < end)
+    if not mask.any():
+        return {name: np.zeros(0) for name in SERIES_FIELDS}
+    width = (end - start) / buckets
+    index = np.minimum(((timestamps[mask] - start) // width).astype(np.int64), buckets - 1)
+    order = np.argsort(index, kind='stable')
+    index = index[order]
+    totals, counts = np.asarray(totals, dtype=np.float64)[mask][order], np.asarray(counts, dtype=np.float64)[mask][order]
+    mins, maxs = np.asarray(mins, dtype=np.float64)[mask][order], np.asarray(maxs, dtype=np.float64)[mask][order]
+    first = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    count = np.add.reduceat(counts, first)
+    return {
+        'timestamp': start + index[first] * width,
+        'min': np.minimum.reduceat(mins, first),
+        'max': np.maximum.reduceat(maxs, first),
+        'avg': np.add.reduceat(totals, first) / count,
+        'count': count.astype(np.int64),
+    }
+
+def downsample(timestamps: np.ndarray, values: np.ndarray, start: float, end: float, buckets: int) -> Dict[str, np.ndarray]:
+    """Min/max/avg/count of raw points per bucket (see downsample_buckets)."""
+    values = np.asarray(values, dtype=np.float64)
+    return downsample_buckets(timestamps, values, np.ones(len(values)), values, values, start, end, buckets)
+
+def _pick_source(raw_oldest: float, tiers: List[RollupTier], start: float) -> Tuple[str, Optional[Dict[str, np.ndarray]]]:
+    """
+    The finest source that reaches back to `start`: 'raw' (returned without
+    columns), then each rollup tier. If none does, the finest one reaching as
+    far back as any is used.
+    """
+    sources: List[Tuple[str, Optional[Dict[str, np.ndarray]]]] = [('raw', None)]
+    oldest = [raw_oldest]
+    for tier in tiers:
+        columns = tier.export_state()
+        sources.append((f'{tier.resolution:g}s', columns))
+        # The first bucket's data is only known to start somewhere before its end.
+        oldest.append(columns['bucket_start'][0] + tier.resolution if len(tier) else np.inf)
+    reach = max(start, min(oldest))
+    for source, first in zip(sources, oldest):
+        if first <= reach: return source
+    return sources[-1]
+
+def _rollup_series(name: str, columns: Dict[str, np.ndarray], start: float, end: float, buckets: int) -> Dict[str, Any]:
+    return {'source': name, **downsample_buckets(columns['bucket_start'], columns['total'], columns['count'],
+                                                 columns['min'], columns['max'], start, end, buckets)}
+
+def score_series(state: BrokerState, start: float, end: float, buckets: int) -> Dict[str, Any]:
+    """Downsampled quality scores from the raw 1s records or, further back, the rollups."""
+    history = state.quality_score_history
+    timestamps = history.raw.last_timestamps(len(history))
+    name, columns = _pick_source(timestamps[0] if len(timestamps) else np.inf, history.rollups, start)
+    if columns is not None:
+        return _rollup_series(name, columns, start, end, buckets)
+    return {'source': name, **downsample(timestamps, history.last(len(history)), start, end, buckets)}
+
+def _journal_records(kind: int, state: BrokerState, start: float, end: float) -> np.ndarray:
+    stream = _reader.stream_id(state.broker_name, state.symbol)
+    if stream is None: return np.zeros(0, dtype=JOURNAL_RECORD)
+    return _reader.read(kind, stream, start, end)
+
+def _journal_oldest() -> float:
+    """How far back the journal is guaranteed to reach (inf without a journal)."""
+    return clock.now() - JOURNAL_RETENTION if state_manager.journal is not None else np.inf
+
+def spread_series(state: BrokerState, start: float, end: float, buckets: int) -> Dict[str, Any]:
+    """
+    Downsampled spreads (points) from every journaled tick (or the in-memory tick
+    buffer without a journal) or, past that, the broker's spread rollups.
+    """
+    raw_oldest = _journal_oldest()
+    if state_manager.journal is None:
+        raw_oldest = state.ticks.timestamp[0] if state.ticks else np.inf
+    name, columns = _pick_source(raw_oldest, state.spread_history, start)
+    if columns is not None:
+        return _rollup_series(name, columns, start, end, buckets)
+    if state_manager.journal is None:
+        return {'source': 'memory', **downsample(state.ticks.timestamp, state.ticks.spread, start, end, buckets)}
+    ticks = _journal_records(KIND_TICK, state, start, end)
+    ticks = ticks[ticks['b'] > ticks['a']]
+    return {'source': 'journal', **downsample(ticks['timestamp'], (ticks['b'] - ticks['a']) * 100000, start, end, buckets)}
+
+def glitch_log(state: BrokerState, start: float, end: float, limit: int) -> Dict[str, Any]:
+    """
+    Verified glitches in [start, end), newest first, at most `limit`: from the
+    journal when it reaches back to `start`, otherwise from the newest
+    GLITCH_HISTORY_SIZE glitches kept in memory.
+    """
+    if start < _journal_oldest():
+        glitches = [{'timestamp': t, 'bid': bid, 'severity': severity}
+                    for t, bid, severity in sorted(state.glitch_history, reverse=True) if start <= t < end]
+        return {'source': 'memory', 'total': len(glitches), 'glitches': glitches[:limit]}
+    records = _journal_records(KIND_GLITCH, state, start, end)
+    records = records[np.argsort(-records['timestamp'], kind='stable')]
+    glitches = [{'timestamp': t, 'bid': bid, 'severity': severity}
+                for t, bid, severity in zip(records['timestamp'][:limit].tolist(), records['a'][:limit].tolist(), records['b'][:limit].tolist())]
+    return {'source': 'journal', 'total': int(records.size), 'glitches': glitches}
+
+def query(kind: str, symbol: str, broker: Optional[str], start: float, end: float, size: int) -> Dict[str, Any]:
+    """
+    Runs one history query for a symbol and one or all of its brokers.
+    `size` is the bucket count for series and the row limit for glitch logs.
+    """
+    symbol = state_manager.normalize_symbol(symbol)
+    brokers = state_manager.instrument_states.get(symbol, {})
+    if broker is not None:
+        brokers = {broker: brokers[broker]} if broker in brokers else {}
+    if not brokers:
+        return {"status": "error", "detail": f"No data for {symbol}" + (f" / {broker}" if broker else "")}
+    if not end > start:
+        return {"status": "error", "detail": "end must be after start"}
+    handler = {'scores': score_series, 'spreads': spread_series, 'glitches': glitch_log}[kind]
+    return {"status": "success", "symbol": symbol, "start": start, "end": end,
+            "brokers": {name: handler(state, start, end, size) for name, state in brokers.items()}}
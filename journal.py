@@ -0,0 +1,275 @@
+# journal.py
+# v14.0: Append-only binary journal of ticks, samples and scores, replayed via mmap on startup.
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# Every event is one fixed-width 32-byte record. `stream` indexes the
+# (broker, symbol) pairs listed in STREAMS_FILE, one JSON array per line, so
+# any name (tabs, blanks, empty) keeps its line and every later index aligned.
+KIND_TICK, KIND_SLIPPAGE, KIND_LATENCY, KIND_SCORE, KIND_GLITCH = 1, 2, 3, 4, 5
+JOURNAL_RECORD = np.dtype([
+    ('kind', 'u1'), ('flag', 'u1'), ('stream', '<u2'), ('reserved', '<u4'),
+    ('timestamp', '<f8'), ('a', '<f8'), ('b', '<f8'),
+])
+# tick: a=bid, b=ask | slippage: a=slippage_pips, flag=order type | latency: a=ms | score: a=score
+# glitch (verified): timestamp of the glitch tick, a=bid, b=severity
+ORDER_TYPES = ('BUY', 'SELL')
+MAX_STREAMS = np.iinfo(JOURNAL_RECORD['stream']).max + 1
+STREAMS_FILE = 'streams.jsonl'
+LEGACY_STREAMS_FILE = 'streams.txt' # tab-separated names of earlier journals, converted on open
+SEGMENT_PREFIX, SEGMENT_SUFFIX = 'segment-', '.bin'
+
+def read_streams(directory: str) -> List[Tuple[str, str]]:
+    """
+    The (broker, symbol) of every stream, by index. A line without its newline
+    (crash mid-write) is ignored: no record can refer to it, since names are
+    synced before the records that use them.
+    """
+    path = os.path.join(directory, STREAMS_FILE)
+    if not os.path.exists(path):
+        legacy = os.path.join(directory, LEGACY_STREAMS_FILE)
+        if not os.path.exists(legacy): return []
+        with open(legacy, encoding='utf-8') as f:
+            return [tuple(line[:-1].split('\t', 1)) for line in f if line.endswith('\n')]
+    with open(path, encoding='utf-8') as f:
+        return [tuple(json.loads(line)) for line in f if line.endswith('\n')]
+
+# A position in the journal: (segment file name, byte offset). Records written
+# after a checkpoint start at its position.
+JournalPosition = Tuple[str, int]
+
+def list_segments(directory: str) -> List[Tuple[float, str]]:
+    """(start time, path) of every segment, oldest first. Segments are named after their first write (ms)."""
+    segments = []
+    if not os.path.isdir(directory): return segments
+    for name in os.listdir(directory):
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            start_ms = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            segments.append((start_ms / 1000, os.path.join(directory, name)))
+    return sorted(segments)
+
+def load(directory: str, since: float, position: Optional[JournalPosition] = None) -> Tuple[List[Tuple[str, str]], np.ndarray]:
+    """
+    Memory-maps the segments that can hold records newer than `since` (and, given
+    a checkpoint position, only what was written after it) and returns the stream
+    names plus those records in write order. A torn record at the end of a
+    segment (crash mid-write) is ignored.
+    """
+    segments = list_segments(directory)
+    names = [os.path.basename(path) for _, path in segments]
+    first, first_record = 0, 0
+    if position is not None and position[0] in names:
+        first, first_record = names.index(position[0]), position[1] // JOURNAL_RECORD.itemsize
+    parts = []
+    for i, (start, path) in enumerate(segments):
+        end = segments[i + 1][0] if i + 1 < len(segments) else np.inf
+        count = os.path.getsize(path) // JOURNAL_RECORD.itemsize
+        skip = first_record if i == first else 0
+        if i < first or end < since or count <= skip: continue
+        records = np.memmap(path, dtype=JOURNAL_RECORD, mode='r', shape=(count,))[skip:]
+        parts.append(np.array(records[records['timestamp'] >= since]))
+        del records
+    records = np.concatenate(parts) if parts else np.zeros(0, dtype=JOURNAL_RECORD)
+    return read_streams(directory), records
+
+INDEX_BLOCK = 4096 # records per block of the sparse time index
+
+class JournalReader:
+    """
+    Time-range reads over the journal segments. Each segment gets a sparse index
+    (min/max timestamp of every INDEX_BLOCK records), built lazily and extended
+    as the segment grows, so a query only maps and scans blocks that can
+    overlap the range. Records need not be strictly time-ordered.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._index: Dict[str, Tuple[int, np.ndarray, np.ndarray]] = {} # path -> (records indexed, block mins, block maxs)
+        self._streams: Dict[Tuple[str, str], int] = {}
+        self._streams_version: Optional[Tuple] = None
+        self._lock = threading.Lock()
+
+    def _streams_file_version(self) -> Tuple:
+        version = []
+        for name in (STREAMS_FILE, LEGACY_STREAMS_FILE):
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+                version.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    def stream_id(self, broker: str, symbol: str) -> Optional[int]:
+        """
+        The stream index of a (broker, symbol), or None if it was never journaled.
+        Names are cached and re-read only when the streams file's size or mtime changes.
+        """
+        version = self._streams_file_version()
+        with self._lock:
+            if version != self._streams_version:
+                self._streams = {}
+                for i, names in enumerate(read_streams(self.directory)): self._streams.setdefault(names, i)
+                self._streams_version = version
+            return self._streams.get((broker, symbol))
+
+    def _block_bounds(self, path: str, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            indexed, mins, maxs = self._index.get(path, (0, np.zeros(0), np.zeros(0)))
+            if count > indexed:
+                complete = indexed // INDEX_BLOCK # the last partial block is re-indexed
+                first = complete * INDEX_BLOCK
+                timestamps = np.memmap(path, dtype=JOURNAL_RECORD, mode='r', shape=(count,))['timestamp'][first:]
+                starts = np.arange(0, len(timestamps), INDEX_BLOCK)
+                mins = np.concatenate((mins[:complete], np.minimum.reduceat(timestamps, starts)))
+                maxs = np.concatenate((maxs[:complete], np.maximum.reduceat(timestamps, starts)))
+                self._index[path] = (count, mins, maxs)
+            return mins, maxs
+
+    def read(self, kind: int, stream: int, start: float, end: float) -> np.ndarray:
+        """Records of one kind and stream with start <= timestamp < end, in write order."""
+        segments = list_segments(self.directory)
+        live = {path for _, path in segments}
+        with self._lock:
+            for path in [p for p in self._index if p not in live]: del self._index[path] # pruned segments
+        parts = []
+        for _, path in segments:
+            count = os.path.getsize(path) // JOURNAL_RECORD.itemsize
+            if count == 0: continue
+            mins, maxs = self._block_bounds(path, count)
+            blocks = np.flatnonzero((maxs >= start) & (mins < end))
+            if blocks.size == 0: continue
+            records = np.memmap(path, dtype=JOURNAL_RECORD, mode='r', shape=(count,))
+            for run in np.split(blocks, np.flatnonzero(np.diff(blocks) != 1) + 1):
+                chunk = records[run[0] * INDEX_BLOCK:(run[-1] + 1) * INDEX_BLOCK]
+                timestamps = chunk['timestamp']
+                mask = (chunk['kind'] == kind) & (chunk['stream'] == stream) & (timestamps >= start) & (timestamps < end)
+                parts.append(np.array(chunk[mask]))
+            del records
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=JOURNAL_RECORD)
+
+class Journal:
+    """
+    Write-behind journal. record() only appends a tuple to an in-memory batch;
+    run() writes the batch as one contiguous block and fsyncs it every
+    `flush_interval` seconds on a single writer thread, so batches land in the
+    order they were taken. Segments roll over at
+    `segment_bytes` and are deleted once they hold only data older than
+    `retention` seconds.
+    """
+    def __init__(self, directory: str, segment_bytes: int, retention: float):
+        self.directory = directory
+        self.segment_bytes = int(segment_bytes)
+        self.retention = float(retention)
+        os.makedirs(directory, exist_ok=True)
+        streams = read_streams(directory)
+        self._repair_streams(streams)
+        self._streams: Dict[Tuple[str, str], int] = {}
+        for i, names in enumerate(streams): self._streams.setdefault(names, i)
+        self._stream_count = len(streams) # lines in STREAMS_FILE, duplicates included
+        self._new_streams: List[Tuple[str, str]] = []
+        self._pending: List[Tuple] = []
+        self._file = None
+        self._file_bytes = 0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self.records_written = 0
+
+    def stream_id(self, broker: str, symbol: str) -> int:
+        key = (broker, symbol)
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = self._stream_count
+            if stream >= MAX_STREAMS:
+                raise ValueError(f"Journal stream limit reached ({MAX_STREAMS} broker/symbol pairs)")
+            self._streams[key] = stream
+            self._stream_count += 1
+            self._new_streams.append(key)
+        return stream
+
+    def record(self, kind: int, broker: str, symbol: str, timestamp: float, a: float, b: float = 0.0, flag: int = 0):
+        self._pending.append((kind, flag, self.stream_id(broker, symbol), 0, timestamp, a, b))
+
+    def _take(self) -> Tuple[List[Tuple], List[Tuple[str, str]]]:
+        batch, self._pending = self._pending, []
+        streams, self._new_streams = self._new_streams, []
+        return batch, streams
+
+    def flush(self) -> 'asyncio.Future[JournalPosition]':
+        """Queues everything recorded so far for writing; resolves to the position right after it."""
+        return asyncio.wrap_future(self._writer.submit(self._write, *self._take()))
+
+    def _write(self, batch: List[Tuple], streams: List[Tuple[str, str]]) -> JournalPosition:
+        if streams:
+            # Names go first so every written record can be resolved on replay.
+            with open(os.path.join(self.directory, STREAMS_FILE), 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(names) + '\n' for names in streams)
+                f.flush(); os.fsync(f.fileno())
+        if self._file is None or (batch and self._file_bytes >= self.segment_bytes):
+            self._roll()
+        if not batch: return self.position
+        data = np.array(batch, dtype=JOURNAL_RECORD).tobytes()
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file_bytes += len(data)
+        self.records_written += len(batch)
+        return self.position
+
+    def _repair_streams(self, streams: List[Tuple[str, str]]):
+        """Rewrites STREAMS_FILE from `streams` if a legacy file is still in use or the last line is torn."""
+        path = os.path.join(self.directory, STREAMS_FILE)
+        legacy = os.path.join(self.directory, LEGACY_STREAMS_FILE)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0: return
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) == b'\n': return
+        elif not os.path.exists(legacy): return
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(names) + '\n' for names in streams)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        if os.path.exists(legacy): os.remove(legacy)
+
+    @property
+    def position(self) -> JournalPosition:
+        return os.path.basename(self._file.name), self._file_bytes
+
+    def _roll(self):
+        if self._file is not None: self._file.close()
+        start_ms = int(time.time() * 1000)
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{start_ms:016d}{SEGMENT_SUFFIX}")
+        self._file, self._file_bytes = open(path, 'ab'), 0
+        self._prune()
+
+    def _prune(self):
+        segments = list_segments(self.directory)
+        cutoff = time.time() - self.retention
+        for (_, path), (next_start, _) in zip(segments, segments[1:]):
+            if next_start < cutoff: os.remove(path)
+
+    async def run(self, flush_interval: float):
+        while True:
+            try:
+                await asyncio.sleep(flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(f"Journal write failed: {e}", exc_info=True)
+
+    async def close(self):
+        """Writes whatever is still pending (after any queued batch) and closes the segment."""
+        try: await self.flush()
+        except Exception as e: logging.error(f"Journal write failed: {e}")
+        self._writer.shutdown(wait=True)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -3,98 +3,330 @@
 # This version fixes the RuntimeError when broadcasting to a closed connection.
 
 import uvicorn
-from fastapi import FastAPI, Request , WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request , WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
 from starlette.websockets import WebSocketState
 from fastapi.middleware.cors import CORSMiddleware
 import logging
-from contextlib import asynccontextmanager
+import hmac
+from contextlib import asynccontextmanager, suppress
 import asyncio
 import time
 import json
-from typing import Set
+from typing import Dict, Tuple, Optional, Callable
 
 # --- ماژول‌های پروژه ---
 import state_manager
-import analysis_engine
-import scoring_engine
+from analysis_executor import AnalysisExecutor
+import checkpoint
+import history
+import runtime_config
+from snapshot_delta import DeltaEncoder
+from serialization import AnalysisSnapshot, dumps, dumps_text
 from config import (
-    HOST, PORT, ANALYSIS_INTERVAL, FEED_FREEZE_THRESHOLD
+    HOST, PORT, ANALYSIS_INTERVAL, FEED_FREEZE_THRESHOLD,
+    INGEST_QUEUE_SIZE, INGEST_QUEUE_HIGH_WATERMARK, SPREAD_BROADCAST_HZ,
+    CLIENT_QUEUE_SIZE, SLOW_CLIENT_POLICY, JOURNAL_ENABLED, JOURNAL_FLUSH_INTERVAL,
+    CHECKPOINT_PATH, CHECKPOINT_INTERVAL, HISTORY_DEFAULT_RANGE, HISTORY_DEFAULT_BUCKETS,
+    HISTORY_MAX_BUCKETS, HISTORY_GLITCH_LIMIT, RUNTIME_CONFIG_FILE, ADMIN_TOKEN,
+    DELTA_FIELD_STEPS, DELTA_SLOW_FIELDS, DELTA_SLOW_INTERVAL, DELTA_SKIP_FIELDS
 )
 
 # --- WebSocket Connection Manager (اصلاح‌شده) ---
+class ClientConnection:
+    """
+    A dashboard connection with its own bounded outgoing queue and writer task,
+    so a slow socket only ever delays itself.
+    """
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.latest_only = False
+        self.needs_resync = False
+        self.sent = 0
+        self.dropped = 0
+        self.connected_at = time.time()
+        self.writer_task: Optional[asyncio.Task] = None
+
+    def enqueue(self, message: str, is_delta: bool = False) -> bool:
+        """
+        Queues a message without blocking. Returns False if the queue overflowed.
+        `is_delta` marks analysis deltas, which a resync snapshot supersedes.
+        """
+        if self.latest_only:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+                self.needs_resync = True
+        try:
+            self.queue.put_nowait((message, is_delta))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.needs_resync = True
+            return False
+
+    def switch_to_latest_only(self):
+        """Discards the backlog and from now on keeps only the newest message."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.latest_only = True
+        self.needs_resync = True
+
+    def discard_deltas(self):
+        """Drops the queued analysis deltas, keeping every other message in order."""
+        kept = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item[1]: self.dropped += 1
+            else: kept.append(item)
+        for item in kept: self.queue.put_nowait(item)
+
+    async def run_writer(self, on_dead, resync_message: Callable[[], Optional[str]]):
+        try:
+            while True:
+                message, is_delta = await self.queue.get()
+                if self.needs_resync:
+                    # Dropped deltas leave the client behind; the newest snapshot brings
+                    # it back in sync. Deltas still queued are older than that snapshot
+                    # and would roll fields back, so they go before anything is awaited
+                    # (deltas queued while the snapshot is being sent are newer and stay).
+                    self.needs_resync = False
+                    snapshot = resync_message()
+                    if snapshot:
+                        self.discard_deltas()
+                        if is_delta: self.dropped += 1
+                        await self.websocket.send_text(snapshot)
+                        self.sent += 1
+                        if is_delta: continue
+                await self.websocket.send_text(message)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # اتصال بسته شده است
+            on_dead(self.websocket)
+
+    def stats(self) -> dict:
+        client = self.websocket.client
+        return {
+            "client": f"{client.host}:{client.port}" if client else "unknown",
+            "queue_depth": self.queue.qsize(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "latest_only": self.latest_only,
+            "connected_for": round(time.time() - self.connected_at, 1)
+        }
+
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
+    def __init__(self, queue_size: int = CLIENT_QUEUE_SIZE, slow_client_policy: str = SLOW_CLIENT_POLICY):
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.queue_size = queue_size
+        self.slow_client_policy = slow_client_policy
+        self.evicted_clients = 0
+        # Produces the full snapshot sent to clients that missed messages
+        self.resync_message: Optional[Callable[[], str]] = None
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.add(websocket)
+        connection = ClientConnection(websocket, self.queue_size)
+        connection.writer_task = asyncio.create_task(connection.run_writer(self.disconnect, self._resync_message))
+        self.active_connections[websocket] = connection
         print(f"✅ کلاینت متصل شد. تعداد کل: {len(self.active_connections)}")
 
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        connection = self.active_connections.pop(websocket, None)
+        if connection:
+            if connection.writer_task and connection.writer_task is not asyncio.current_task():
+                connection.writer_task.cancel()
             print(f"❌ کلاینت قطع شد. تعداد باقی‌مانده: {len(self.active_connections)}")
 
-    async def broadcast(self, message: str):
+    def _resync_message(self) -> Optional[str]:
+        return self.resync_message() if self.resync_message else None
+
+    def _evict(self, connection: ClientConnection):
+        self.evicted_clients += 1
+        logging.warning(f"Dropping slow WebSocket client: {connection.stats()}")
+        self.disconnect(connection.websocket)
+        asyncio.create_task(self._close_quietly(connection.websocket))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), timeout=5)
+        except Exception:
+            pass
+
+    def send(self, websocket: WebSocket, message: str, is_delta: bool = False):
+        """Queues a message for a single client, applying the slow-consumer policy."""
+        connection = self.active_connections.get(websocket)
+        if connection is None or connection.enqueue(message, is_delta): return
+        if self.slow_client_policy == "latest":
+            connection.switch_to_latest_only()
+            connection.enqueue(message, is_delta)
+        else:
+            self._evict(connection)
+
+    async def broadcast(self, message: str, is_delta: bool = False):
         """
-        پیام را به تمام اتصالات فعال ارسال می‌کند و اتصالات بسته‌شده را حذف می‌کند.
+        پیام را در صف ارسال تمام اتصالات فعال قرار می‌دهد؛ ارسال واقعی توسط writer هر کلاینت انجام می‌شود.
         """
-        dead_connections: Set[WebSocket] = set()
-        # ما روی یک کپی از set تکرار می‌کنیم تا بتوانیم در حین تکرار، نسخه اصلی را تغییر دهیم
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except RuntimeError:
-                # این خطا زمانی رخ می‌دهد که اتصال قبلاً بسته شده باشد
-                dead_connections.add(connection)
-        
-        # اتصالات مرده را از لیست اصلی حذف می‌کنیم
-        for connection in dead_connections:
-            self.disconnect(connection)
+        for websocket in list(self.active_connections):
+            self.send(websocket, message, is_delta)
 
     async def broadcast_json(self, data: dict):
         """
         یک دیکشنری را به صورت JSON به تمام کلاینت‌ها ارسال می‌کند.
         """
-        await self.broadcast(json.dumps(data))
+        await self.broadcast(dumps_text(data), data.get("type") == "analysis_delta")
+
+    def stats(self) -> dict:
+        return {
+            "connected": len(self.active_connections),
+            "evicted": self.evicted_clients,
+            "slow_client_policy": self.slow_client_policy,
+            "clients": [connection.stats() for connection in self.active_connections.values()]
+        }
+
+
+# --- Coalesced spread updates ---
+class SpreadCoalescer:
+    """
+    Keeps the latest spread per (symbol, broker) and broadcasts all pending
+    changes as one `spread_updates` message at a fixed rate, so tick ingestion
+    never waits on dashboard sockets.
+    """
+    def __init__(self, connection_manager: ConnectionManager, rate_hz: float):
+        self.connection_manager = connection_manager
+        self.interval = 1.0 / rate_hz
+        self.pending: Dict[Tuple[str, str], float] = {}
+
+    def update(self, tick_data: dict):
+        self.pending[(tick_data["symbol"], tick_data["broker"])] = tick_data["current_spread"]
+
+    async def flush(self):
+        if not self.pending: return
+        pending, self.pending = self.pending, {}
+        await self.connection_manager.broadcast_json({
+            "type": "spread_updates",
+            "updates": [{"symbol": symbol, "broker": broker, "current_spread": spread} for (symbol, broker), spread in pending.items()]
+        })
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Spread broadcast failed: {e}")
+
+
+# Dashboards hold the delta encoder's view, not the raw results, so the full
+# snapshot they get on connect and on resync is built from it.
+delta_encoder = DeltaEncoder(DELTA_FIELD_STEPS, DELTA_SLOW_FIELDS, DELTA_SLOW_INTERVAL, DELTA_SKIP_FIELDS)
+dashboard_snapshot = AnalysisSnapshot({})
+
+def full_analysis_message() -> str:
+    return dashboard_snapshot.full_analysis_message
 
 
 manager = ConnectionManager()
+analysis_executor = AnalysisExecutor()
+manager.resync_message = full_analysis_message
+spread_coalescer = SpreadCoalescer(manager, SPREAD_BROADCAST_HZ)
 
 # --- FastAPI Setup ---
+async def stop_task(task: asyncio.Task):
+    """Cancels a background task and waits until it has actually finished."""
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     print("🚀 Starting Griffin Engine v11.1 (WebSocket Resilience)...")
+    journal = journal_task = checkpoint_task = None
+    # Restored buffers are sized by the saved runtime config, not the defaults
+    runtime_config.poll_file(RUNTIME_CONFIG_FILE)
+    state_manager.apply_runtime_config()
+    if JOURNAL_ENABLED:
+        replay_started = time.perf_counter()
+        try:
+            position = checkpoint.load(CHECKPOINT_PATH)
+        except Exception as e:
+            logging.error(f"Checkpoint could not be loaded, replaying the journal only: {e}")
+            state_manager.instrument_states.clear()
+            position = None
+        journal, replayed = state_manager.open_journal(position)
+        logging.info(f"Restored {'checkpoint + ' if position else ''}{replayed} journal records in {time.perf_counter() - replay_started:.2f}s")
+        journal_task = asyncio.create_task(journal.run(JOURNAL_FLUSH_INTERVAL))
+        checkpoint_task = asyncio.create_task(checkpoint_loop(journal))
     analysis_task = asyncio.create_task(analysis_loop())
+    spread_task = asyncio.create_task(spread_coalescer.run())
     yield
     print("🛑 Stopping background tasks...")
-    analysis_task.cancel()
-    try:
-        await analysis_task
-    except asyncio.CancelledError:
-        logging.info("Analysis loop successfully cancelled.")
+    await stop_task(spread_task)
+    await stop_task(analysis_task)
+    logging.info("Analysis loop successfully cancelled.")
+    analysis_executor.shutdown()
+    if journal is not None:
+        await stop_task(checkpoint_task)
+        await stop_task(journal_task)
+        try:
+            await save_checkpoint(journal)
+        except Exception as e:
+            logging.error(f"Final checkpoint failed: {e}")
+        await journal.close()
 
 
 app = FastAPI(title="Griffin Engine v11.1", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
 # --- Core Analysis Loop ---
+checkpoint_write: Optional[asyncio.Future] = None
+
+async def save_checkpoint(journal):
+    global checkpoint_write
+    # The previous write reads what its capture took until it finishes (even
+    # when the task that started it was cancelled), so the next capture waits.
+    if checkpoint_write is not None:
+        await asyncio.wait([checkpoint_write])
+    # Capture and journal flush happen with no await in between, so the
+    # checkpoint's journal position matches exactly what it contains.
+    parts, meta = checkpoint.capture(state_manager.instrument_states)
+    meta['journal_position'] = await journal.flush()
+    checkpoint_write = asyncio.ensure_future(asyncio.to_thread(checkpoint.write, CHECKPOINT_PATH, parts, meta))
+    await asyncio.shield(checkpoint_write)
+
+async def checkpoint_loop(journal):
+    while True:
+        try:
+            await asyncio.sleep(CHECKPOINT_INTERVAL)
+            await save_checkpoint(journal)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logging.error(f"Checkpoint failed: {e}", exc_info=True)
+
+
 async def analysis_loop():
+    global dashboard_snapshot
     while True:
         try:
             await asyncio.sleep(ANALYSIS_INTERVAL)
+            # Config changes staged since the last cycle take effect here, all at once
+            runtime_config.poll_file(RUNTIME_CONFIG_FILE)
+            state_manager.apply_runtime_config()
+            state_manager.flush_reorder_buffers(time.time())
+            state_manager.fold_spread_histories()
             
             all_brokers_by_symbol = state_manager.get_all_brokers_by_symbol()
 
-            for symbol, brokers in all_brokers_by_symbol.items():
-                analysis_engine.analyze_glitches_and_correlation(brokers)
-                for broker_state in brokers:
-                    broker_state.apply_penalty_decay()
-
-            final_results = scoring_engine.calculate_final_scores(all_brokers_by_symbol)
+            final_results = await analysis_executor.run_cycle(all_brokers_by_symbol)
             
             for symbol, broker_states_list in all_brokers_by_symbol.items():
                 for broker_state in broker_states_list:
@@ -104,13 +336,19 @@ async def analysis_loop():
                     if symbol in final_results and broker_name in final_results[symbol]:
                         final_results[symbol][broker_name]['current_spread'] = current_spread_value
 
-            state_manager.set_latest_analysis_results(final_results)
+            snapshot = state_manager.set_latest_analysis_results(final_results)
 
-            # ارسال تحلیل کامل به صورت دوره‌ای
-            await manager.broadcast_json({
-                "type": "full_analysis",
-                "payload": final_results
-            })
+            # Only what changed since the previous cycle goes out; clients get the
+            # full snapshot on connect or when they ask for it. Nothing is awaited
+            # between the encode and the broadcast, so a resync snapshot always
+            # includes every delta queued before it was taken.
+            delta = delta_encoder.encode(snapshot.results, time.time())
+            dashboard_snapshot = AnalysisSnapshot(delta_encoder.snapshot)
+            if delta:
+                await manager.broadcast_json({
+                    "type": "analysis_delta",
+                    "payload": delta
+                })
 
         except asyncio.CancelledError:
             break
@@ -125,10 +363,14 @@ async def receive_tick(request: Request):
     if response and response.get("status") == "success":
         tick_data = response.get("tick_data")
         if tick_data:
-            await manager.broadcast_json({
-                "type": "spread_update",
-                **tick_data
-            })
+            spread_coalescer.update(tick_data)
+    return response
+
+@app.post("/tick_batch")
+async def receive_tick_batch(request: Request):
+    response = await state_manager.handle_tick_batch_request(request)
+    for tick_data in response.get("tick_data", []):
+        spread_coalescer.update(tick_data)
     return response
 
 @app.post("/slippage_test")
@@ -141,22 +383,79 @@ async def receive_latency_test(request: Request):
 
 @app.get("/api/live_analysis")
 async def get_live_analysis():
-    return state_manager.get_latest_analysis_results()
+    return Response(content=state_manager.get_latest_analysis_snapshot().payload, media_type="application/json")
+
+async def history_response(kind: str, symbol: str, broker: Optional[str], start: Optional[float], end: Optional[float], size: int, max_size: int) -> Response:
+    """
+    Runs a history query (times in epoch seconds; defaults to the last HISTORY_DEFAULT_RANGE).
+    Journal-backed queries read from disk in a worker thread.
+    """
+    end = time.time() if end is None else end
+    start = end - HISTORY_DEFAULT_RANGE if start is None else start
+    size = max(1, min(size, max_size))
+    if kind == "scores":
+        result = history.query(kind, symbol, broker, start, end, size)
+    else:
+        result = await asyncio.to_thread(history.query, kind, symbol, broker, start, end, size)
+    return Response(content=dumps(result), media_type="application/json")
+
+@app.get("/api/history/scores")
+async def get_score_history(symbol: str, broker: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None, buckets: int = HISTORY_DEFAULT_BUCKETS):
+    return await history_response("scores", symbol, broker, start, end, buckets, HISTORY_MAX_BUCKETS)
+
+@app.get("/api/history/spreads")
+async def get_spread_history(symbol: str, broker: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None, buckets: int = HISTORY_DEFAULT_BUCKETS):
+    return await history_response("spreads", symbol, broker, start, end, buckets, HISTORY_MAX_BUCKETS)
+
+@app.get("/api/history/glitches")
+async def get_glitch_history(symbol: str, broker: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None, limit: int = HISTORY_GLITCH_LIMIT):
+    return await history_response("glitches", symbol, broker, start, end, limit, HISTORY_GLITCH_LIMIT)
+
+def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set GRIFFIN_ADMIN_TOKEN)")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def runtime_config_status() -> Dict:
+    return {"status": "success", "version": runtime_config.current.version,
+            "current": runtime_config.current.as_dict(), "pending": runtime_config.pending()}
+
+@app.get("/api/admin/config")
+async def get_runtime_config(request: Request):
+    require_admin(request)
+    return runtime_config_status()
+
+@app.post("/api/admin/config")
+async def update_runtime_config(request: Request):
+    """Stages a partial update (e.g. {"WEIGHTS": {"tps": 0.1}, "TICK_BUFFER_SIZE": 4000}) for the next analysis cycle."""
+    require_admin(request)
+    try:
+        runtime_config.stage(json.loads(await request.body()))
+    except (ValueError, TypeError, OverflowError) as e: # json.JSONDecodeError is a ValueError
+        return {"status": "error", "detail": str(e)}
+    return runtime_config_status()
+
+@app.get("/api/clients")
+async def get_clients():
+    return manager.stats()
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         # ارسال وضعیت اولیه کامل هنگام اتصال
-        initial_data = state_manager.get_latest_analysis_results()
-        await websocket.send_json({
-            "type": "full_analysis",
-            "payload": initial_data
-        })
+        manager.send(websocket, full_analysis_message())
         # اتصال را برای دریافت آپدیت‌ها باز نگه می‌داریم
         while True:
             # منتظر پیام از کلاینت (در صورت نیاز)
-            await websocket.receive_text()
+            message = await websocket.receive_text()
+            try:
+                request_type = json.loads(message).get("type")
+            except (ValueError, AttributeError):
+                continue
+            if request_type == "request_full_analysis":
+                manager.send(websocket, full_analysis_message())
     except WebSocketDisconnect:
         # این یک رویداد طبیعی است و توسط disconnect مدیریت می‌شود
         pass
@@ -165,6 +464,78 @@ async def websocket_endpoint(websocket: WebSocket):
     finally:
         manager.disconnect(websocket)
 
+@app.websocket("/ws/ingest")
+async def ingest_endpoint(websocket: WebSocket):
+    """
+    Persistent ingestion channel for collectors. Frames are queued as they arrive
+    and applied in order; every frame is acknowledged with its sequence number,
+    per-status counts and a throttle hint. When the queue is full the reader stops
+    pulling frames, which pushes back on the collector through TCP.
+
+    Frames already received when the collector disconnects are still applied
+    (without acks). If applying or acknowledging fails, the channel closes, so the
+    collector resends everything it has no ack for.
+    """
+    await websocket.accept()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    reading = True
+
+    async def read_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            frame = message.get("bytes") if message.get("bytes") is not None else message.get("text", "")
+            await queue.put((time.time(), frame))
+
+    async def apply_frames():
+        seq = 0
+        while True:
+            receipt_time, frame = await queue.get()
+            try:
+                seq += 1
+                summary = state_manager.process_ingest_frame(frame, receipt_time)
+                for tick_data in summary["tick_data"]:
+                    spread_coalescer.update(tick_data)
+                if not reading: continue # the collector is gone; nothing to acknowledge to
+                depth = queue.qsize()
+                await websocket.send_json({
+                    "type": "ack",
+                    "seq": seq,
+                    "counts": summary["counts"],
+                    "queue_depth": depth,
+                    "throttle": depth >= INGEST_QUEUE_HIGH_WATERMARK
+                })
+            finally:
+                queue.task_done()
+
+    reader = asyncio.create_task(read_frames())
+    applier = asyncio.create_task(apply_frames())
+    drained = None
+    try:
+        await asyncio.wait({reader, applier}, return_when=asyncio.FIRST_COMPLETED)
+        if applier.done():
+            logging.error(f"Ingest channel closed, applying frames failed: {applier.exception()!r}")
+            try:
+                await websocket.close(code=1011)
+            except Exception:
+                pass # already half-closed
+        else:
+            reading = False
+            if not isinstance(reader.exception(), (type(None), WebSocketDisconnect)):
+                logging.error(f"Ingest channel error: {reader.exception()}")
+            # Apply what was already received before letting the channel go
+            drained = asyncio.create_task(queue.join())
+            await asyncio.wait({drained, applier}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (reader, applier, drained):
+            if task is None: continue
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
 
 def start_server():
     print("--- Griffin Engine v11.1 is ready to detect the truth ---")
@@ -0,0 +1,231 @@
+# rolling_stats.py
+# v14.0: Incremental statistics for the ingestion path and score history.
+
+import math
+from collections import deque
+from typing import Deque, Dict
+import numpy as np
+
+class RollingStats:
+    """
+    Mean and population variance over the last `window` values, updated in O(1).
+
+    Uses Welford's update when a value enters the window and the inverse
+    update when the oldest value slides out.
+    """
+    def __init__(self, window: int):
+        self.window = int(window)
+        self.values: Deque[float] = deque()
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def push(self, value: float):
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(value)
+        n = len(self.values)
+        delta = value - self.mean
+        self.mean += delta / n
+        self._m2 += delta * (value - self.mean)
+
+    def extend(self, values: np.ndarray):
+        """Bulk push(): refills the window and recomputes its moments exactly."""
+        if len(values) == 0: return
+        self.values.extend(np.asarray(values[-self.window:], dtype=np.float64).tolist())
+        while len(self.values) > self.window: self.values.popleft()
+        window = np.fromiter(self.values, dtype=np.float64, count=len(self.values))
+        self.mean = float(window.mean())
+        self._m2 = float(np.square(window - self.mean).sum())
+
+    def resized(self, window: int) -> 'RollingStats':
+        """A copy with a different window, holding the newest values that fit."""
+        clone = RollingStats(window)
+        clone.extend(np.fromiter(self.values, dtype=np.float64, count=len(self.values)))
+        return clone
+
+    def _remove(self, value: float):
+        n = len(self.values)
+        if n == 0:
+            self.mean, self._m2 = 0.0, 0.0
+            return
+        old_mean = self.mean
+        self.mean -= (value - old_mean) / n
+        self._m2 -= (value - old_mean) * (value - self.mean)
+        if self._m2 < 0: self._m2 = 0.0 # guard against rounding drift
+
+    @property
+    def variance(self) -> float:
+        n = len(self.values)
+        return self._m2 / n if n else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+class RollingMoments:
+    """
+    Skewness and kurtosis over the last `window` values, for a Jarque-Bera style
+    normality statistic without running a full test.
+
+    Keeps power sums of the values (shifted by the first value seen, to limit
+    cancellation) and subtracts the oldest value as it slides out. The sums are
+    recomputed from the stored values once per `window` pushes to bound drift.
+    """
+    def __init__(self, window: int):
+        self.window = int(window)
+        self.values: Deque[float] = deque(maxlen=self.window)
+        self.total = 0 # values pushed since creation
+        self._shift = None
+        self._sums = [0.0, 0.0, 0.0, 0.0] # sum of d, d^2, d^3, d^4
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def push(self, value: float):
+        if self._shift is None: self._shift = value
+        if len(self.values) == self.window:
+            self._add_powers(self.values[0] - self._shift, -1.0)
+        self.values.append(value)
+        self._add_powers(value - self._shift, 1.0)
+        self.total += 1
+        if self.total % self.window == 0: self._resync()
+
+    def extend(self, values: np.ndarray):
+        """Bulk push(), followed by one resync of the power sums."""
+        if len(values) == 0: return
+        if self._shift is None: self._shift = float(values[0])
+        self.values.extend(np.asarray(values[-self.window:], dtype=np.float64).tolist())
+        self.total += len(values)
+        self._resync()
+
+    def _add_powers(self, d: float, sign: float):
+        d2 = d * d
+        self._sums[0] += sign * d
+        self._sums[1] += sign * d2
+        self._sums[2] += sign * d2 * d
+        self._sums[3] += sign * d2 * d2
+
+    def _resync(self):
+        d = np.fromiter(self.values, dtype=np.float64, count=len(self.values)) - self._shift
+        d2 = d * d
+        self._sums = [float(d.sum()), float(d2.sum()), float(np.dot(d2, d)), float(np.dot(d2, d2))]
+
+    def central_moments(self):
+        """Population variance, third and fourth central moments."""
+        n = len(self.values)
+        if n == 0: return 0.0, 0.0, 0.0
+        s1, s2, s3, s4 = (x / n for x in self._sums)
+        mean = s1
+        m2 = s2 - mean * mean
+        m3 = s3 - 3 * mean * s2 + 2 * mean ** 3
+        m4 = s4 - 4 * mean * s3 + 6 * mean * mean * s2 - 3 * mean ** 4
+        return max(m2, 0.0), m3, max(m4, 0.0)
+
+    def jarque_bera_p_value(self) -> float:
+        """
+        Asymptotic p-value of the Jarque-Bera statistic (chi-squared, 2 dof).
+        Constant values give 1.0, like scipy's shapiro does.
+        """
+        n = len(self.values)
+        m2, m3, m4 = self.central_moments()
+        if n < 3 or m2 <= 1e-30: return 1.0
+        skewness = m3 / m2 ** 1.5
+        kurtosis = m4 / (m2 * m2)
+        statistic = n / 6.0 * (skewness * skewness + (kurtosis - 3.0) ** 2 / 4.0)
+        return math.exp(-statistic / 2.0)
+
+    def copy(self) -> 'RollingMoments':
+        clone = RollingMoments.__new__(RollingMoments)
+        clone.window, clone.total, clone._shift = self.window, self.total, self._shift
+        clone.values = deque(self.values, maxlen=self.window)
+        clone._sums = list(self._sums)
+        return clone
+
+class TimeframeAverager:
+    """
+    Averages of a timestamped series over several trailing time windows.
+
+    Values live in a preallocated ring; each window keeps a running sum and the
+    index of its oldest member, which only ever moves forward. Adding a value
+    and reading all averages are both amortized O(1) per window. Timestamps
+    and the `now` passed to averages() are expected to be non-decreasing.
+    """
+    def __init__(self, capacity: int, timeframes: Dict[str, float]):
+        self.capacity = int(capacity)
+        self.timeframes = dict(timeframes)
+        self._timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self._values = np.zeros(self.capacity, dtype=np.float64)
+        self.total = 0  # values added since creation (absolute index of the next one)
+        self._start = {name: 0 for name in self.timeframes}
+        self._sum = {name: 0.0 for name in self.timeframes}
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    def add(self, timestamp: float, value: float):
+        if self.total >= self.capacity:
+            # The slot about to be overwritten leaves every window that still holds it.
+            evicted = self.total - self.capacity
+            for name, start in self._start.items():
+                if start <= evicted:
+                    self._sum[name] -= float(self._values[evicted % self.capacity])
+                    self._start[name] = evicted + 1
+        slot = self.total % self.capacity
+        self._timestamps[slot] = timestamp
+        self._values[slot] = value
+        self.total += 1
+        for name in self._sum:
+            self._sum[name] += value
+        if self.total % self.capacity == 0:
+            self._resync()
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray):
+        """Appends many values at once (oldest first), e.g. when restoring history."""
+        n = len(values)
+        if n == 0: return
+        keep = min(n, self.capacity)
+        slots = (self.total + n - keep + np.arange(keep)) % self.capacity
+        self._timestamps[slots] = timestamps[n - keep:]
+        self._values[slots] = values[n - keep:]
+        self.total += n
+        for name, start in self._start.items():
+            self._start[name] = max(start, self.total - self.capacity)
+        self._resync()
+
+    def _resync(self):
+        """Recomputes the running sums exactly, bounding floating-point drift (once per ring wrap)."""
+        for name, start in self._start.items():
+            self._sum[name] = float(np.sum(self._window(self._values, start)))
+
+    def _window(self, column: np.ndarray, start: int) -> np.ndarray:
+        first, end = start % self.capacity, self.total % self.capacity
+        if self.total - start == 0: return column[:0]
+        if first < end: return column[first:end]
+        return np.concatenate((column[first:], column[:end]))
+
+    def last(self, n: int) -> np.ndarray:
+        """The newest `n` values, oldest first."""
+        return self._window(self._values, self.total - min(int(n), len(self)))
+
+    def ring_columns(self) -> Dict[str, np.ndarray]:
+        """The live ring arrays in slot order (not copied; for incremental checkpoint copies)."""
+        return {'timestamp': self._timestamps, 'value': self._values}
+
+    def last_timestamps(self, n: int) -> np.ndarray:
+        """Timestamps matching last(n)."""
+        return self._window(self._timestamps, self.total - min(int(n), len(self)))
+
+    def averages(self, now: float) -> Dict[str, float]:
+        results = {}
+        for name, seconds in self.timeframes.items():
+            start, total = self._start[name], self.total
+            while start < total and now - self._timestamps[start % self.capacity] > seconds:
+                self._sum[name] -= float(self._values[start % self.capacity])
+                start += 1
+            self._start[name] = start
+            count = total - start
+            results[name] = self._sum[name] / count if count else 0.0
+        return results
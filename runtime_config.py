@@ -0,0 +1,123 @@
+# runtime_config.py
+# v14.0: Scoring weights, thresholds and buffer sizes that can change while the engine runs.
+
+import json
+import logging
+import math
+import os
+from typing import Any, Dict, Optional
+
+import config
+
+# Tunable settings: name -> (type, inclusive lower bound, inclusive upper bound)
+TUNABLES = {
+    'FEED_FREEZE_THRESHOLD': (float, 0.1, None),
+    'DYNAMIC_THRESHOLD_STD_FACTOR': (float, 0.0, None),
+    'GLITCH_VERIFICATION_THRESHOLD_PIPS': (float, 0.0, None),
+    'LEADER_FOLLOWER_WINDOW_MS': (float, 1.0, None),
+    'PENALTY_DECAY_INTERVAL': (float, 0.01, None),
+    'PENALTY_DECAY_RATE': (float, 0.0, 1.0),
+    'QUOTE_FREEZE_TICKS_WINDOW': (int, 1, None),
+    'QUOTE_FREEZE_UNIQUENESS_RATIO': (float, 0.0, 1.0),
+    # Buffer sizes: applied by resizing every broker's buffers in place, so they
+    # are capped at what every broker can allocate
+    'TICK_BUFFER_SIZE': (int, 2, 100_000),
+    'GLITCH_DETECTION_WINDOW': (int, 2, 10_000),
+    'MAX_SCORE_HISTORY_RECORDS': (int, 1, 24 * 3600),
+}
+
+def _is_finite_number(value: Any) -> bool:
+    # JSON's NaN/Infinity would slip past every range check
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and math.isfinite(value)
+
+class RuntimeConfig:
+    """
+    One consistent set of tunables plus WEIGHTS. Never modified in place: a
+    change builds a new instance, which replaces `current` between analysis
+    cycles, so a cycle always sees a single version.
+    """
+    def __init__(self, values: Dict[str, Any], version: int = 0):
+        self.version = version
+        self.WEIGHTS: Dict[str, float] = dict(values['WEIGHTS'])
+        for name in TUNABLES:
+            setattr(self, name, values[name])
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'WEIGHTS': dict(self.WEIGHTS), **{name: getattr(self, name) for name in TUNABLES}}
+
+    def updated(self, changes: Dict[str, Any]) -> 'RuntimeConfig':
+        """A validated copy with `changes` applied (WEIGHTS may be partial). Raises ValueError."""
+        try:
+            return self._updated(changes)
+        except (TypeError, OverflowError) as e:
+            raise ValueError(str(e)) from e
+
+    def _updated(self, changes: Dict[str, Any]) -> 'RuntimeConfig':
+        values = self.as_dict()
+        for name, value in changes.items():
+            if name == 'WEIGHTS':
+                if not isinstance(value, dict): raise ValueError("WEIGHTS must be an object")
+                unknown = set(value) - set(self.WEIGHTS)
+                if unknown: raise ValueError(f"Unknown weights: {sorted(unknown)}")
+                for key, weight in value.items():
+                    if not _is_finite_number(weight) or weight < 0:
+                        raise ValueError(f"Weight {key} must be a finite, non-negative number")
+                    values['WEIGHTS'][key] = float(weight)
+                continue
+            if name not in TUNABLES: raise ValueError(f"{name} is not a runtime setting")
+            kind, lower, upper = TUNABLES[name]
+            if not _is_finite_number(value) or (kind is int and value != int(value)):
+                raise ValueError(f"{name} must be {'an integer' if kind is int else 'a finite number'}")
+            if (lower is not None and value < lower) or (upper is not None and value > upper):
+                raise ValueError(f"{name} must be within [{lower}, {upper if upper is not None else 'inf'}]")
+            values[name] = kind(value)
+        return RuntimeConfig(values, self.version + 1)
+
+current = RuntimeConfig({'WEIGHTS': config.WEIGHTS, **{name: getattr(config, name) for name in TUNABLES}})
+_pending: Dict[str, Any] = {}
+_file_mtime: Optional[int] = None
+
+def pending() -> Dict[str, Any]:
+    return dict(_pending)
+
+def stage(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Validates changes and queues them for the next analysis cycle. Returns everything pending."""
+    if not isinstance(changes, dict): raise ValueError("Expected an object of settings")
+    current.updated({**_pending, **changes}) # validation only
+    for name, value in changes.items():
+        _pending[name] = {**_pending.get(name, {}), **value} if name == 'WEIGHTS' else value
+    return pending()
+
+def staged() -> Optional[RuntimeConfig]:
+    """The next version built from the pending changes, not yet published (None when nothing is pending)."""
+    return current.updated(_pending) if _pending else None
+
+def publish(settings: RuntimeConfig):
+    """Makes a staged version current and clears the changes it was built from."""
+    global current
+    current = settings
+    logging.info(f"Runtime config v{settings.version} applied: {_pending}")
+    _pending.clear()
+
+def discard(reason: str):
+    """Drops the pending changes, e.g. when applying them failed, so they are not retried every cycle."""
+    logging.error(f"Runtime config changes {_pending} discarded: {reason}")
+    _pending.clear()
+
+def poll_file(path: Optional[str]) -> bool:
+    """Stages the settings in a JSON file whenever its modification time changes. Returns True if it staged anything."""
+    global _file_mtime
+    if not path: return False
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+    if mtime == _file_mtime: return False
+    _file_mtime = mtime
+    try:
+        with open(path, encoding='utf-8') as f:
+            stage(json.load(f))
+        return True
+    except (OSError, ValueError) as e: # json.JSONDecodeError is a ValueError
+        logging.error(f"Runtime config file {path} ignored: {e}")
+        return False
@@ -0,0 +1,150 @@
+# score_history.py
+# v14.0: Memory-bounded, multi-resolution quality score history.
+
+import math
+from typing import Dict, List, Tuple
+import numpy as np
+
+from rolling_stats import TimeframeAverager
+
+class RollupTier:
+    """
+    Ring of fixed-width time buckets, each holding the count, sum, min and max
+    of the scores that fell into it.
+    """
+    def __init__(self, resolution: float, capacity: int):
+        self.resolution = float(resolution)
+        self.capacity = int(capacity)
+        self.bucket_start = np.zeros(self.capacity, dtype=np.float64)
+        self.total = np.zeros(self.capacity, dtype=np.float64)
+        self.count = np.zeros(self.capacity, dtype=np.uint32)
+        self.min = np.zeros(self.capacity, dtype=np.float32)
+        self.max = np.zeros(self.capacity, dtype=np.float32)
+        self._head = -1     # slot of the newest bucket
+        self._buckets = 0   # number of valid buckets (<= capacity)
+        self.opened = 0     # buckets opened since creation; the newest is in slot (opened - 1) % capacity
+
+    def __len__(self) -> int:
+        return self._buckets
+
+    def add(self, timestamp: float, score: float):
+        start = math.floor(timestamp / self.resolution) * self.resolution
+        head = self._head
+        if head < 0 or start > self.bucket_start[head]:
+            head = self._head = (head + 1) % self.capacity
+            self._buckets = min(self._buckets + 1, self.capacity)
+            self.opened += 1
+            self.bucket_start[head], self.total[head], self.count[head] = start, score, 1
+            self.min[head] = self.max[head] = score
+        else:
+            # Same bucket (or a late sample, which is folded into the newest bucket)
+            self.total[head] += score
+            self.count[head] += 1
+            self.min[head] = min(self.min[head], score)
+            self.max[head] = max(self.max[head], score)
+
+    def extend(self, timestamps: np.ndarray, scores: np.ndarray):
+        """Bulk version of add() for scores in arrival order."""
+        if len(scores) == 0: return
+        starts = np.floor(timestamps / self.resolution) * self.resolution
+        if self._head >= 0:
+            starts = np.maximum(starts, self.bucket_start[self._head])
+        starts = np.maximum.accumulate(starts) # late samples fold into the newest bucket
+        first = np.concatenate(([0], np.flatnonzero(np.diff(starts)) + 1))
+        totals = np.add.reduceat(scores, first)
+        counts = np.diff(np.append(first, len(scores)))
+        mins, maxs = np.minimum.reduceat(scores, first), np.maximum.reduceat(scores, first)
+        starts = starts[first]
+        head = self._head
+        if head >= 0 and starts[0] == self.bucket_start[head]:
+            self.total[head] += totals[0]
+            self.count[head] += counts[0]
+            self.min[head] = min(self.min[head], mins[0])
+            self.max[head] = max(self.max[head], maxs[0])
+            starts, totals, counts, mins, maxs = starts[1:], totals[1:], counts[1:], mins[1:], maxs[1:]
+        n = len(starts)
+        if n == 0: return
+        keep = min(n, self.capacity)
+        slots = (head + 1 + n - keep + np.arange(keep)) % self.capacity
+        for column, values in ((self.bucket_start, starts), (self.total, totals), (self.count, counts), (self.min, mins), (self.max, maxs)):
+            column[slots] = values[n - keep:]
+        self._head = int(slots[-1])
+        self._buckets = min(self._buckets + n, self.capacity)
+        self.opened += n
+
+    def _ordered(self, column: np.ndarray) -> np.ndarray:
+        first = (self._head + 1 - self._buckets) % self.capacity
+        if first + self._buckets <= self.capacity:
+            return column[first:first + self._buckets]
+        return np.concatenate((column[first:], column[:self._head + 1]))
+
+    def series(self) -> Dict[str, np.ndarray]:
+        """Bucket start times with avg/min/max per bucket, oldest first."""
+        count = self._ordered(self.count)
+        return {
+            "timestamp": self._ordered(self.bucket_start),
+            "avg": self._ordered(self.total) / np.maximum(count, 1),
+            "min": self._ordered(self.min),
+            "max": self._ordered(self.max),
+            "count": count,
+        }
+
+    ROLLUP_COLUMNS = ('bucket_start', 'total', 'count', 'min', 'max')
+
+    def ring_columns(self) -> Dict[str, np.ndarray]:
+        """The live bucket arrays in slot order (not copied; for incremental checkpoint copies)."""
+        return {name: getattr(self, name) for name in self.ROLLUP_COLUMNS}
+
+    def export_state(self) -> Dict[str, np.ndarray]:
+        """The raw bucket columns, oldest first (for checkpoints)."""
+        return {name: self._ordered(getattr(self, name)).copy() for name in self.ROLLUP_COLUMNS}
+
+    def restore_state(self, columns: Dict[str, np.ndarray]):
+        count = min(len(columns['bucket_start']), self.capacity)
+        for name in self.ROLLUP_COLUMNS:
+            getattr(self, name)[:count] = columns[name][len(columns[name]) - count:]
+        self._head, self._buckets, self.opened = count - 1, count, count
+
+    @property
+    def span(self) -> float:
+        """Seconds of history this tier can hold."""
+        return self.resolution * self.capacity
+
+
+class ScoreHistory:
+    """
+    Quality score history for one broker.
+
+    The raw tier keeps every score (one per analysis cycle) in a float64 ring
+    and serves the sparkline and the exact timeframe averages. Coarser rollup
+    tiers keep min/max/avg buckets for much longer horizons at a fixed size.
+    """
+    def __init__(self, raw_capacity: int, timeframes: Dict[str, float], tiers: List[Tuple[float, int]]):
+        self.raw = TimeframeAverager(raw_capacity, timeframes)
+        self.rollups = [RollupTier(resolution, capacity) for resolution, capacity in tiers]
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def add(self, timestamp: float, score: float):
+        self.raw.add(timestamp, score)
+        for tier in self.rollups:
+            tier.add(timestamp, score)
+
+    def extend(self, timestamps: np.ndarray, scores: np.ndarray):
+        """Adds many scores at once (oldest first), e.g. when restoring from the journal."""
+        self.raw.extend(timestamps, scores)
+        for tier in self.rollups:
+            tier.extend(timestamps, scores)
+
+    def resized_raw(self, raw_capacity: int) -> TimeframeAverager:
+        """A copy of the raw tier with a different capacity, holding the newest scores that fit; assign it to `raw` to switch."""
+        raw = TimeframeAverager(raw_capacity, self.raw.timeframes)
+        raw.extend(self.raw.last_timestamps(len(self.raw)), self.raw.last(len(self.raw)))
+        return raw
+
+    def last(self, n: int) -> np.ndarray:
+        return self.raw.last(n)
+
+    def averages(self, now: float) -> Dict[str, float]:
+        return self.raw.averages(now)
@@ -1,98 +1,109 @@
 # scoring_engine.py
 # v13.0: Added timeframe average score calculation.
 
-from typing import List, Dict, Deque
+from typing import Dict, List, Optional, Tuple
 import numpy as np
-import time
 
+import clock
+import runtime_config
 from state_manager import BrokerState
+from score_history import ScoreHistory
 import analysis_engine
-from config import WEIGHTS, QUOTE_FREEZE_UNIQUENESS_RATIO
+from analysis_engine import KPI_COLUMNS, KPI_INDEX
+
+# The sub-score each WEIGHTS entry multiplies
+WEIGHTED_SUB_SCORES = {
+    'authenticity': 'score_authenticity', 'integrity': 'score_integrity', 'execution': 'score_execution',
+    'spread_level': 'score_spread_level', 'spread_stability': 'score_spread_stability',
+    'feed_stability': 'score_feed_stability', 'quote_freeze': 'score_quote_freeze', 'tps': 'score_tps',
+}
+SUB_SCORES = tuple(WEIGHTED_SUB_SCORES.values())
 
 # --- New in v13 ---
-def calculate_timeframe_averages(history: Deque[tuple[float, float]]) -> Dict[str, float]:
+def calculate_timeframe_averages(history: ScoreHistory) -> Dict[str, float]:
     """Calculates the average score over different historical timeframes."""
-    now = time.time()
-    timeframes = {
-        "15m": 15 * 60,
-        "30m": 30 * 60,
-        "1h": 60 * 60,
-        "4h": 4 * 60 * 60,
-        "8h": 8 * 60 * 60,
-    }
-    results = { "15m": 0.0, "30m": 0.0, "1h": 0.0, "4h": 0.0, "8h": 0.0 }
-    
-    if not history:
-        return results
-
-    # To optimize, we can iterate from the end of the list
-    for tf_name, tf_seconds in timeframes.items():
-        relevant_scores = [score for ts, score in history if now - ts <= tf_seconds]
-        if relevant_scores:
-            results[tf_name] = np.mean(relevant_scores) # type: ignore
-            
-    return results
+    return history.averages(clock.now())
 # --- End New ---
 
 def calculate_final_scores(all_brokers_by_symbol: Dict[str, List[BrokerState]]) -> Dict:
     final_results = {}
     for symbol, brokers_list in all_brokers_by_symbol.items():
-        # ... (Step 1 and 2 for gathering and normalizing KPIs remain the same) ...
-        symbol_results = {}
-        active_kpis_list = []
-        for state in brokers_list:
-            base_kpis = analysis_engine.get_base_kpis(state)
-            auth_kpis = analysis_engine.get_authenticity_kpis(state)
-            exec_kpis = analysis_engine.get_execution_kpis(state)
-            spread_kpis = analysis_engine.get_advanced_spread_kpis(state)
-            freeze_kpis = analysis_engine.get_quote_freeze_kpi(state)
-            kpis = {"broker_name": state.broker_name, "is_leader": state.is_leader, "data_integrity_score": 100.0 - state.penalty_score, "verified_glitches_log": list(state.verified_glitches)[:5], **base_kpis, **auth_kpis, **exec_kpis, **spread_kpis, **freeze_kpis}
-            symbol_results[state.broker_name] = kpis
-            if not kpis['is_frozen']: active_kpis_list.append(kpis)
-        if active_kpis_list:
-            best_spread = min((k['avg_spread'] for k in active_kpis_list if k['avg_spread'] > 0), default=1)
-            min_std_dev = min((k['spread_std_dev'] for k in active_kpis_list if k['spread_std_dev'] > 0), default=1)
-            for name, kpis in symbol_results.items():
-                kpis['score_spread_level'] = (best_spread / kpis['avg_spread']) * 100 if kpis['avg_spread'] > 0 else 0
-                kpis['score_spread_stability'] = (min_std_dev / kpis['spread_std_dev']) * 100 if kpis['spread_std_dev'] > 0 else 0
-        else:
-             for name, kpis in symbol_results.items():
-                kpis['score_spread_level'] = 0
-                kpis['score_spread_stability'] = 0
+        symbol_results = score_symbol(brokers_list)
+        record_score_history(brokers_list, symbol_results, clock.now())
+        final_results[symbol] = symbol_results
+        
+    return final_results
 
-        # Step 3: Calculate final weighted score and all sub-scores
-        for name, kpis in symbol_results.items():
-            state = next((s for s in brokers_list if s.broker_name == name), None)
-            if not state: continue
+def weight_vector(weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """The runtime WEIGHTS (or the given weights) as a vector over SUB_SCORES."""
+    weights = runtime_config.current.WEIGHTS if weights is None else weights
+    return np.array([weights[key] for key in WEIGHTED_SUB_SCORES], dtype=np.float64)
 
-            # ... (Calculation of individual scores remains the same) ...
-            score_authenticity = (max(0, (kpis['correlation_with_leader'] - 0.95) / 0.05) * 50 if kpis['correlation_with_leader'] > 0.95 else 0) + (kpis['tick_distribution_p_value'] * 50)
-            score_integrity = kpis['data_integrity_score']
-            score_execution = (1 - min(abs(1 - kpis['asymmetric_slippage_ratio']), 2) / 2) * 100
-            score_feed_stability = kpis['feed_stability_score']
-            score_tps = min((kpis['tps'] / 25) * 100, 100)
-            score_quote_freeze = 100 if kpis['uniqueness_ratio'] > QUOTE_FREEZE_UNIQUENESS_RATIO else 0
-            
-            final_score = (score_authenticity * WEIGHTS['authenticity'] + score_integrity * WEIGHTS['integrity'] + score_execution * WEIGHTS['execution'] + kpis.get('score_spread_level', 0) * WEIGHTS['spread_level'] + kpis.get('score_spread_stability', 0) * WEIGHTS['spread_stability'] + score_feed_stability * WEIGHTS['feed_stability'] + score_quote_freeze * WEIGHTS['quote_freeze'] + score_tps * WEIGHTS['tps'])
-            
-            kpis['quality_score'] = max(0, min(100, final_score))
-            # ... (Adding sub-scores to kpis dict remains the same) ...
-            kpis['score_authenticity'] = score_authenticity
-            kpis['score_integrity'] = score_integrity
-            kpis['score_execution'] = score_execution
-            kpis['score_feed_stability'] = score_feed_stability
-            kpis['score_quote_freeze'] = score_quote_freeze
-            kpis['score_tps'] = score_tps
+def sub_score_matrix(kpis: np.ndarray) -> np.ndarray:
+    """
+    Sub-scores (brokers x SUB_SCORES) of one symbol from its KPI matrix. The
+    spread scores are relative to the best active (not frozen) broker.
+    """
+    def column(name: str) -> np.ndarray:
+        return kpis[:, KPI_INDEX[name]]
+    correlation, avg_spread, spread_std_dev = column('correlation_with_leader'), column('avg_spread'), column('spread_std_dev')
+    active = column('is_frozen') == 0
+    spread_level, spread_stability = np.zeros(len(kpis)), np.zeros(len(kpis))
+    if active.any():
+        positive = avg_spread[active & (avg_spread > 0)]
+        best_spread = positive.min() if positive.size else 1
+        positive = spread_std_dev[active & (spread_std_dev > 0)]
+        min_std_dev = positive.min() if positive.size else 1
+        np.divide(best_spread * 100, avg_spread, out=spread_level, where=avg_spread > 0)
+        np.divide(min_std_dev * 100, spread_std_dev, out=spread_stability, where=spread_std_dev > 0)
+    sub_scores = {
+        'score_authenticity': np.where(correlation > 0.95, np.maximum(0, (correlation - 0.95) / 0.05) * 50, 0) + column('tick_distribution_p_value') * 50,
+        'score_integrity': column('data_integrity_score'),
+        'score_execution': (1 - np.minimum(np.abs(1 - column('asymmetric_slippage_ratio')), 2) / 2) * 100,
+        'score_spread_level': spread_level,
+        'score_spread_stability': spread_stability,
+        'score_feed_stability': column('feed_stability_score'),
+        'score_quote_freeze': np.where(column('uniqueness_ratio') > runtime_config.current.QUOTE_FREEZE_UNIQUENESS_RATIO, 100.0, 0.0),
+        'score_tps': np.minimum((column('tps') / 25) * 100, 100),
+    }
+    return np.column_stack([sub_scores[name] for name in SUB_SCORES])
 
-            # --- Changed in v13 ---
-            # Add current score to history
-            state.add_score_to_history(kpis['quality_score'], time.time())
-            
-            # Add timeframe averages and short history for sparkline to the response
-            kpis['timeframe_averages'] = calculate_timeframe_averages(state.quality_score_history)
-            kpis['score_history'] = [s for ts, s in list(state.quality_score_history)[-30:]] # last 30 for sparkline
-            # --- End Change ---
+def score_kpis(kpis: np.ndarray, weights: Optional[Dict[str, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Scoring stage: sub-scores and quality scores for a KPI matrix, the weights
+    applied as one matrix-vector product. Rescoring with other weights only
+    needs the KPI matrix.
+    """
+    sub_scores = sub_score_matrix(kpis)
+    return sub_scores, np.clip(sub_scores @ weight_vector(weights), 0, 100)
 
-        final_results[symbol] = symbol_results
+def score_symbol(brokers_list: List[BrokerState]) -> Dict[str, Dict]:
+    """
+    Computes KPIs, sub-scores and the quality score of every broker of one symbol.
+    Reads broker state only, so it also runs on BrokerSnapshots in worker processes.
+    """
+    if not brokers_list: return {}
+    kpis = analysis_engine.kpi_matrix(brokers_list)
+    sub_scores, quality_scores = score_kpis(kpis)
+    symbol_results = {}
+    for state, kpi_row, sub_score_row, quality_score in zip(brokers_list, kpis.tolist(), sub_scores.tolist(), quality_scores.tolist()):
+        result = {"broker_name": state.broker_name, "verified_glitches_log": list(state.verified_glitches)[:5], **dict(zip(KPI_COLUMNS, kpi_row))}
+        result['is_leader'], result['is_frozen'], result['tps'] = bool(result['is_leader']), bool(result['is_frozen']), int(result['tps'])
+        result.update(zip(SUB_SCORES, sub_score_row))
+        result['quality_score'] = quality_score
+        symbol_results[state.broker_name] = result
+    return symbol_results
+
+def record_score_history(brokers_list: List[BrokerState], symbol_results: Dict[str, Dict], timestamp: float):
+    """Appends each broker's new quality score to its history and reports the history KPIs."""
+    for state in brokers_list:
+        kpis = symbol_results.get(state.broker_name)
+        if kpis is None: continue
+        # --- Changed in v13 ---
+        # Add current score to history
+        state.add_score_to_history(kpis['quality_score'], timestamp)
         
-    return final_results
+        # Add timeframe averages and short history for sparkline to the response
+        kpis['timeframe_averages'] = calculate_timeframe_averages(state.quality_score_history)
+        kpis['score_history'] = state.quality_score_history.last(30).tolist() # last 30 for sparkline
+        # --- End Change ---
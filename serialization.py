@@ -0,0 +1,50 @@
+# serialization.py
+# v14.0: One-time encoding of analysis snapshots for every outgoing channel.
+
+import json
+from collections import deque
+from typing import Any, Dict, Optional
+import numpy as np
+
+try:
+    import orjson  # optional, much faster than the stdlib encoder
+except ImportError:
+    orjson = None
+
+def to_native(obj: Any) -> Any:
+    """Recursively converts NumPy scalars/arrays and containers into plain Python types."""
+    if isinstance(obj, dict):
+        return {key: to_native(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple, deque)):
+        return [to_native(value) for value in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return obj
+
+def dumps(obj: Any) -> bytes:
+    """Encodes to compact JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=to_native, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=to_native, separators=(',', ':')).encode('utf-8')
+
+def dumps_text(obj: Any) -> str:
+    return dumps(obj).decode('utf-8')
+
+class AnalysisSnapshot:
+    """
+    One analysis cycle's results, converted to native types and encoded once.
+    The REST endpoint, initial WebSocket sends and resyncs all reuse the bytes.
+    """
+    def __init__(self, results: Dict):
+        self.results = to_native(results)
+        self.payload = dumps(self.results)
+        self._full_analysis_message: Optional[str] = None
+
+    @property
+    def full_analysis_message(self) -> str:
+        """The `full_analysis` WebSocket message, built around the cached payload bytes."""
+        if self._full_analysis_message is None:
+            self._full_analysis_message = (b'{"type":"full_analysis","payload":' + self.payload + b'}').decode('utf-8')
+        return self._full_analysis_message
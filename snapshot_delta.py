@@ -0,0 +1,87 @@
+# snapshot_delta.py
+# v14.0: Delta encoding for periodic analysis broadcasts.
+
+import math
+from typing import Any, Dict, Iterable
+
+def compute_merge_patch(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns a JSON merge patch (RFC 7386) that turns `previous` into `current`.
+
+    Nested dicts are diffed key by key; any other changed value (numbers,
+    lists such as score_history) is sent whole. Removed keys map to None.
+    Applying the same patch twice is harmless, but an older patch applied on
+    top of a newer snapshot rolls fields back, so resyncs drop queued patches.
+    """
+    patch: Dict[str, Any] = {}
+    for key, value in current.items():
+        if key not in previous:
+            patch[key] = value
+            continue
+        old_value = previous[key]
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            nested = compute_merge_patch(old_value, value)
+            if nested: patch[key] = nested
+        elif old_value != value:
+            patch[key] = value
+    for key in previous:
+        if key not in current:
+            patch[key] = None
+    return patch
+
+
+def _quantize(value: Any, step: float) -> Any:
+    if isinstance(value, dict): return {key: _quantize(item, step) for key, item in value.items()}
+    if isinstance(value, list): return [_quantize(item, step) for item in value]
+    if isinstance(value, float) and math.isfinite(value): return round(round(value / step) * step, 6)
+    return value
+
+
+class DeltaEncoder:
+    """
+    Turns successive analysis results into merge patches for dashboards.
+
+    Patches are taken against a broadcast view of the results rather than the
+    raw values, so fields that drift every cycle do not resend the payload:
+    fields in `steps` are rounded to that step (lists and dicts element-wise),
+    `slow_fields` keep their last broadcast value until `slow_interval` seconds
+    have passed, and `skip_fields` (streamed on their own channel) are left out.
+
+    `snapshot` is the view plus the latest skipped fields; it is what dashboards
+    must be sent on connect and on resync, so that the following patches apply
+    to exactly the values they were computed against.
+    """
+    def __init__(self, steps: Dict[str, float], slow_fields: Iterable[str], slow_interval: float, skip_fields: Iterable[str] = ()):
+        self.steps = dict(steps)
+        self.slow_fields = frozenset(slow_fields)
+        self.slow_interval = slow_interval
+        self.skip_fields = frozenset(skip_fields)
+        self.view: Dict[str, Any] = {}
+        self.snapshot: Dict[str, Any] = {}
+        self.slow_refreshed_at = float('-inf')
+
+    def encode(self, results: Dict[str, Dict[str, Dict[str, Any]]], now: float) -> Dict[str, Any]:
+        refresh_slow = now - self.slow_refreshed_at >= self.slow_interval
+        if refresh_slow: self.slow_refreshed_at = now
+        view: Dict[str, Any] = {}
+        snapshot: Dict[str, Any] = {}
+        for symbol, brokers in results.items():
+            previous_symbol = self.view.get(symbol, {})
+            view[symbol], snapshot[symbol] = {}, {}
+            for broker, kpis in brokers.items():
+                previous = previous_symbol.get(broker)
+                entry, skipped = {}, {}
+                for key, value in kpis.items():
+                    if key in self.skip_fields:
+                        skipped[key] = value
+                        continue
+                    if key in self.slow_fields and not refresh_slow and previous is not None and key in previous:
+                        entry[key] = previous[key]
+                        continue
+                    step = self.steps.get(key)
+                    entry[key] = value if step is None else _quantize(value, step)
+                view[symbol][broker] = entry
+                snapshot[symbol][broker] = {**entry, **skipped} if skipped else entry
+        patch = compute_merge_patch(self.view, view)
+        self.view, self.snapshot = view, snapshot
+        return patch
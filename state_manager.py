@@ -3,19 +3,35 @@
 
 import time
 import re
-from typing import Dict, List, Deque, Any
+import struct
+from typing import Dict, List, Deque, Any, Optional, Tuple
 from collections import deque
 import math
 from fastapi import Request
 import numpy as np
 
+import clock
+import runtime_config
+from tick_buffer import TickBuffer
+from serialization import AnalysisSnapshot
+from rolling_stats import RollingStats, RollingMoments
+from score_history import ScoreHistory, RollupTier
+from correlation import LeaderCorrelationTracker
+from event_time import ClockOffsetEstimator, ReorderBuffer
+import journal as tick_journal
+from journal import Journal, KIND_TICK, KIND_SLIPPAGE, KIND_LATENCY, KIND_SCORE, KIND_GLITCH, ORDER_TYPES
 from config import (
-    TICK_BUFFER_SIZE, DYNAMIC_THRESHOLD_STD_FACTOR, PENALTY_DECAY_INTERVAL,
-    PENALTY_DECAY_RATE, MAX_SCORE_HISTORY_RECORDS
+    SCORE_TIMEFRAMES, SCORE_HISTORY_TIERS, SPREAD_HISTORY_TIERS, GLITCH_HISTORY_SIZE, CORRELATION_MODE, CORRELATION_WINDOW,
+    CORRELATION_HALFLIFE, CORRELATION_LAG_MS, TICK_TIME_SOURCE, CLOCK_OFFSET_WINDOW, REORDER_WINDOW_MS,
+    REORDER_BUFFER_SIZE, JOURNAL_DIR, JOURNAL_SEGMENT_BYTES, JOURNAL_RETENTION
 )
 
 instrument_states: Dict[str, Dict[str, 'BrokerState']] = {}
-latest_analysis_results = {}
+broker_clocks: Dict[str, ClockOffsetEstimator] = {} # one per collector (broker name)
+journal: Optional[Journal] = None # set by open_journal(); None while replaying
+latest_analysis_snapshot = AnalysisSnapshot({})
+SPREAD_SAMPLE_WINDOW = 200
+TICK_INTERVAL_WINDOW = 200
 def normalize_symbol(symbol: str) -> str:
     match = re.match(r"([A-Z]{6})", symbol.upper())
     return match.group(1) if match else re.sub(r'[^A-Z0-9]', '', symbol.upper())
@@ -28,65 +44,166 @@ class BrokerState:
     def __init__(self, broker_name: str, symbol: str):
         self.broker_name = broker_name
         self.symbol = symbol
-        self.last_update_time = time.time()
-        self.ticks: Deque[Dict[str, Any]] = deque(maxlen=TICK_BUFFER_SIZE)
+        self.last_update_time = clock.now()
+        settings = runtime_config.current
+        self.ticks = TickBuffer(settings.TICK_BUFFER_SIZE)
+        self.price_change_stats = RollingStats(settings.GLITCH_DETECTION_WINDOW)
         self.potential_glitches: List[Dict[str, Any]] = []
         self.penalty_score = 0.0
-        self.last_penalty_decay_time = time.time()
+        self.last_penalty_decay_time = clock.now()
 
         self.is_leader = False
-        self.spread_samples: Deque[float] = deque(maxlen=200)
 
-        self.quality_score_history: Deque[tuple[float, float]] = deque(maxlen=MAX_SCORE_HISTORY_RECORDS)
+        self.quality_score_history = ScoreHistory(settings.MAX_SCORE_HISTORY_RECORDS, SCORE_TIMEFRAMES, SCORE_HISTORY_TIERS)
 
         self.verified_glitches: Deque[Dict[str, Any]] = deque(maxlen=100)
+        # Long-range history for the history API: spread rollups and (timestamp, bid, severity) of verified glitches
+        self.spread_history = [RollupTier(resolution, capacity) for resolution, capacity in SPREAD_HISTORY_TIERS]
+        self.spreads_folded = 0 # ticks.total already folded into spread_history
+        self.glitch_history: Deque[Tuple[float, float, float]] = deque(maxlen=GLITCH_HISTORY_SIZE)
         self.slippage_samples: Deque[Dict[str, float]] = deque(maxlen=200)
         self.latency_samples: Deque[float] = deque(maxlen=100)
-        self.tick_intervals: Deque[float] = deque(maxlen=200)
+        self.interval_moments = RollingMoments(TICK_INTERVAL_WINDOW)
         self.last_tick_time = None
         self.correlation_with_leader = 0.5
+        self.correlation_tracker = LeaderCorrelationTracker(CORRELATION_MODE, CORRELATION_WINDOW, CORRELATION_HALFLIFE, CORRELATION_LAG_MS / 1000)
         self.current_spread = 0.0
 
+        # Bumped by every tick, slippage and latency sample; analysis skips work
+        # that only depends on data when it has not moved.
+        self.generation = 0
+        self.data_kpi_cache = (-1, None)  # (generation, KPI vector), see analysis_engine.get_data_kpis
+        self.normality_cache = (None, 0.5) # (interval count at last test, p-value)
+        self._ticks_copy = None         # detached tick buffer reused by snapshots
+        self.reorder_buffer = ReorderBuffer(REORDER_WINDOW_MS / 1000, REORDER_BUFFER_SIZE)
+
+    @property
+    def spread_samples(self) -> np.ndarray:
+        """The last 200 spreads, read straight from the tick buffer."""
+        return self.ticks.last('spread', SPREAD_SAMPLE_WINDOW)
+
+    @property
+    def tick_intervals(self) -> Deque[float]:
+        """The last 200 tick intervals (seconds), kept by interval_moments."""
+        return self.interval_moments.values
+
     def add_score_to_history(self, score: float, timestamp: float):
         """Adds a new score with its timestamp to the history."""
-        self.quality_score_history.append((timestamp, score))
+        self.quality_score_history.add(timestamp, score)
+        if journal is not None: journal.record(KIND_SCORE, self.broker_name, self.symbol, timestamp, score)
 
     def add_tick(self, bid: float, ask: float, timestamp: float) -> float:
         """
         Processes a new tick and returns the current spread.
         """
+        self.generation += 1
+        if journal is not None: journal.record(KIND_TICK, self.broker_name, self.symbol, timestamp, bid, ask)
         self.last_update_time = timestamp
         if self.last_tick_time:
-            self.tick_intervals.append(timestamp - self.last_tick_time)
+            self.interval_moments.push(timestamp - self.last_tick_time)
         self.last_tick_time = timestamp
 
         if ask > bid:
             spread = (ask - bid) * 100000
             self.current_spread = spread # ذخیره اسپرد لحظه‌ای
-            price_change = abs(bid - self.ticks[-1]['bid']) if self.ticks else 0
-            self.ticks.append({'bid': bid, 'ask': ask, 'spread': spread, 'timestamp': timestamp, 'price_change': price_change})
-            self.spread_samples.append(spread)
-            if len(self.ticks) > 50:
-                recent_changes = [t['price_change'] for t in self.ticks][-50:]
-                mean_change, std_change = np.mean(recent_changes), np.std(recent_changes)
-                if std_change > 1e-9 and price_change > mean_change + (DYNAMIC_THRESHOLD_STD_FACTOR * std_change):
-                    self.potential_glitches.append(self.ticks[-1])
+            price_change = abs(bid - self.ticks.latest('bid')) if self.ticks else 0
+            if self.ticks.total - self.spreads_folded >= self.ticks.capacity: self.fold_spread_history() # before the oldest is overwritten
+            self.ticks.append(bid, ask, spread, timestamp, price_change)
+            self.price_change_stats.push(price_change)
+            settings = runtime_config.current
+            if len(self.ticks) > settings.GLITCH_DETECTION_WINDOW:
+                mean_change, std_change = self.price_change_stats.mean, self.price_change_stats.std
+                if std_change > 1e-9 and price_change > mean_change + (settings.DYNAMIC_THRESHOLD_STD_FACTOR * std_change):
+                    self.potential_glitches.append(self.ticks.record(-1))
             return spread # بازگرداندن اسپرد جدید
         return self.current_spread # اگر تیک معتبر نبود، اسپرد قبلی را باز می‌گردانیم
 
+    def add_ticks(self, bids: np.ndarray, asks: np.ndarray, timestamps: np.ndarray) -> float:
+        """
+        Bulk add_tick() for time-ordered arrays (backtests): the same buffers,
+        statistics and glitch candidates, computed with array operations.
+        """
+        n = len(timestamps)
+        if n == 0: return self.current_spread
+        self.generation += n
+        if journal is not None:
+            for timestamp, bid, ask in zip(timestamps.tolist(), bids.tolist(), asks.tolist()):
+                journal.record(KIND_TICK, self.broker_name, self.symbol, timestamp, bid, ask)
+        intervals = np.diff(timestamps, prepend=self.last_tick_time) if self.last_tick_time else np.diff(timestamps)
+        self.interval_moments.extend(intervals)
+        self.last_update_time = self.last_tick_time = float(timestamps[-1])
+
+        valid = asks > bids
+        bids, asks, timestamps = bids[valid], asks[valid], timestamps[valid]
+        if bids.size == 0: return self.current_spread
+        spreads = (asks - bids) * 100000
+        previous_bids = np.concatenate(([self.ticks.latest('bid') if self.ticks else bids[0]], bids[:-1]))
+        price_changes = np.abs(bids - previous_bids)
+
+        # Each tick is tested against the price-change window that ends with it
+        stats, ticks_before = self.price_change_stats, len(self.ticks)
+        changes = np.concatenate((np.fromiter(stats.values, dtype=np.float64, count=len(stats)), price_changes))
+        self.fold_spread_history()
+        self.ticks.extend(bids, asks, spreads, timestamps, price_changes)
+        for tier in self.spread_history: tier.extend(timestamps, spreads)
+        self.spreads_folded = self.ticks.total
+        stats.extend(price_changes)
+        self.current_spread = float(spreads[-1])
+
+        settings = runtime_config.current
+        ends = len(changes) - len(price_changes) + np.arange(len(price_changes))
+        tested = (ends >= stats.window - 1) & (np.minimum(ticks_before + np.arange(1, len(price_changes) + 1), self.ticks.capacity) > settings.GLITCH_DETECTION_WINDOW)
+        if tested.any():
+            windows = np.lib.stride_tricks.sliding_window_view(changes, stats.window)[ends[tested] - stats.window + 1]
+            means, stds = windows.mean(axis=1), windows.std(axis=1)
+            candidates = np.flatnonzero(tested)[(stds > 1e-9) & (price_changes[tested] > means + settings.DYNAMIC_THRESHOLD_STD_FACTOR * stds)]
+            for i in candidates.tolist():
+                self.potential_glitches.append({'bid': float(bids[i]), 'ask': float(asks[i]), 'spread': float(spreads[i]),
+                                                'timestamp': float(timestamps[i]), 'price_change': float(price_changes[i])})
+        return self.current_spread
+
+    def fold_spread_history(self):
+        """
+        Folds the spreads of ticks appended since the last call into the spread
+        rollups, in one bulk step instead of per tick. Runs every analysis cycle
+        and whenever unfolded ticks would otherwise be overwritten.
+        """
+        pending = min(self.ticks.total - self.spreads_folded, len(self.ticks))
+        if pending > 0:
+            for tier in self.spread_history: tier.extend(self.ticks.last('timestamp', pending), self.ticks.last('spread', pending))
+        self.spreads_folded = self.ticks.total
+
+    def add_event_tick(self, bid: float, ask: float, event_time: float) -> float:
+        """
+        Queues a tick stamped with its (server-clock) event time and applies the
+        ticks the reorder buffer releases. Returns the current spread.
+        """
+        for timestamp, (tick_bid, tick_ask) in self.reorder_buffer.push(event_time, (bid, ask)):
+            self.add_tick(tick_bid, tick_ask, timestamp)
+        return self.current_spread
+
+    def flush_reorder_buffer(self, now: float):
+        """Releases buffered ticks whose reorder window has passed on the server clock."""
+        for timestamp, (tick_bid, tick_ask) in self.reorder_buffer.release(now - self.reorder_buffer.window):
+            self.add_tick(tick_bid, tick_ask, timestamp)
+
     def add_simulated_slippage(self, order_type: str, request_price: float):
         if not self.ticks: return
-        last_tick, slippage_pips = self.ticks[-1], 0
-        if order_type == "BUY": slippage_pips = (last_tick['ask'] - request_price) * 100000
-        elif order_type == "SELL": slippage_pips = (request_price - last_tick['bid']) * 100000
+        slippage_pips = 0
+        if order_type == "BUY": slippage_pips = (self.ticks.latest('ask') - request_price) * 100000
+        elif order_type == "SELL": slippage_pips = (request_price - self.ticks.latest('bid')) * 100000
         self.slippage_samples.append({'type': order_type, 'slippage_pips': slippage_pips})
+        self.generation += 1
+        if journal is not None and order_type in ORDER_TYPES:
+            journal.record(KIND_SLIPPAGE, self.broker_name, self.symbol, clock.now(), slippage_pips, flag=ORDER_TYPES.index(order_type))
 
     def apply_penalty_decay(self):
-        now = time.time()
+        now = clock.now()
         elapsed = now - self.last_penalty_decay_time
-        if elapsed >= PENALTY_DECAY_INTERVAL:
-            cycles = math.floor(elapsed / PENALTY_DECAY_INTERVAL)
-            self.penalty_score *= (PENALTY_DECAY_RATE ** cycles)
+        settings = runtime_config.current
+        if elapsed >= settings.PENALTY_DECAY_INTERVAL:
+            cycles = math.floor(elapsed / settings.PENALTY_DECAY_INTERVAL)
+            self.penalty_score *= (settings.PENALTY_DECAY_RATE ** cycles)
             if self.penalty_score < 1e-5: self.penalty_score = 0.0
             self.last_penalty_decay_time = now
 
@@ -95,17 +212,267 @@ class BrokerState:
         glitch['time_str'] = time.strftime('%H:%M:%S', time.localtime(glitch['timestamp']))
         self.verified_glitches.appendleft(glitch)
         self.penalty_score = min(100, self.penalty_score + severity)
+        self._record_glitch(glitch)
+
+    def _record_glitch(self, glitch: Dict[str, Any]):
+        self.glitch_history.append((glitch['timestamp'], glitch['bid'], glitch['severity']))
+        if journal is not None: journal.record(KIND_GLITCH, self.broker_name, self.symbol, glitch['timestamp'], glitch['bid'], glitch['severity'])
 
     def add_latency_sample(self, latency_ms: float):
         self.latency_samples.append(latency_ms)
+        self.generation += 1
+        if journal is not None: journal.record(KIND_LATENCY, self.broker_name, self.symbol, clock.now(), latency_ms)
+
+    def slippage_pips(self) -> np.ndarray:
+        return np.array([s['slippage_pips'] for s in self.slippage_samples], dtype=np.float64)
+
+    def ticks_copy(self) -> TickBuffer:
+        """A detached copy of the tick buffer, reused until the next tick arrives."""
+        if self._ticks_copy is None or self._ticks_copy.total != self.ticks.total:
+            self._ticks_copy = self.ticks.copy()
+        return self._ticks_copy
+
+    def resized_buffers(self, settings: 'runtime_config.RuntimeConfig') -> Dict[str, Any]:
+        """
+        Allocates the buffers a new runtime config needs, filled with the newest data
+        that fits (all of it when growing). The current buffers are left as they are.
+        """
+        buffers: Dict[str, Any] = {}
+        if self.ticks.capacity != settings.TICK_BUFFER_SIZE:
+            self.fold_spread_history() # ticks a shrink drops must reach the spread rollups first
+            buffers['ticks'] = self.ticks.resized(settings.TICK_BUFFER_SIZE)
+        if self.price_change_stats.window != settings.GLITCH_DETECTION_WINDOW:
+            buffers['price_change_stats'] = self.price_change_stats.resized(settings.GLITCH_DETECTION_WINDOW)
+        if self.quality_score_history.raw.capacity != settings.MAX_SCORE_HISTORY_RECORDS:
+            buffers['score_history_raw'] = self.quality_score_history.resized_raw(settings.MAX_SCORE_HISTORY_RECORDS)
+        return buffers
+
+    def apply_settings(self, buffers: Dict[str, Any]):
+        """Swaps in buffers from resized_buffers(); only assignments, so it cannot fail halfway."""
+        if 'ticks' in buffers:
+            self.ticks = buffers['ticks']
+            self._ticks_copy = None
+        if 'price_change_stats' in buffers: self.price_change_stats = buffers['price_change_stats']
+        if 'score_history_raw' in buffers: self.quality_score_history.raw = buffers['score_history_raw']
+        self.data_kpi_cache = (-1, None) # thresholds such as the quote-freeze window may have changed
+
+    def snapshot(self) -> 'BrokerSnapshot':
+        """Copies everything the analysis and scoring passes read into compact arrays."""
+        return BrokerSnapshot(self)
+
+    def apply_analysis_updates(self, updates: Dict[str, Any]):
+        """
+        Merges the outcome of an analysis pass that ran on a snapshot of this broker.
+        Glitch candidates that arrived after the snapshot was taken are kept.
+        """
+        self.is_leader = updates['is_leader']
+        self.correlation_with_leader = updates['correlation_with_leader']
+        self.potential_glitches = self.potential_glitches[updates['consumed_glitches']:]
+        for glitch in reversed(updates['new_verified_glitches']):
+            self.verified_glitches.appendleft(glitch)
+            self._record_glitch(glitch)
+        self.penalty_score = updates['penalty_score']
+        self.last_penalty_decay_time = updates['last_penalty_decay_time']
+        self.data_kpi_cache = updates['data_kpi_cache']
+        self.normality_cache = updates['normality_cache']
+
+
+class BrokerSnapshot:
+    """
+    A detached, picklable copy of the parts of a BrokerState used by analysis_engine
+    and scoring_engine. Analysis threads and worker processes run on snapshots
+    while ingestion keeps mutating the live state, and send back only the
+    resulting updates (see BrokerState.apply_analysis_updates).
+    """
+    RECENT_GLITCHES = 5 # only the newest verified glitches are reported
+
+    def __init__(self, state: BrokerState):
+        self.broker_name = state.broker_name
+        self.symbol = state.symbol
+        self.last_update_time = state.last_update_time
+        self.ticks = state.ticks_copy()  # shared between snapshots, never appended to
+        self.interval_moments = state.interval_moments.copy()
+        self.latency_samples = np.array(state.latency_samples, dtype=np.float64)
+        self._slippage_pips = state.slippage_pips()
+        self.potential_glitches = list(state.potential_glitches)
+        self.verified_glitches: Deque[Dict[str, Any]] = deque(list(state.verified_glitches)[:self.RECENT_GLITCHES], maxlen=100)
+        self.penalty_score = state.penalty_score
+        self.last_penalty_decay_time = state.last_penalty_decay_time
+        self.is_leader = state.is_leader
+        self.correlation_with_leader = state.correlation_with_leader
+        self.correlation_tracker = None # supplied by whoever runs the analysis
+        self.current_spread = state.current_spread
+        self.generation = state.generation
+        self.data_kpi_cache = state.data_kpi_cache
+        self.normality_cache = state.normality_cache
+        self._initial_glitch_count = len(self.potential_glitches)
+        self._initial_verified_count = len(self.verified_glitches)
+
+    # The same bookkeeping as the live state
+    spread_samples = BrokerState.spread_samples
+    tick_intervals = BrokerState.tick_intervals
+    apply_penalty_decay = BrokerState.apply_penalty_decay
+    add_verified_glitch = BrokerState.add_verified_glitch
+
+    def _record_glitch(self, glitch: Dict[str, Any]):
+        pass # recorded by the live state when the updates are applied
+
+    def slippage_pips(self) -> np.ndarray:
+        return self._slippage_pips
+
+    def analysis_updates(self) -> Dict[str, Any]:
+        new_verified = len(self.verified_glitches) - self._initial_verified_count
+        return {
+            'is_leader': self.is_leader,
+            'correlation_with_leader': self.correlation_with_leader,
+            'consumed_glitches': self._initial_glitch_count - len(self.potential_glitches),
+            'new_verified_glitches': list(self.verified_glitches)[:max(new_verified, 0)],
+            'penalty_score': self.penalty_score,
+            'last_penalty_decay_time': self.last_penalty_decay_time,
+            'data_kpi_cache': self.data_kpi_cache,
+            'normality_cache': self.normality_cache,
+        }
 
 def get_all_brokers_by_symbol() -> Dict[str, List[BrokerState]]:
     return {symbol: list(brokers.values()) for symbol, brokers in instrument_states.items()}
-def set_latest_analysis_results(results: Dict):
-    global latest_analysis_results
-    latest_analysis_results = results
+def set_latest_analysis_results(results: Dict) -> AnalysisSnapshot:
+    global latest_analysis_snapshot
+    latest_analysis_snapshot = AnalysisSnapshot(results)
+    return latest_analysis_snapshot
 def get_latest_analysis_results() -> Dict:
-    return latest_analysis_results
+    return latest_analysis_snapshot.results
+def get_latest_analysis_snapshot() -> AnalysisSnapshot:
+    return latest_analysis_snapshot
+
+def get_or_create_broker_state(broker: str, symbol: str) -> BrokerState:
+    if symbol not in instrument_states: instrument_states[symbol] = {}
+    if broker not in instrument_states[symbol]: instrument_states[symbol][broker] = BrokerState(broker, symbol)
+    return instrument_states[symbol][broker]
+
+# --- Journal replay ---
+def restore_from_journal(streams: List[tuple], records: np.ndarray, keep_glitches: bool = False) -> int:
+    """
+    Rebuilds broker states from journal records (in write order). The newest
+    ticks go through add_tick so derived state (intervals, glitch thresholds)
+    matches a live run; samples and the score history are restored in bulk.
+    Glitch candidates found while replaying are dropped unless `keep_glitches`
+    (replaying on top of a checkpoint, where they were not judged yet).
+    Returns the number of broker states restored.
+    """
+    if records.size == 0: return 0
+    grouped = records[np.argsort(records['stream'], kind='stable')]
+    restored = 0
+    for group in np.split(grouped, np.flatnonzero(np.diff(grouped['stream'])) + 1):
+        stream = int(group['stream'][0])
+        if stream >= len(streams): continue
+        broker, symbol = streams[stream]
+        state = get_or_create_broker_state(broker, symbol)
+        kinds = group['kind']
+        settings = runtime_config.current
+        ticks = group[kinds == KIND_TICK]
+        replayed = min(len(ticks), settings.TICK_BUFFER_SIZE + settings.GLITCH_DETECTION_WINDOW)
+        older = ticks[:len(ticks) - replayed]
+        older = older[older['b'] > older['a']]
+        for tier in state.spread_history: tier.extend(older['timestamp'], (older['b'] - older['a']) * 100000)
+        for timestamp, bid, ask in zip(ticks['timestamp'][-replayed:].tolist(), ticks['a'][-replayed:].tolist(), ticks['b'][-replayed:].tolist()):
+            state.add_tick(bid, ask, timestamp)
+        glitches = group[kinds == KIND_GLITCH]
+        state.glitch_history.extend(zip(glitches['timestamp'].tolist(), glitches['a'].tolist(), glitches['b'].tolist()))
+        slippage = group[kinds == KIND_SLIPPAGE][-state.slippage_samples.maxlen:]
+        state.slippage_samples.extend({'type': ORDER_TYPES[flag], 'slippage_pips': pips} for flag, pips in zip(slippage['flag'].tolist(), slippage['a'].tolist()))
+        state.latency_samples.extend(group[kinds == KIND_LATENCY]['a'][-state.latency_samples.maxlen:].tolist())
+        scores = group[kinds == KIND_SCORE]
+        state.quality_score_history.extend(scores['timestamp'], scores['a'])
+        if not keep_glitches: state.potential_glitches = []
+        restored += 1
+    return restored
+
+def open_journal(position: Optional[tick_journal.JournalPosition] = None) -> tuple:
+    """
+    Replays the retained journal (only what was written after `position`, when a
+    checkpoint was loaded) into instrument_states, then starts journaling.
+    Returns (journal, records replayed).
+    """
+    global journal
+    streams, records = tick_journal.load(JOURNAL_DIR, time.time() - JOURNAL_RETENTION, position)
+    restore_from_journal(streams, records, keep_glitches=position is not None)
+    journal = Journal(JOURNAL_DIR, JOURNAL_SEGMENT_BYTES, JOURNAL_RETENTION)
+    return journal, int(records.size)
+
+def apply_runtime_config() -> bool:
+    """
+    Applies staged runtime config changes. Called at the start of an analysis
+    cycle (never during one), so every cycle runs on a single config version.
+    """
+    settings = runtime_config.staged()
+    if settings is None: return False
+    # Every broker's new buffers are allocated before any is swapped in, so a
+    # failure (MemoryError included) drops the change with no broker touched.
+    # Old and new buffers coexist until the swap, which is the peak memory cost.
+    states = [state for brokers in instrument_states.values() for state in brokers.values()]
+    try:
+        resized = [(state, state.resized_buffers(settings)) for state in states]
+    except Exception as e:
+        runtime_config.discard(f"{type(e).__name__}: {e}")
+        return False
+    for state, buffers in resized: state.apply_settings(buffers)
+    runtime_config.publish(settings)
+    return True
+
+def get_broker_clock(broker: str) -> ClockOffsetEstimator:
+    if broker not in broker_clocks: broker_clocks[broker] = ClockOffsetEstimator(CLOCK_OFFSET_WINDOW)
+    return broker_clocks[broker]
+
+def to_server_time(broker: str, collector_time_ms: float, receipt_time: float) -> float:
+    """Maps a collector timestamp onto the server clock, learning from this arrival too."""
+    collector_time = collector_time_ms / 1000
+    estimator = get_broker_clock(broker)
+    estimator.add(receipt_time - collector_time)
+    return collector_time + estimator.offset
+
+def flush_reorder_buffers(now: float):
+    for brokers in instrument_states.values():
+        for state in brokers.values():
+            if state.reorder_buffer: state.flush_reorder_buffer(now)
+
+def fold_spread_histories():
+    for brokers in instrument_states.values():
+        for state in brokers.values():
+            state.fold_spread_history()
+
+def apply_tick(state: BrokerState, bid: float, ask: float, receipt_time: float, collector_time_ms: Optional[float]) -> float:
+    """Stamps a tick by TICK_TIME_SOURCE and applies it (through the reorder buffer in event mode)."""
+    if TICK_TIME_SOURCE != "event":
+        return state.add_tick(bid, ask, receipt_time)
+    event_time = receipt_time if collector_time_ms is None else to_server_time(state.broker_name, collector_time_ms, receipt_time)
+    return state.add_event_tick(bid, ask, event_time)
+
+def _collector_time(field: str) -> Optional[float]:
+    try: return float(field)
+    except ValueError: return None
+
+def process_tick_message(message: str, timestamp: float) -> Dict[str, Any]:
+    """
+    Applies one `broker,symbol,collector_time_ms,bid,ask` line received at `timestamp`
+    and returns tick data for real-time updates.
+    """
+    parts = message.split(',')
+    if len(parts) == 5:
+        broker, raw_symbol, collector_time_str, bid_str, ask_str = parts
+        bid, ask = float(sanitize_price_string(bid_str)), float(sanitize_price_string(ask_str))
+        symbol = normalize_symbol(raw_symbol)
+        current_spread = apply_tick(get_or_create_broker_state(broker, symbol), bid, ask, timestamp, _collector_time(collector_time_str))
+
+        # بازگرداندن داده‌های تیک برای ارسال آنی
+        return {
+            "status": "success",
+            "tick_data": {
+                "symbol": symbol,
+                "broker": broker,
+                "current_spread": current_spread
+            }
+        }
+    return {"status": "invalid_format"}
 
 async def handle_tick_request(request: Request):
     """
@@ -113,51 +480,151 @@ async def handle_tick_request(request: Request):
     """
     try:
         body = await request.body(); message = body.decode('utf-8')
-        parts = message.split(',');
-        if len(parts) == 5:
-            broker, raw_symbol, _, bid_str, ask_str = parts
-            bid, ask = float(sanitize_price_string(bid_str)), float(sanitize_price_string(ask_str))
-            symbol = normalize_symbol(raw_symbol)
-            if symbol not in instrument_states: instrument_states[symbol] = {}
-            if broker not in instrument_states[symbol]: instrument_states[symbol][broker] = BrokerState(broker, symbol)
-
-            current_spread = instrument_states[symbol][broker].add_tick(bid, ask, time.time())
-            
-            # بازگرداندن داده‌های تیک برای ارسال آنی
-            return {
-                "status": "success",
-                "tick_data": {
-                    "symbol": symbol,
-                    "broker": broker,
-                    "current_spread": current_spread
-                }
-            }
-        return {"status": "invalid_format"}
+        return process_tick_message(message, time.time())
     except Exception as e: return {"status": "error", "detail": str(e)}
 
+# --- Batched tick ingestion ---
+# Binary frames: header '<4sHHI' (magic, broker_len, symbol_len, count), then the
+# UTF-8 broker and symbol names, then `count` little-endian float64 records of
+# (collector_time_ms, bid, ask). Several frames may be concatenated in one body.
+TICK_FRAME_MAGIC = b'GTB1'
+TICK_FRAME_HEADER = struct.Struct('<4sHHI')
+TICK_FRAME_RECORD = np.dtype([('timestamp', '<f8'), ('bid', '<f8'), ('ask', '<f8')])
+
+def _new_batch_summary() -> Dict[str, Any]:
+    return {"status": "success", "counts": {"success": 0, "rejected": 0, "invalid_format": 0, "error": 0}, "tick_data": {}}
+
+def process_tick_lines(text: str, summary: Dict[str, Any]):
+    """Applies newline-separated tick lines in order, accumulating per-status counts."""
+    counts, latest = summary["counts"], summary["tick_data"]
+    for line in text.splitlines():
+        line = line.strip()
+        if not line: continue
+        try:
+            result = process_tick_message(line, time.time())
+        except Exception:
+            counts["error"] += 1
+            continue
+        counts[result["status"]] += 1
+        if result["status"] == "success":
+            tick_data = result["tick_data"]
+            latest[(tick_data["symbol"], tick_data["broker"])] = tick_data
+
+def process_tick_frames(payload: bytes, summary: Dict[str, Any]):
+    """Decodes concatenated binary tick frames and applies their records in order."""
+    counts, latest = summary["counts"], summary["tick_data"]
+    offset = 0
+    while offset < len(payload):
+        if len(payload) - offset < TICK_FRAME_HEADER.size:
+            counts["invalid_format"] += 1
+            return
+        magic, broker_len, symbol_len, count = TICK_FRAME_HEADER.unpack_from(payload, offset)
+        names_end = offset + TICK_FRAME_HEADER.size + broker_len + symbol_len
+        frame_end = names_end + count * TICK_FRAME_RECORD.itemsize
+        if magic != TICK_FRAME_MAGIC or frame_end > len(payload):
+            counts["invalid_format"] += 1
+            return
+        # The lengths are in bytes, so each name is decoded on its own (names may be non-ASCII)
+        broker_start = offset + TICK_FRAME_HEADER.size
+        broker = payload[broker_start:broker_start + broker_len].decode('utf-8')
+        symbol = normalize_symbol(payload[broker_start + broker_len:names_end].decode('utf-8'))
+        records = np.frombuffer(payload, dtype=TICK_FRAME_RECORD, count=count, offset=names_end)
+        state = get_or_create_broker_state(broker, symbol)
+        applied = 0
+        for collector_time_ms, bid, ask in zip(records['timestamp'].tolist(), records['bid'].tolist(), records['ask'].tolist()):
+            late = state.reorder_buffer.late
+            apply_tick(state, bid, ask, time.time(), collector_time_ms)
+            # add_tick ignores ask <= bid; the reorder buffer drops ticks that arrive too late
+            if ask > bid and state.reorder_buffer.late == late: applied += 1
+        counts["success"] += applied
+        counts["rejected"] += count - applied
+        if count:
+            latest[(symbol, broker)] = {"symbol": symbol, "broker": broker, "current_spread": state.current_spread}
+        offset = frame_end
+
+async def handle_tick_batch_request(request: Request):
+    """
+    Handles a batch of ticks (newline-separated CSV lines or binary frames) in one request.
+    Returns per-status counts and the latest spread of every broker touched.
+    """
+    summary = _new_batch_summary()
+    try:
+        body = await request.body()
+        if request.headers.get('content-type', '').startswith('application/octet-stream'):
+            process_tick_frames(body, summary)
+        else:
+            process_tick_lines(body.decode('utf-8'), summary)
+    except Exception as e:
+        summary["status"] = "error"; summary["detail"] = str(e)
+    summary["tick_data"] = list(summary["tick_data"].values())
+    return summary
+
+def process_slippage_message(message: str):
+    parts = message.split(',');
+    if len(parts) == 6:
+        broker, raw_symbol, _, order_type, price_str, _ = parts
+        price = float(sanitize_price_string(price_str)); symbol = normalize_symbol(raw_symbol)
+        if symbol in instrument_states and broker in instrument_states[symbol]:
+            instrument_states[symbol][broker].add_simulated_slippage(order_type, price)
+            return {"status": "slippage_test_received"}
+
+def process_latency_message(message: str, server_receipt_time_ms: float) -> Dict[str, Any]:
+    parts = message.split(',');
+    if len(parts) == 3:
+        broker, raw_symbol, client_send_time_ms_str = parts
+        latency_ms = server_receipt_time_ms - float(client_send_time_ms_str)
+        # Raw clock difference (offset + delay), before the latency sanity range
+        get_broker_clock(broker).add(latency_ms / 1000)
+        symbol = normalize_symbol(raw_symbol)
+        if symbol in instrument_states and broker in instrument_states[symbol] and 0 < latency_ms < 5000:
+            instrument_states[symbol][broker].add_latency_sample(latency_ms)
+            return {"status": "latency_sample_received"}
+    return {"status": "invalid_format"}
+
 async def handle_slippage_request(request: Request):
     try:
         body = await request.body(); message = body.decode('utf-8')
-        parts = message.split(',');
-        if len(parts) == 6:
-            broker, raw_symbol, _, order_type, price_str, _ = parts
-            price = float(sanitize_price_string(price_str)); symbol = normalize_symbol(raw_symbol)
-            if symbol in instrument_states and broker in instrument_states[symbol]:
-                instrument_states[symbol][broker].add_simulated_slippage(order_type, price)
-                return {"status": "slippage_test_received"}
+        return process_slippage_message(message)
     except Exception as e: return {"status": "error", "detail": str(e)}
 
 async def handle_latency_request(request: Request):
     try:
         server_receipt_time_ms = time.time() * 1000
         body = await request.body(); message = body.decode('utf-8')
-        parts = message.split(',');
-        if len(parts) == 3:
-            broker, raw_symbol, client_send_time_ms_str = parts
-            latency_ms = server_receipt_time_ms - float(client_send_time_ms_str)
-            symbol = normalize_symbol(raw_symbol)
-            if symbol in instrument_states and broker in instrument_states[symbol] and 0 < latency_ms < 5000:
-                instrument_states[symbol][broker].add_latency_sample(latency_ms)
-                return {"status": "latency_sample_received"}
-        return {"status": "invalid_format"}
-    except Exception as e: return {"status": "error", "detail": str(e)}
\ No newline at end of file
+        return process_latency_message(message, server_receipt_time_ms)
+    except Exception as e: return {"status": "error", "detail": str(e)}
+
+# --- Streaming ingestion ---
+def process_ingest_frame(frame, receipt_time: float) -> Dict[str, Any]:
+    """
+    Applies one frame received on the persistent ingest channel.
+
+    Binary frames use the /tick_batch frame format. Text frames hold one message
+    per line, prefixed with its kind: `tick,<tick fields>`, `slippage,<slippage
+    fields>` or `latency,<latency fields>`. Latency samples are measured against
+    the frame's receipt time.
+    """
+    summary = _new_batch_summary()
+    if isinstance(frame, bytes):
+        try: process_tick_frames(frame, summary)
+        except Exception: summary["counts"]["error"] += 1
+    else:
+        counts, latest = summary["counts"], summary["tick_data"]
+        for line in frame.splitlines():
+            line = line.strip()
+            if not line: continue
+            kind, _, message = line.partition(',')
+            try:
+                if kind == "tick": result = process_tick_message(message, time.time())
+                elif kind == "slippage": result = process_slippage_message(message)
+                elif kind == "latency": result = process_latency_message(message, receipt_time * 1000)
+                else: result = {"status": "invalid_format"}
+            except Exception:
+                result = {"status": "error"}
+            status = result["status"] if result else "ignored"
+            counts[status] = counts.get(status, 0) + 1
+            if status == "success":
+                tick_data = result["tick_data"]
+                latest[(tick_data["symbol"], tick_data["broker"])] = tick_data
+    summary["tick_data"] = list(summary["tick_data"].values())
+    return summary
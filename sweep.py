@@ -0,0 +1,175 @@
+# sweep.py
+# v14.0: Parallel sweep of scoring weights and thresholds over recorded ticks, scored against labelled incidents.
+
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Union
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+import runtime_config
+import state_manager
+from backtest import Feed, load_feeds, run_symbol
+from scoring_engine import SUB_SCORES, weight_vector
+from config import ANALYSIS_INTERVAL, WEIGHTS, DYNAMIC_THRESHOLD_STD_FACTOR, QUOTE_FREEZE_UNIQUENESS_RATIO
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Weight-independent KPIs cached per replay. Only DYNAMIC_THRESHOLD_STD_FACTOR
+# changes them (through glitch candidates and so the integrity score); the quote
+# freeze score is rebuilt from `uniqueness_ratio` for each ratio threshold.
+CACHED_SUB_SCORES = tuple(name for name in SUB_SCORES if name != 'score_quote_freeze')
+KPI_FIELDS = CACHED_SUB_SCORES + ('uniqueness_ratio', 'is_frozen')
+
+# A feed column is shared as the path of an .npy file (memory-mapped by the
+# workers) or, when empty, inline.
+SharedFeed = Dict[str, Union[str, np.ndarray]]
+
+def share_feeds(symbols: Dict[str, Dict[str, Feed]], directory: str) -> Dict[str, Dict[str, SharedFeed]]:
+    """Writes every decoded column once so workers map it instead of re-parsing the inputs."""
+    shared: Dict[str, Dict[str, SharedFeed]] = {}
+    for s, (symbol, feeds) in enumerate(symbols.items()):
+        for b, (broker, feed) in enumerate(feeds.items()):
+            columns = shared.setdefault(symbol, {}).setdefault(broker, {})
+            for column, values in feed.items():
+                if values.size == 0:
+                    columns[column] = values
+                    continue
+                path = os.path.join(directory, f"{s}-{b}-{column}.npy")
+                np.save(path, np.ascontiguousarray(values))
+                columns[column] = path
+    return shared
+
+def open_feeds(shared: Dict[str, SharedFeed]) -> Dict[str, Feed]:
+    return {broker: {column: np.load(value, mmap_mode='r') if isinstance(value, str) else value for column, value in columns.items()}
+            for broker, columns in shared.items()}
+
+def replay_kpis(symbol: str, shared: Dict[str, SharedFeed], interval: float, threshold_factor: float) -> Dict[str, np.ndarray]:
+    """Worker entry point: one symbol's weight-independent KPIs under one glitch threshold."""
+    default = runtime_config.current
+    runtime_config.current = default.updated({'DYNAMIC_THRESHOLD_STD_FACTOR': threshold_factor}) # read by add_tick(s)
+    try:
+        return run_symbol(symbol, open_feeds(shared), interval, KPI_FIELDS)
+    finally:
+        runtime_config.current = default
+
+def expand_combinations(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Cartesian product of the parameter lists in `spec`. WEIGHTS is either a list
+    of (partial) weight dicts or a dict of per-weight value lists (a grid); both
+    are completed from config.WEIGHTS. Missing parameters keep their config value.
+    """
+    weights = spec.get('WEIGHTS', [{}])
+    if isinstance(weights, dict):
+        keys = list(weights)
+        weights = [dict(zip(keys, values)) for values in itertools.product(*(weights[k] for k in keys))]
+    unknown = {key for w in weights for key in w} - set(WEIGHTS)
+    if unknown: raise ValueError(f"Unknown weights: {sorted(unknown)}")
+    return [{'WEIGHTS': {**WEIGHTS, **w}, 'DYNAMIC_THRESHOLD_STD_FACTOR': float(factor), 'QUOTE_FREEZE_UNIQUENESS_RATIO': float(ratio)}
+            for w, factor, ratio in itertools.product(weights, spec.get('DYNAMIC_THRESHOLD_STD_FACTOR', [DYNAMIC_THRESHOLD_STD_FACTOR]),
+                                                      spec.get('QUOTE_FREEZE_UNIQUENESS_RATIO', [QUOTE_FREEZE_UNIQUENESS_RATIO]))]
+
+def final_scores(kpis: Dict[str, np.ndarray], combinations: List[Dict[str, Any]]) -> np.ndarray:
+    """Quality scores (rows x combinations) from cached KPIs: one matrix product plus the quote-freeze term."""
+    sub_scores = np.column_stack([kpis[name] for name in CACHED_SUB_SCORES])
+    weights = np.column_stack([weight_vector(c['WEIGHTS']) for c in combinations]) # SUB_SCORES x combinations
+    quote = SUB_SCORES.index('score_quote_freeze')
+    quote_weights = weights[quote]
+    weights = np.delete(weights, quote, axis=0)
+    ratios = np.array([c['QUOTE_FREEZE_UNIQUENESS_RATIO'] for c in combinations])
+    quote_freeze = np.where(kpis['uniqueness_ratio'][:, None] > ratios[None, :], 100.0, 0.0)
+    return np.clip(sub_scores @ weights + quote_freeze * quote_weights, 0, 100)
+
+def load_incidents(path: str) -> pd.DataFrame:
+    """Labelled incidents: CSV with symbol, broker, start, end (epoch seconds or date strings)."""
+    incidents = pd.read_csv(path)
+    for column in ('start', 'end'):
+        if not pd.api.types.is_numeric_dtype(incidents[column]):
+            incidents[column] = pd.to_datetime(incidents[column]).to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+    incidents['symbol'] = incidents['symbol'].astype(str).map(state_manager.normalize_symbol)
+    return incidents
+
+def evaluate(kpis: Dict[str, np.ndarray], scores: np.ndarray, incidents: pd.DataFrame, alert_threshold: float) -> Dict[str, np.ndarray]:
+    """
+    Per combination: ROC AUC of the score separating normal rows (high) from
+    incident rows (low), mean score in and out of incidents, the share of
+    incidents whose minimum score fell below `alert_threshold`, and the share
+    of normal rows below it (false alarms).
+    """
+    masks = [(kpis['symbol'] == row.symbol) & (kpis['broker'] == row.broker) & (kpis['timestamp'] >= row.start) & (kpis['timestamp'] <= row.end)
+             for row in incidents.itertuples()]
+    masks = [mask for mask in masks if mask.any()]
+    labelled = np.logical_or.reduce(masks) if masks else np.zeros(len(scores), dtype=bool)
+    n_incident, n_normal = int(labelled.sum()), int((~labelled).sum())
+    metrics = {'mean_score_incident': scores[labelled].mean(axis=0) if n_incident else np.full(scores.shape[1], np.nan),
+               'mean_score_normal': scores[~labelled].mean(axis=0) if n_normal else np.full(scores.shape[1], np.nan)}
+    if n_incident and n_normal:
+        ranks = rankdata(scores, axis=0)
+        metrics['auc'] = (ranks[~labelled].sum(axis=0) - n_normal * (n_normal + 1) / 2) / (n_incident * n_normal)
+        metrics['false_alarm_rate'] = (scores[~labelled] < alert_threshold).mean(axis=0)
+    else:
+        metrics['auc'] = metrics['false_alarm_rate'] = np.full(scores.shape[1], np.nan)
+    metrics['detection_rate'] = np.mean([scores[mask].min(axis=0) < alert_threshold for mask in masks], axis=0) if masks else np.full(scores.shape[1], np.nan)
+    metrics['incidents_matched'] = np.full(scores.shape[1], len(masks))
+    return metrics
+
+def sweep(symbols: Dict[str, Dict[str, Feed]], combinations: List[Dict[str, Any]], incidents: pd.DataFrame,
+          interval: float, workers: int, alert_threshold: float) -> pd.DataFrame:
+    """Replays each (symbol, glitch threshold) once in a process pool, then scores every combination from the cached KPIs."""
+    factors = sorted({c['DYNAMIC_THRESHOLD_STD_FACTOR'] for c in combinations})
+    tasks = [(symbol, factor) for factor in factors for symbol in symbols]
+    with tempfile.TemporaryDirectory(prefix="griffin-sweep-") as directory:
+        shared = share_feeds(symbols, directory)
+        args = ([symbol for symbol, _ in tasks], [shared[symbol] for symbol, _ in tasks], [interval] * len(tasks), [factor for _, factor in tasks])
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context("spawn")) as pool:
+                parts = list(pool.map(replay_kpis, *args))
+        else:
+            parts = list(map(replay_kpis, *args))
+
+    rows = []
+    for factor in factors:
+        tables = [part for (_, f), part in zip(tasks, parts) if f == factor and part]
+        if not tables: continue
+        kpis = {name: np.concatenate([table[name] for table in tables]) for name in tables[0]}
+        group = [c for c in combinations if c['DYNAMIC_THRESHOLD_STD_FACTOR'] == factor]
+        metrics = evaluate(kpis, final_scores(kpis, group), incidents, alert_threshold)
+        for i, combination in enumerate(group):
+            rows.append({'threshold_std_factor': factor, 'quote_freeze_ratio': combination['QUOTE_FREEZE_UNIQUENESS_RATIO'],
+                         **{f'w_{key}': value for key, value in combination['WEIGHTS'].items()},
+                         **{name: float(values[i]) for name, values in metrics.items()}})
+    return pd.DataFrame(rows).sort_values('auc', ascending=False, kind='stable') if rows else pd.DataFrame()
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep scoring weights and thresholds over recorded ticks against labelled incidents.")
+    parser.add_argument('inputs', nargs='+', help="tick CSV files and/or journal directories")
+    parser.add_argument('--params', required=True, help="JSON with lists for WEIGHTS, DYNAMIC_THRESHOLD_STD_FACTOR, QUOTE_FREEZE_UNIQUENESS_RATIO")
+    parser.add_argument('--incidents', required=True, help="CSV of labelled incidents: symbol, broker, start, end")
+    parser.add_argument('-o', '--output', default='sweep_results.csv')
+    parser.add_argument('--interval', type=float, default=ANALYSIS_INTERVAL, help="simulated seconds between analysis cycles")
+    parser.add_argument('--alert-threshold', type=float, default=50.0, help="scores below this count as an alert")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with open(args.params, encoding='utf-8') as f:
+        combinations = expand_combinations(json.load(f))
+    started = time.perf_counter()
+    symbols = load_feeds(args.inputs)
+    logging.info(f"Loaded {len(symbols)} symbols in {time.perf_counter() - started:.2f}s; {len(combinations)} combinations")
+
+    started = time.perf_counter()
+    results = sweep(symbols, combinations, load_incidents(args.incidents), args.interval, args.workers, args.alert_threshold)
+    results.to_csv(args.output, index=False)
+    logging.info(f"Swept {len(results)} combinations in {time.perf_counter() - started:.2f}s -> {args.output}")
+    if len(results): logging.info("Best:\n" + results.head(5).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# tests/test_backtest.py
+# v14.0: Backtest replays with and without the skip of unchanged symbols.
+
+import numpy as np
+import pytest
+
+import analysis_engine
+import backtest
+import state_manager
+from backtest import Feed, run_symbol
+
+@pytest.fixture(autouse=True)
+def no_journal(monkeypatch):
+    monkeypatch.setattr(state_manager, 'journal', None)
+
+def recorded_feeds(rng: np.random.Generator, seconds: float = 600.0) -> dict:
+    """
+    Three brokers quoting one symbol. Ticks come in bursts with quiet stretches
+    (some longer than FEED_FREEZE_THRESHOLD), one broker has price spikes and
+    sometimes stops updating its quote, and there are slippage and latency samples.
+    """
+    feeds = {}
+    leader_bids = None
+    for b, broker in enumerate(('Alpha', 'Beta', 'Gamma')):
+        times = np.sort(rng.uniform(0, seconds, int(seconds * 4)))
+        quiet = [(start, start + length) for start, length in zip(rng.uniform(0, seconds, 8), rng.uniform(3, 25, 8))]
+        for start, end in quiet: times = times[(times < start) | (times > end)]
+        times = 1.7e9 + times
+        if leader_bids is None: leader_bids = (times, 1.1 + np.cumsum(rng.normal(0, 1e-5, times.size)))
+        bids = np.interp(times, *leader_bids) + rng.normal(0, 2e-6, times.size)
+        if broker == 'Gamma':
+            bids[rng.choice(times.size, 15, replace=False)] += rng.choice([-1, 1], 15) * 4e-4 # glitches
+            stuck = rng.choice(times.size - 60, 3, replace=False)
+            for i in stuck.tolist(): bids[i:i + 60] = bids[i]
+        asks = bids + rng.uniform(0.5e-5, 2.5e-5, times.size)
+        feed: Feed = backtest._feed(times, bids, asks)
+        slippage_times = np.sort(rng.choice(times, 20, replace=False))
+        feed.update(slippage_time=slippage_times, slippage_pips=rng.normal(0.2 * b, 0.5, 20), slippage_type=rng.integers(0, 2, 20).astype(np.uint8),
+                    latency_time=np.sort(rng.choice(times, 40, replace=False)), latency_ms=rng.uniform(5, 80, 40))
+        feeds[broker] = feed
+    return feeds
+
+def test_skipping_unchanged_symbols_does_not_change_outputs(monkeypatch):
+    feeds = recorded_feeds(np.random.default_rng(16))
+    fields = backtest.SCORE_FIELDS + analysis_engine.DATA_KPI_COLUMNS + ('correlation_with_leader', 'data_integrity_score')
+    cycles = []
+    analyze_symbol = backtest.analyze_symbol
+    def counted(brokers, dirty=True):
+        cycles.append(dirty)
+        return analyze_symbol(brokers, dirty)
+    monkeypatch.setattr(backtest, 'analyze_symbol', counted)
+    skipping = run_symbol('EURUSD', feeds, 0.5, fields)
+    assert 0 < cycles.count(False) < len(cycles) # some cycles were skipped
+
+    # Every cycle dirty and every data KPI recomputed
+    cached_kpis = analysis_engine.get_data_kpis
+    def recomputed_kpis(state):
+        state.data_kpi_cache = (-1, None)
+        return cached_kpis(state)
+    monkeypatch.setattr(backtest, 'symbol_signature', lambda brokers: object())
+    monkeypatch.setattr(analysis_engine, 'get_data_kpis', recomputed_kpis)
+    full = run_symbol('EURUSD', feeds, 0.5, fields)
+
+    assert len(skipping['timestamp']) == len(full['timestamp']) > 1000
+    assert skipping['is_frozen'].any() and not skipping['is_frozen'].all()
+    assert (skipping['data_integrity_score'] < 100).any() # some glitches were verified
+    for name in ('timestamp', 'broker') + fields:
+        np.testing.assert_array_equal(skipping[name], full[name], err_msg=name)
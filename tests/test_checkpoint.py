@@ -0,0 +1,115 @@
+# tests/test_checkpoint.py
+# v14.0: Round trips of broker state through checkpoint capture -> write -> load.
+
+import numpy as np
+import pytest
+
+import checkpoint
+import state_manager
+from tick_buffer import TICK_FIELDS
+
+@pytest.fixture(autouse=True)
+def fresh_states(monkeypatch):
+    monkeypatch.setattr(state_manager, 'instrument_states', {})
+    monkeypatch.setattr(state_manager, 'journal', None)
+
+def populate(state: state_manager.BrokerState, rng: np.random.Generator, start: float, count: int):
+    """Feeds ticks, samples, scores and glitches covering `count` seconds from `start`."""
+    timestamps = start + np.arange(count, dtype=np.float64)
+    bids = 1.1 + np.cumsum(rng.normal(0, 1e-5, count))
+    state.add_ticks(bids, bids + rng.uniform(1e-5, 3e-5, count), timestamps)
+    for t in timestamps[-50:].tolist(): state.add_tick(1.1 + rng.normal(0, 1e-4), 1.1003, t + 0.5)
+    for order_type in ('BUY', 'SELL', 'BUY'): state.add_simulated_slippage(order_type, 1.1)
+    for latency in rng.uniform(5, 50, 20).tolist(): state.add_latency_sample(latency)
+    for t in timestamps[::5].tolist(): state.add_score_to_history(float(rng.uniform(0, 100)), t)
+    state.add_verified_glitch({'timestamp': float(timestamps[-3]), 'bid': 1.2}, 30.0)
+    state.potential_glitches = [state.ticks.record(-1)]
+    state.penalty_score, state.is_leader, state.correlation_with_leader = 12.5, False, 0.87
+
+def track_correlation(state: state_manager.BrokerState, leader: state_manager.BrokerState):
+    state.correlation_tracker.update(leader.broker_name, leader.ticks.timestamp, leader.ticks.bid,
+                                     state.ticks.timestamp, state.ticks.bid)
+
+def assert_same_state(restored: state_manager.BrokerState, live: state_manager.BrokerState):
+    assert restored.ticks.total == live.ticks.total
+    for name in TICK_FIELDS: np.testing.assert_array_equal(restored.ticks.last(name), live.ticks.last(name))
+    assert list(restored.tick_intervals) == list(live.tick_intervals)
+    assert list(restored.price_change_stats.values) == list(live.price_change_stats.values)
+    assert restored.price_change_stats.std == pytest.approx(live.price_change_stats.std, rel=1e-9)
+    assert list(restored.slippage_samples) == list(live.slippage_samples)
+    assert list(restored.latency_samples) == list(live.latency_samples)
+
+    history, live_history = restored.quality_score_history, live.quality_score_history
+    assert len(history) == len(live_history)
+    np.testing.assert_array_equal(history.last(len(history)), live_history.last(len(live_history)))
+    np.testing.assert_array_equal(history.raw.last_timestamps(len(history)), live_history.raw.last_timestamps(len(live_history)))
+    for tiers, live_tiers in ((history.rollups, live_history.rollups), (restored.spread_history, live.spread_history)):
+        for tier, live_tier in zip(tiers, live_tiers):
+            exported, expected = tier.export_state(), live_tier.export_state()
+            for name in expected: np.testing.assert_array_equal(exported[name], expected[name])
+    assert list(restored.glitch_history) == list(live.glitch_history)
+    assert list(restored.verified_glitches) == list(live.verified_glitches)
+    assert restored.potential_glitches == live.potential_glitches
+
+    tracker, live_tracker = restored.correlation_tracker, live.correlation_tracker
+    assert (tracker.leader_name, tracker.cutoff) == (live_tracker.leader_name, live_tracker.cutoff)
+    stream, live_stream = tracker.stream.export_state(), live_tracker.stream.export_state()
+    for name in live_stream: np.testing.assert_array_equal(stream[name], live_stream[name])
+    for name in ('last_update_time', 'last_tick_time', 'current_spread', 'penalty_score',
+                 'last_penalty_decay_time', 'is_leader', 'correlation_with_leader'):
+        assert getattr(restored, name) == getattr(live, name), name
+
+def save_and_reload(path: str, live_states):
+    parts, meta = checkpoint.capture(live_states)
+    meta['journal_position'] = ['segment-0000000000000001.bin', 320]
+    checkpoint.write(path, parts, meta)
+    state_manager.instrument_states = {}
+    position = checkpoint.load(path)
+    return position, state_manager.instrument_states
+
+def test_checkpoint_round_trip(tmp_path):
+    rng = np.random.default_rng(1)
+    leader = state_manager.get_or_create_broker_state('L', 'EURUSD')
+    follower = state_manager.get_or_create_broker_state('F', 'EURUSD')
+    other = state_manager.get_or_create_broker_state('G', 'XAUUSD')
+    for state in (leader, follower, other): populate(state, rng, 1_700_000_000.0, 3000)
+    leader.is_leader = True
+    track_correlation(follower, leader)
+    live = state_manager.instrument_states
+
+    position, restored = save_and_reload(str(tmp_path / 'checkpoint.npz'), live)
+    assert position == ('segment-0000000000000001.bin', 320)
+    assert {symbol: set(brokers) for symbol, brokers in restored.items()} == {'EURUSD': {'L', 'F'}, 'XAUUSD': {'G'}}
+    for symbol, brokers in live.items():
+        for name, state in brokers.items(): assert_same_state(restored[symbol][name], state)
+
+def test_incremental_captures_match_live_state(tmp_path):
+    """Later captures copy only what changed since the previous one; the result must still be complete."""
+    rng = np.random.default_rng(2)
+    leader = state_manager.get_or_create_broker_state('L', 'EURUSD')
+    follower = state_manager.get_or_create_broker_state('F', 'EURUSD')
+    live = state_manager.instrument_states
+    path = str(tmp_path / 'checkpoint.npz')
+    start = 1_700_000_000.0
+    for round_number in range(4):
+        for state in (leader, follower): populate(state, rng, start, 700)
+        track_correlation(follower, leader)
+        if round_number == 1: # a smaller raw score ring wraps between captures
+            follower.apply_settings({'score_history_raw': follower.quality_score_history.resized_raw(60)})
+        start += 700
+        parts, meta = checkpoint.capture(live)
+        checkpoint.write(path, parts, meta)
+
+    state_manager.instrument_states = {}
+    checkpoint.load(path)
+    for name, state in live['EURUSD'].items():
+        restored = state_manager.instrument_states['EURUSD'][name]
+        if name == 'F': restored.apply_settings({'score_history_raw': restored.quality_score_history.resized_raw(60)})
+        assert_same_state(restored, state)
+
+def test_missing_or_foreign_checkpoint_is_ignored(tmp_path):
+    assert checkpoint.load(str(tmp_path / 'missing.npz')) is None
+    parts, meta = checkpoint.capture({})
+    meta['version'] = -1
+    checkpoint.write(str(tmp_path / 'old.npz'), parts, meta)
+    assert checkpoint.load(str(tmp_path / 'old.npz')) is None
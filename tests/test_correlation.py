@@ -0,0 +1,110 @@
+# tests/test_correlation.py
+# v14.0: As-of alignment and correlation checked against pandas and batch Pearson.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import asof_align, pearson, StreamingCorrelation, LeaderCorrelationTracker
+
+def feed(rng: np.random.Generator, count: int, start: float = 0.0):
+    timestamps = start + np.round(np.cumsum(rng.exponential(0.3, count)), 2) # rounding makes shared and repeated timestamps
+    return timestamps, 1.1 + np.cumsum(rng.normal(0, 1e-5, count))
+
+def pandas_reference(leader_ts, leader_values, follower_ts, follower_values) -> float:
+    """What the original code computed, with the union of timestamps sorted."""
+    leader = pd.Series(leader_values, index=leader_ts)
+    follower = pd.Series(follower_values, index=follower_ts)
+    leader, follower = leader[~leader.index.duplicated(keep='last')], follower[~follower.index.duplicated(keep='last')]
+    aligned = pd.concat([leader, follower], axis=1, sort=True).ffill().bfill()
+    return aligned[0].corr(aligned[1])
+
+@pytest.mark.parametrize('seed', range(5))
+def test_asof_correlation_matches_pandas(seed):
+    rng = np.random.default_rng(seed)
+    leader_ts, leader_values = feed(rng, 400)
+    follower_ts, follower_values = feed(rng, 300, start=1.5)
+    order = rng.permutation(follower_ts.size) # arrival order need not be time order
+    follower_ts, follower_values = follower_ts[order], follower_values[order]
+    grid, leader_aligned, follower_aligned = asof_align(leader_ts, leader_values, follower_ts, follower_values)
+    assert np.all(np.diff(grid) > 0)
+    assert pearson(leader_aligned, follower_aligned) == pytest.approx(
+        pandas_reference(leader_ts, leader_values, follower_ts, follower_values), abs=1e-12)
+
+def test_asof_keeps_the_last_value_of_a_repeated_timestamp():
+    grid, leader, follower = asof_align(np.array([1.0, 2.0, 2.0, 4.0]), np.array([10.0, 20.0, 21.0, 40.0]),
+                                        np.array([0.5, 3.0]), np.array([5.0, 30.0]))
+    assert grid.tolist() == [0.5, 1.0, 2.0, 3.0, 4.0]
+    assert leader.tolist() == [10.0, 10.0, 21.0, 21.0, 40.0] # back fill before the first tick
+    assert follower.tolist() == [5.0, 5.0, 5.0, 30.0, 30.0]
+
+def test_pearson_without_variance_is_nan():
+    assert np.isnan(pearson(np.ones(10), np.arange(10.0)))
+
+def weighted_pearson(x: np.ndarray, y: np.ndarray, weights: np.ndarray) -> float:
+    mx, my = np.average(x, weights=weights), np.average(y, weights=weights)
+    cov = np.average((x - mx) * (y - my), weights=weights)
+    return cov / np.sqrt(np.average((x - mx) ** 2, weights=weights) * np.average((y - my) ** 2, weights=weights))
+
+def correlated_samples(rng: np.random.Generator, count: int):
+    x = 1.1 + np.cumsum(rng.normal(0, 1e-5, count))
+    return x, x + rng.normal(0, 2e-5, count)
+
+def test_window_mode_matches_batch_pearson():
+    rng = np.random.default_rng(11)
+    x, y = correlated_samples(rng, 6000)
+    stream = StreamingCorrelation("window", window=500)
+    pushed = 0
+    for size in rng.integers(1, 120, 200).tolist() + [700, 3, 1]: # includes a push larger than the window
+        if pushed + size > x.size: break
+        stream.push(x[pushed:pushed + size], y[pushed:pushed + size])
+        pushed += size
+        start = max(0, pushed - 500)
+        assert stream.count == pushed - start
+        if stream.count >= 3:
+            assert stream.value() == pytest.approx(pearson(x[start:pushed], y[start:pushed]), abs=1e-9)
+
+def test_ewm_mode_matches_weighted_pearson():
+    rng = np.random.default_rng(12)
+    x, y = correlated_samples(rng, 3000)
+    stream = StreamingCorrelation("ewm", halflife=200)
+    for chunk in np.array_split(np.arange(x.size), 37): stream.push(x[chunk], y[chunk])
+    weights = 0.5 ** (np.arange(x.size - 1, -1, -1) / 200)
+    assert stream.value() == pytest.approx(weighted_pearson(x, y, weights), abs=1e-9)
+
+def test_identical_feeds_are_flagged():
+    stream = StreamingCorrelation("window", window=50)
+    values = np.linspace(1.1, 1.2, 30)
+    stream.push(values, values.copy())
+    assert stream.identical
+    stream.push(np.array([1.3]), np.array([1.31]))
+    assert not stream.identical
+
+@pytest.mark.parametrize('lag', [0.0, 2.0])
+def test_tracker_matches_batch_alignment(lag):
+    """Passes over growing buffers consume the same as-of grid a batch alignment of everything would."""
+    rng = np.random.default_rng(13)
+    leader_ts, leader_values = feed(rng, 3000)
+    follower_ts = np.sort(leader_ts[rng.random(leader_ts.size) < 0.6] + rng.uniform(0, 0.05, 1))
+    follower_values = np.interp(follower_ts, leader_ts, leader_values) + rng.normal(0, 5e-6, follower_ts.size)
+    tracker = LeaderCorrelationTracker("window", window=100_000, halflife=500, lag=lag)
+    for end in np.linspace(10, leader_ts[-1] + 1, 40).tolist():
+        tracker.update('L', leader_ts[leader_ts < end], leader_values[leader_ts < end],
+                       follower_ts[follower_ts < end], follower_values[follower_ts < end])
+    grid, leader_aligned, follower_aligned = asof_align(leader_ts, leader_values, follower_ts, follower_values)
+    consumed = grid <= tracker.cutoff
+    assert tracker.cutoff <= grid[-1] - lag
+    assert tracker.stream.count == np.count_nonzero(consumed)
+    assert tracker.correlation() == pytest.approx(pearson(leader_aligned[consumed], follower_aligned[consumed]), abs=1e-9)
+
+def test_tracker_lag_keeps_late_ticks():
+    """A tick released late (stamped before the newest tick) is still aligned while it is within the lag."""
+    tracker = LeaderCorrelationTracker("window", window=1000, halflife=500, lag=1.0)
+    leader_ts = np.arange(0.0, 20.0, 0.5)
+    leader_values = 1.1 + 1e-4 * np.sin(leader_ts)
+    follower_ts = leader_ts[leader_ts != 19.0] # 19.0 is still held back by the follower's reorder buffer
+    tracker.update('L', leader_ts, leader_values, follower_ts, leader_values[leader_ts != 19.0])
+    assert tracker.cutoff <= 18.5
+    tracker.update('L', leader_ts, leader_values, leader_ts, leader_values)
+    assert tracker.stream.count == np.count_nonzero(leader_ts <= tracker.cutoff)
+    assert tracker.stream.identical # the late tick was aligned, not skipped
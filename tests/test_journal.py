@@ -0,0 +1,132 @@
+# tests/test_journal.py
+# v14.0: Round trips through the on-disk journal: Journal -> load() / JournalReader.
+
+import asyncio
+import os
+import numpy as np
+import pytest
+
+import journal as tick_journal
+from journal import Journal, JournalReader, KIND_TICK, KIND_SCORE, KIND_GLITCH
+
+def flush(journal: Journal):
+    async def run(): return await journal.flush()
+    return asyncio.run(run())
+
+def close(journal: Journal):
+    asyncio.run(journal.close())
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.time() for segment names and pruning (one tick per call)."""
+    now = [1_700_000_000.0]
+    def fake_time():
+        now[0] += 0.001
+        return now[0]
+    monkeypatch.setattr(tick_journal.time, 'time', fake_time)
+    return now
+
+def test_records_round_trip(tmp_path):
+    journal = Journal(str(tmp_path), 1 << 20, 3600)
+    journal.record(KIND_TICK, 'A', 'EURUSD', 100.0, 1.1, 1.1002)
+    journal.record(KIND_SCORE, 'A', 'EURUSD', 101.0, 87.5)
+    journal.record(KIND_TICK, 'B', 'EURUSD', 102.0, 1.2, 1.2003)
+    journal.record(KIND_GLITCH, 'B', 'EURUSD', 103.0, 1.25, 40.0)
+    flush(journal)
+    close(journal)
+
+    streams, records = tick_journal.load(str(tmp_path), since=0.0)
+    assert streams == [('A', 'EURUSD'), ('B', 'EURUSD')]
+    assert records['kind'].tolist() == [KIND_TICK, KIND_SCORE, KIND_TICK, KIND_GLITCH]
+    assert records['stream'].tolist() == [0, 0, 1, 1]
+    assert records['timestamp'].tolist() == [100.0, 101.0, 102.0, 103.0]
+    assert records['a'].tolist() == [1.1, 87.5, 1.2, 1.25]
+    assert records['b'].tolist() == [1.1002, 0.0, 1.2003, 40.0]
+
+    reader = JournalReader(str(tmp_path))
+    assert reader.stream_id('B', 'EURUSD') == 1
+    assert reader.stream_id('C', 'EURUSD') is None
+    ticks = reader.read(KIND_TICK, 1, 0.0, 200.0)
+    assert ticks['timestamp'].tolist() == [102.0] and ticks['b'].tolist() == [1.2003]
+    assert reader.read(KIND_TICK, 0, 100.5, 200.0).size == 0
+
+def test_load_since_and_after_position(tmp_path):
+    journal = Journal(str(tmp_path), 1 << 20, 3600)
+    for t in range(10): journal.record(KIND_TICK, 'A', 'EURUSD', float(t), 1.0 + t, 2.0 + t)
+    position = flush(journal)
+    for t in range(10, 15): journal.record(KIND_TICK, 'A', 'EURUSD', float(t), 1.0 + t, 2.0 + t)
+    flush(journal)
+    close(journal)
+
+    _, records = tick_journal.load(str(tmp_path), since=5.0)
+    assert records['timestamp'].tolist() == [float(t) for t in range(5, 15)]
+    _, records = tick_journal.load(str(tmp_path), since=0.0, position=position)
+    assert records['timestamp'].tolist() == [float(t) for t in range(10, 15)]
+
+def test_reader_across_segments_and_index_blocks(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(tick_journal, 'INDEX_BLOCK', 8)
+    journal = Journal(str(tmp_path), 20 * tick_journal.JOURNAL_RECORD.itemsize, 10 ** 9)
+    rng = np.random.default_rng(7)
+    timestamps = np.cumsum(rng.uniform(0.1, 1.0, 500))
+    timestamps[::37] -= 3.0 # some records arrive out of order
+    reader = JournalReader(str(tmp_path))
+    for chunk in np.array_split(np.arange(timestamps.size), 25):
+        for i in chunk.tolist():
+            journal.record(KIND_TICK, 'AB'[i % 2], 'EURUSD', float(timestamps[i]), float(i), 0.0)
+        flush(journal)
+        reader.read(KIND_TICK, 0, 0.0, 1.0) # index the segments while they are still growing
+    close(journal)
+    assert len(tick_journal.list_segments(str(tmp_path))) > 1
+
+    for start, end in ((0.0, np.inf), (50.0, 120.0), (timestamps.max() - 5, timestamps.max() + 1)):
+        for stream in (0, 1):
+            expected = [i for i in range(stream, timestamps.size, 2) if start <= timestamps[i] < end]
+            records = reader.read(KIND_TICK, stream, start, end)
+            assert records['a'].astype(int).tolist() == expected
+
+def test_torn_record_is_ignored(tmp_path):
+    journal = Journal(str(tmp_path), 1 << 20, 3600)
+    for t in range(3): journal.record(KIND_TICK, 'A', 'EURUSD', float(t), 1.0, 2.0)
+    flush(journal)
+    close(journal)
+    (_, segment), = tick_journal.list_segments(str(tmp_path))
+    with open(segment, 'ab') as f: f.write(b'\x01' * 10) # crash mid-write
+    _, records = tick_journal.load(str(tmp_path), since=0.0)
+    assert records['timestamp'].tolist() == [0.0, 1.0, 2.0]
+
+def test_stream_names_keep_their_index(tmp_path):
+    names = [('A\tB', 'EURUSD'), ('', 'EURUSD'), ('  ', 'EURUSD'), ('C', 'GBP\tUSD'), ('D', 'EURUSD')]
+    journal = Journal(str(tmp_path), 1 << 20, 3600)
+    for i, (broker, symbol) in enumerate(names): journal.record(KIND_TICK, broker, symbol, float(i), float(i))
+    flush(journal)
+    close(journal)
+
+    streams, records = tick_journal.load(str(tmp_path), since=0.0)
+    assert streams == names
+    assert [streams[stream] for stream in records['stream'].tolist()] == names
+    # A torn last name is dropped when the journal reopens, and new names stay aligned.
+    with open(os.path.join(tmp_path, tick_journal.STREAMS_FILE), 'a', encoding='utf-8') as f: f.write('["torn", "EU')
+    journal = Journal(str(tmp_path), 1 << 20, 3600)
+    assert journal.stream_id('E', 'EURUSD') == len(names)
+    journal.record(KIND_TICK, 'E', 'EURUSD', 10.0, 1.0)
+    flush(journal)
+    close(journal)
+    assert tick_journal.read_streams(str(tmp_path)) == names + [('E', 'EURUSD')]
+
+def test_legacy_streams_file_is_converted(tmp_path):
+    with open(os.path.join(tmp_path, tick_journal.LEGACY_STREAMS_FILE), 'w', encoding='utf-8') as f:
+        f.write('A\tEURUSD\n \t\nB\tEURUSD\n')
+    journal = Journal(str(tmp_path), 1 << 20, 3600)
+    assert journal.stream_id('B', 'EURUSD') == 2
+    assert journal.stream_id('C', 'EURUSD') == 3
+    close(journal)
+    assert not os.path.exists(os.path.join(tmp_path, tick_journal.LEGACY_STREAMS_FILE))
+    assert tick_journal.read_streams(str(tmp_path))[:3] == [('A', 'EURUSD'), (' ', ''), ('B', 'EURUSD')]
+
+def test_stream_count_is_limited(tmp_path):
+    journal = Journal(str(tmp_path), 1 << 20, 3600)
+    journal._stream_count = tick_journal.MAX_STREAMS - 1
+    assert journal.stream_id('last', 'EURUSD') == tick_journal.MAX_STREAMS - 1
+    with pytest.raises(ValueError):
+        journal.stream_id('one too many', 'EURUSD')
+    close(journal)
@@ -0,0 +1,94 @@
+# tests/test_rolling_stats.py
+# v14.0: Incremental window statistics checked against NumPy recomputation.
+
+import numpy as np
+import pytest
+from scipy import stats as scipy_stats
+
+import state_manager
+from rolling_stats import RollingStats, RollingMoments
+
+def price_changes(rng: np.random.Generator, count: int) -> np.ndarray:
+    changes = np.abs(rng.normal(0, 1e-5, count))
+    changes[rng.random(count) < 0.01] += 1e-3 # occasional jumps
+    return changes
+
+def test_rolling_stats_match_numpy_window():
+    rng = np.random.default_rng(3)
+    values = price_changes(rng, 5000)
+    stats = RollingStats(50)
+    for i, value in enumerate(values.tolist()):
+        stats.push(value)
+        window = values[max(0, i - 49):i + 1]
+        assert len(stats) == window.size
+        assert stats.mean == pytest.approx(window.mean(), rel=1e-9, abs=1e-15)
+        assert stats.std == pytest.approx(window.std(), rel=1e-6, abs=1e-12)
+
+def test_extend_and_resized_keep_the_newest_values():
+    rng = np.random.default_rng(4)
+    values = price_changes(rng, 300)
+    pushed, extended = RollingStats(50), RollingStats(50)
+    for value in values[:120].tolist(): pushed.push(value)
+    extended.extend(values[:120])
+    assert list(extended.values) == list(pushed.values)
+    assert extended.mean == pytest.approx(pushed.mean, rel=1e-12)
+    assert extended.std == pytest.approx(pushed.std, rel=1e-9)
+
+    smaller = extended.resized(20)
+    assert list(smaller.values) == values[100:120].tolist()
+    assert smaller.std == pytest.approx(values[100:120].std(), rel=1e-12)
+    assert list(extended.values) == values[70:120].tolist() # the original is untouched
+
+def test_rolling_moments_match_scipy_jarque_bera():
+    rng = np.random.default_rng(6)
+    intervals = np.concatenate((rng.exponential(0.2, 700), rng.normal(0.2, 0.01, 700)))
+    moments = RollingMoments(200)
+    for i, value in enumerate(intervals.tolist()):
+        moments.push(value)
+        window = intervals[max(0, i - 199):i + 1]
+        if window.size < 3 or i % 7: continue
+        deviations = window - window.mean()
+        m2, m3, m4 = moments.central_moments()
+        assert m2 == pytest.approx(np.mean(deviations ** 2), rel=1e-9)
+        assert m3 == pytest.approx(np.mean(deviations ** 3), rel=1e-6, abs=1e-12)
+        assert m4 == pytest.approx(np.mean(deviations ** 4), rel=1e-6)
+        assert moments.jarque_bera_p_value() == pytest.approx(scipy_stats.jarque_bera(window).pvalue, rel=1e-6, abs=1e-12)
+
+def test_rolling_moments_extend_and_constant_values():
+    rng = np.random.default_rng(7)
+    values = rng.exponential(0.2, 450)
+    pushed, extended = RollingMoments(200), RollingMoments(200)
+    for value in values.tolist(): pushed.push(value)
+    extended.extend(values)
+    assert list(extended.values) == list(pushed.values)
+    assert extended.jarque_bera_p_value() == pytest.approx(pushed.jarque_bera_p_value(), rel=1e-9, abs=1e-15)
+    constant = RollingMoments(50)
+    constant.extend(np.full(60, 0.25))
+    assert constant.jarque_bera_p_value() == 1.0
+
+def reference_candidates(bids: np.ndarray, timestamps: np.ndarray, window: int, std_factor: float) -> list:
+    """The original per-tick rule: np.mean/np.std over the last `window` price changes."""
+    changes = np.abs(np.diff(bids, prepend=bids[0]))
+    candidates = []
+    for i in range(window, len(bids)):
+        recent = changes[i - window + 1:i + 1]
+        mean, std = np.mean(recent), np.std(recent)
+        if std > 1e-9 and changes[i] > mean + std_factor * std: candidates.append(timestamps[i])
+    return candidates
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_glitch_candidates_match_reference_rule(monkeypatch, bulk):
+    monkeypatch.setattr(state_manager, 'journal', None)
+    rng = np.random.default_rng(5)
+    count = 20000
+    bids = 1.1 + np.cumsum(rng.normal(0, 1e-5, count) + np.where(rng.random(count) < 0.005, 1e-3, 0.0))
+    timestamps = 1_700_000_000.0 + np.arange(count) * 0.25
+    state = state_manager.BrokerState('A', 'EURUSD')
+    settings = state_manager.runtime_config.current
+    if bulk:
+        state.add_ticks(bids, bids + 2e-5, timestamps)
+    else:
+        for bid, t in zip(bids.tolist(), timestamps.tolist()): state.add_tick(bid, bid + 2e-5, t)
+    expected = reference_candidates(bids, timestamps, settings.GLITCH_DETECTION_WINDOW, settings.DYNAMIC_THRESHOLD_STD_FACTOR)
+    assert len(expected) > 10
+    assert [glitch['timestamp'] for glitch in state.potential_glitches] == expected
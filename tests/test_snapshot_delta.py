@@ -0,0 +1,115 @@
+# tests/test_snapshot_delta.py
+# v14.0: Merge patches checked against RFC 7386 and a client applying them.
+
+import copy
+from typing import Any
+
+import numpy as np
+import pytest
+
+from snapshot_delta import compute_merge_patch, DeltaEncoder
+from config import DELTA_FIELD_STEPS, DELTA_SLOW_FIELDS, DELTA_SLOW_INTERVAL, DELTA_SKIP_FIELDS
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """MergePatch(Target, Patch) as given in RFC 7386 section 2, i.e. what dashboards run."""
+    if not isinstance(patch, dict): return copy.deepcopy(patch)
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None: result.pop(key, None)
+        else: result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+# RFC 7386 Appendix A: (original, patch, result) for every example whose original and result are objects
+RFC_EXAMPLES = [
+    ({"a": "b"}, {"a": "c"}, {"a": "c"}),
+    ({"a": "b"}, {"b": "c"}, {"a": "b", "b": "c"}),
+    ({"a": "b"}, {"a": None}, {}),
+    ({"a": "b", "b": "c"}, {"a": None}, {"b": "c"}),
+    ({"a": ["b"]}, {"a": "c"}, {"a": "c"}),
+    ({"a": "c"}, {"a": ["b"]}, {"a": ["b"]}),
+    ({"a": {"b": "c"}}, {"a": {"b": "d", "c": None}}, {"a": {"b": "d"}}),
+    ({"a": [{"b": "c"}]}, {"a": [1]}, {"a": [1]}),
+    ({"e": None}, {"a": 1}, {"e": None, "a": 1}),
+    ({}, {"a": {"bb": {"ccc": None}}}, {"a": {"bb": {}}}),
+]
+
+@pytest.mark.parametrize("original, rfc_patch, result", RFC_EXAMPLES)
+def test_patch_turns_original_into_result(original, rfc_patch, result):
+    patch = compute_merge_patch(original, result)
+    assert apply_merge_patch(original, patch) == result
+    # The RFC's own patch applies to the same result, and ours never sends more than it
+    assert apply_merge_patch(original, rfc_patch) == result
+    assert set(patch) <= set(rfc_patch)
+
+def test_minimal_patches():
+    assert compute_merge_patch({"a": "b"}, {"a": "c"}) == {"a": "c"}
+    assert compute_merge_patch({"a": "b", "b": "c"}, {"b": "c"}) == {"a": None}
+    assert compute_merge_patch({"a": {"b": "c"}}, {"a": {"b": "d"}}) == {"a": {"b": "d"}}
+    assert compute_merge_patch({"a": {"b": 1, "c": 2}}, {"a": {"b": 1, "c": 2}}) == {}
+    assert compute_merge_patch({"a": [1, 2]}, {"a": [1, 3]}) == {"a": [1, 3]} # lists are replaced whole
+    assert compute_merge_patch({"a": {"b": "c"}}, {"a": "x"}) == {"a": "x"}
+
+def test_random_nested_documents_round_trip():
+    rng = np.random.default_rng(7)
+
+    def value(depth: int, nulls: bool) -> Any:
+        kind = int(rng.integers(0 if nulls else 1, 5 if depth < 3 else 4))
+        if kind == 0: return None
+        if kind == 1: return float(rng.integers(0, 3))
+        if kind == 2: return str(rng.integers(0, 3))
+        if kind == 3: return [int(rng.integers(0, 2))]
+        return document(depth + 1, nulls)
+
+    def document(depth: int, nulls: bool) -> dict:
+        return {key: value(depth, nulls) for key in rng.choice(list("abcdef"), int(rng.integers(0, 5)), replace=False).tolist()}
+
+    for _ in range(500):
+        # A null in a patch means "remove", so only the previous document may hold nulls
+        previous, current = document(0, nulls=True), document(0, nulls=False)
+        assert apply_merge_patch(previous, compute_merge_patch(previous, current)) == current
+
+def analysis_results(rng: np.random.Generator, cycle: int) -> dict:
+    results = {}
+    for symbol in ('EURUSD', 'GBPUSD'):
+        results[symbol] = {}
+        for broker in ('Alpha', 'Beta', 'Gamma')[:2 + cycle % 2]: # a broker comes and goes
+            results[symbol][broker] = {
+                'quality_score': float(80 + rng.normal(0, 0.3)), 'correlation_with_leader': float(rng.uniform(0.9, 1.0)),
+                'feed_stability_score': float(rng.uniform(0, 100)), 'current_spread': float(rng.uniform(0.5, 2.0)),
+                'score_history': [float(v) for v in rng.uniform(0, 100, 5)], 'tps': float(rng.uniform(0, 20)),
+                'is_leader': broker == 'Alpha', 'glitches': int(rng.integers(0, 3)),
+            }
+    return results
+
+def test_client_following_patches_holds_the_encoder_snapshot():
+    rng = np.random.default_rng(11)
+    encoder = DeltaEncoder(DELTA_FIELD_STEPS, DELTA_SLOW_FIELDS, DELTA_SLOW_INTERVAL, DELTA_SKIP_FIELDS)
+    encoder.encode(analysis_results(rng, 0), now=0.0)
+    client = copy.deepcopy(encoder.snapshot) # full snapshot on connect
+    late_client = None
+    for cycle in range(1, 40):
+        results = analysis_results(rng, cycle)
+        patch = encoder.encode(results, now=cycle * 0.5)
+        client = apply_merge_patch(client, patch)
+        assert client.keys() == encoder.view.keys()
+        for symbol, brokers in encoder.view.items():
+            assert client[symbol].keys() == brokers.keys()
+            for broker, entry in brokers.items():
+                # Skipped fields stream on their own channel; everything else is exactly the view
+                assert {k: v for k, v in client[symbol][broker].items() if k not in DELTA_SKIP_FIELDS} == entry
+                assert encoder.snapshot[symbol][broker]['current_spread'] == results[symbol][broker]['current_spread']
+        if late_client is not None: late_client = apply_merge_patch(late_client, patch)
+        if cycle == 20: late_client = copy.deepcopy(encoder.snapshot) # resync mid-stream
+    for symbol, brokers in encoder.view.items():
+        for broker, entry in brokers.items():
+            assert {k: v for k, v in late_client[symbol][broker].items() if k not in DELTA_SKIP_FIELDS} == entry
+
+def test_quantized_and_slow_fields_do_not_resend():
+    encoder = DeltaEncoder({'quality_score': 0.1}, ('tps',), 5.0, ('current_spread',))
+    kpis = {'quality_score': 80.01, 'tps': 3.0, 'current_spread': 1.2}
+    encoder.encode({'EURUSD': {'Alpha': kpis}}, now=0.0)
+    # Sub-step drift, a slow field before its interval and a skipped field: nothing to send
+    assert encoder.encode({'EURUSD': {'Alpha': {'quality_score': 80.04, 'tps': 9.0, 'current_spread': 1.5}}}, now=1.0) == {}
+    assert encoder.snapshot['EURUSD']['Alpha'] == {'quality_score': 80.0, 'tps': 3.0, 'current_spread': 1.5}
+    assert encoder.encode({'EURUSD': {'Alpha': {'quality_score': 80.06, 'tps': 9.0, 'current_spread': 1.5}}}, now=5.0) == \
+        {'EURUSD': {'Alpha': {'quality_score': 80.1, 'tps': 9.0}}}
@@ -0,0 +1,53 @@
+# tests/test_sweep.py
+# v14.0: Sweep scores from cached KPIs checked against live scoring replays.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import runtime_config
+import state_manager
+from backtest import run_symbol
+from sweep import expand_combinations, final_scores, replay_kpis, sweep
+from tests.test_backtest import recorded_feeds
+
+@pytest.fixture(autouse=True)
+def no_journal(monkeypatch):
+    monkeypatch.setattr(state_manager, 'journal', None)
+
+@pytest.fixture(scope='module')
+def feeds():
+    return {'EURUSD': recorded_feeds(np.random.default_rng(23), seconds=300.0)}
+
+def live_scores(feeds: dict, combination: dict) -> np.ndarray:
+    """quality_score of a normal replay with the combination set as the runtime config."""
+    default = runtime_config.current
+    runtime_config.current = default.updated(combination)
+    try:
+        return run_symbol('EURUSD', feeds['EURUSD'], 1.0, ('quality_score',))['quality_score']
+    finally:
+        runtime_config.current = default
+
+@pytest.mark.parametrize("spec", [
+    {},
+    {'WEIGHTS': [{'authenticity': 0.5, 'quote_freeze': 0.3, 'tps': 0.0}], 'QUOTE_FREEZE_UNIQUENESS_RATIO': [0.5]},
+    {'DYNAMIC_THRESHOLD_STD_FACTOR': [2.0], 'WEIGHTS': [{'integrity': 0.6}]},
+])
+def test_final_scores_match_live_quality_score(feeds, spec):
+    [combination] = expand_combinations(spec)
+    kpis = replay_kpis('EURUSD', feeds['EURUSD'], 1.0, combination['DYNAMIC_THRESHOLD_STD_FACTOR'])
+    swept = final_scores(kpis, [combination])[:, 0]
+    live = live_scores(feeds, combination)
+    assert swept.shape == live.shape
+    np.testing.assert_allclose(swept, live, rtol=0, atol=1e-12)
+
+def test_parallel_sweep_matches_serial(feeds):
+    combinations = expand_combinations({'WEIGHTS': {'integrity': [0.1, 0.4], 'quote_freeze': [0.05, 0.2]},
+                                        'DYNAMIC_THRESHOLD_STD_FACTOR': [2.5, 3.5], 'QUOTE_FREEZE_UNIQUENESS_RATIO': [0.1, 0.4]})
+    start = feeds['EURUSD']['Gamma']['tick_time'][0]
+    incidents = pd.DataFrame({'symbol': ['EURUSD'], 'broker': ['Gamma'], 'start': [start + 60], 'end': [start + 120]})
+    serial = sweep(feeds, combinations, incidents, 1.0, workers=1, alert_threshold=50.0)
+    parallel = sweep(feeds, combinations, incidents, 1.0, workers=2, alert_threshold=50.0)
+    assert len(serial) == len(combinations)
+    assert serial['incidents_matched'].eq(1).all()
+    pd.testing.assert_frame_equal(serial.reset_index(drop=True), parallel.reset_index(drop=True))
@@ -0,0 +1,113 @@
+# tests/test_tick_buffer.py
+# v14.0: TickBuffer window means and ordering flag checked against direct scans.
+
+import numpy as np
+import pytest
+
+import runtime_config
+import state_manager
+from analysis_engine import verify_glitches
+from tick_buffer import TickBuffer, TICK_FIELDS
+
+def prefix_tolerance(values: np.ndarray) -> float:
+    """Rounding bound of a mean taken as a difference of two prefix sums over `values`."""
+    return 4 * np.finfo(np.float64).eps * float(np.abs(values).sum())
+
+def fill(buffer: TickBuffer, timestamps: np.ndarray, bids: np.ndarray, bulk: bool):
+    columns = (bids, bids + 2e-5, np.full(bids.shape, 2.0), timestamps, np.abs(np.diff(bids, prepend=bids[0])))
+    if bulk:
+        for start in range(0, len(bids), 97):
+            buffer.extend(*(column[start:start + 97] for column in columns))
+    else:
+        for row in zip(*(column.tolist() for column in columns)):
+            buffer.append(*row)
+
+def brute_window_means(timestamps: np.ndarray, values: np.ndarray, centers: np.ndarray, half_width: float):
+    means, counts = np.full(centers.shape, np.nan), np.zeros(centers.shape, dtype=np.int64)
+    for i, center in enumerate(centers.tolist()):
+        inside = (timestamps >= center - half_width) & (timestamps <= center + half_width)
+        counts[i] = inside.sum()
+        if counts[i]: means[i] = values[inside].mean()
+    return means, counts
+
+def ticks(rng: np.random.Generator, count: int, backwards: bool):
+    timestamps = 1.7e9 + np.cumsum(rng.exponential(0.05, count))
+    if backwards: # a few collector clock steps back
+        for i in rng.choice(count, 5, replace=False).tolist(): timestamps[i:] -= 0.5
+    bids = 1.1 + np.cumsum(rng.normal(0, 1e-5, count))
+    return timestamps, bids
+
+@pytest.mark.parametrize("backwards", [False, True])
+@pytest.mark.parametrize("bulk", [False, True])
+def test_window_means_match_direct_scan(backwards, bulk):
+    rng = np.random.default_rng(13)
+    buffer = TickBuffer(1000)
+    timestamps, bids = ticks(rng, 2500, backwards) # wraps the ring twice
+    fill(buffer, timestamps, bids, bulk)
+    stored_times, stored_bids = timestamps[-1000:], bids[-1000:]
+    np.testing.assert_array_equal(buffer.timestamp, stored_times)
+
+    centers = np.concatenate((rng.uniform(stored_times.min() - 1, stored_times.max() + 1, 300), stored_times[::50]))
+    for half_width in (0.0, 0.1, 0.5, 5.0):
+        means, counts = buffer.window_means('bid', centers, half_width)
+        expected_means, expected_counts = brute_window_means(stored_times, stored_bids, centers, half_width)
+        np.testing.assert_array_equal(counts, expected_counts)
+        np.testing.assert_allclose(means, expected_means, rtol=0, atol=prefix_tolerance(stored_bids), equal_nan=True)
+
+def test_window_means_after_resize_match_direct_scan():
+    rng = np.random.default_rng(14)
+    buffer = TickBuffer(800)
+    timestamps, bids = ticks(rng, 1500, backwards=True)
+    fill(buffer, timestamps, bids, bulk=False)
+    for capacity in (300, 2000):
+        resized = buffer.resized(capacity)
+        kept = min(capacity, 800)
+        centers = rng.uniform(timestamps[-kept], timestamps[-1], 200)
+        means, counts = resized.window_means('bid', centers, 0.5)
+        expected_means, expected_counts = brute_window_means(timestamps[-kept:], bids[-kept:], centers, 0.5)
+        np.testing.assert_array_equal(counts, expected_counts)
+        np.testing.assert_allclose(means, expected_means, rtol=0, atol=prefix_tolerance(bids[-kept:]), equal_nan=True)
+
+def test_monotonic_flag_matches_a_scan_of_the_stored_rows():
+    rng = np.random.default_rng(15)
+    buffer, bulk_buffer = TickBuffer(100), TickBuffer(100)
+    timestamps, bids = ticks(rng, 3000, backwards=False)
+    for i in rng.choice(np.arange(1, 3000), 12, replace=False).tolist(): timestamps[i] -= 1.0 # single late ticks
+    fill(bulk_buffer, timestamps, bids, bulk=True)
+    for n, (bid, timestamp) in enumerate(zip(bids.tolist(), timestamps.tolist()), start=1):
+        buffer.append(bid, bid + 2e-5, 2.0, timestamp, 0.0)
+        stored = buffer.timestamp
+        assert buffer.monotonic == (not np.any(stored[1:] < stored[:-1])), n
+    stored = bulk_buffer.timestamp
+    assert bulk_buffer.monotonic == (not np.any(stored[1:] < stored[:-1]))
+
+    restored = TickBuffer(100)
+    restored.restore({name: buffer.last(name).copy() for name in TICK_FIELDS}, buffer.total)
+    assert restored.monotonic == buffer.monotonic
+
+def test_verify_glitches_matches_the_per_tick_scan(monkeypatch):
+    monkeypatch.setattr(state_manager, 'journal', None)
+    rng = np.random.default_rng(16)
+    leader, follower = state_manager.BrokerState('Leader', 'EURUSD'), state_manager.BrokerState('Follower', 'EURUSD')
+    timestamps, bids = ticks(rng, 5000, backwards=False)
+    leader.add_ticks(bids, bids + 2e-5, timestamps)
+    candidates = [{'timestamp': float(t), 'bid': float(b)}
+                  for t, b in zip(rng.uniform(timestamps[0] - 1, timestamps[-1] + 1, 400), bids[rng.integers(0, 5000, 400)] + rng.normal(0, 3e-4, 400))]
+    follower.potential_glitches = [dict(glitch) for glitch in candidates]
+    verify_glitches(leader, follower)
+
+    # The rule verify_glitches replaced: scan every leader tick for each candidate
+    settings, expected = runtime_config.current, []
+    for glitch in candidates:
+        in_window = np.abs(leader.ticks.timestamp - glitch['timestamp']) * 1000 <= settings.LEADER_FOLLOWER_WINDOW_MS
+        if not in_window.any(): continue
+        deviation_pips = abs(glitch['bid'] - np.mean(leader.ticks.bid[in_window])) * 100000
+        if deviation_pips > settings.GLITCH_VERIFICATION_THRESHOLD_PIPS:
+            expected.append((glitch['timestamp'], min(deviation_pips / 5, 25)))
+
+    verified = [(glitch['timestamp'], glitch['severity']) for glitch in reversed(follower.verified_glitches)]
+    assert 0 < len(expected) < follower.verified_glitches.maxlen
+    assert [t for t, _ in verified] == [t for t, _ in expected]
+    # deviation in pips is the mean difference x1e5, severity is pips / 5
+    severity_tolerance = prefix_tolerance(leader.ticks.bid) * 100000 / 5
+    np.testing.assert_allclose([s for _, s in verified], [s for _, s in expected], rtol=0, atol=severity_tolerance)
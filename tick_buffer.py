@@ -0,0 +1,160 @@
+# tick_buffer.py
+# v14.0: Preallocated columnar ring buffer for per-broker tick history.
+
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+TICK_FIELDS = ('bid', 'ask', 'spread', 'timestamp', 'price_change')
+
+class TickBuffer:
+    """
+    Fixed-capacity tick history stored as one float64 column per field.
+
+    Every row is written twice (at `pos` and `pos + capacity`), so the most
+    recent N rows are always one contiguous slice and can be returned as
+    zero-copy NumPy views. Views are only valid until the next append.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        self._columns: Dict[str, np.ndarray] = {name: np.zeros(2 * self.capacity, dtype=np.float64) for name in TICK_FIELDS}
+        self._next = 0      # slot the next tick will be written to
+        self._count = 0     # number of valid rows (<= capacity)
+        self.total = 0      # ticks appended since creation, used as a version counter
+        self._backstep = -1 # absolute index of the newest tick older than the one before it
+        self._prefix_cache: Dict[str, Tuple[int, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def monotonic(self) -> bool:
+        """True while the stored timestamps are non-decreasing (the last backwards step has been evicted)."""
+        return self._backstep <= self.total - self._count
+
+    def append(self, bid: float, ask: float, spread: float, timestamp: float, price_change: float):
+        if self._count and timestamp < self.latest('timestamp'): self._backstep = self.total
+        pos, mirror = self._next, self._next + self.capacity
+        for name, value in zip(TICK_FIELDS, (bid, ask, spread, timestamp, price_change)):
+            column = self._columns[name]
+            column[pos] = value
+            column[mirror] = value
+        self._next = (pos + 1) % self.capacity
+        if self._count < self.capacity: self._count += 1
+        self.total += 1
+
+    def extend(self, bid: np.ndarray, ask: np.ndarray, spread: np.ndarray, timestamp: np.ndarray, price_change: np.ndarray):
+        """Bulk append() of equal-length columns, oldest first."""
+        n = len(bid)
+        if n == 0: return
+        steps = np.flatnonzero(timestamp[1:] < timestamp[:-1])
+        if steps.size: self._backstep = self.total + int(steps[-1]) + 1
+        elif self._count and timestamp[0] < self.latest('timestamp'): self._backstep = self.total
+        keep = min(n, self.capacity)
+        slots = (self._next + np.arange(n - keep, n)) % self.capacity
+        for name, values in zip(TICK_FIELDS, (bid, ask, spread, timestamp, price_change)):
+            column = self._columns[name]
+            column[slots] = values[n - keep:]
+            column[slots + self.capacity] = values[n - keep:]
+        self._next = (self._next + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+        self.total += n
+
+    def last(self, field: str, n: Optional[int] = None) -> np.ndarray:
+        """Returns a read-only view of the last `n` values of a column (oldest first)."""
+        count = self._count if n is None else max(0, min(int(n), self._count))
+        end = self._next + self.capacity if self._count == self.capacity else self._next
+        view = self._columns[field][end - count:end]
+        view.flags.writeable = False
+        return view
+
+    def latest(self, field: str) -> float:
+        """Returns the newest value of a column. The buffer must not be empty."""
+        return float(self._columns[field][self._next - 1 + self.capacity])
+
+    def record(self, index: int = -1) -> Dict[str, float]:
+        """Materializes one row as a plain dict (used for glitch logs)."""
+        if not -self._count <= index < self._count:
+            raise IndexError("tick index out of range")
+        if index < 0: index += self._count
+        end = self._next + self.capacity if self._count == self.capacity else self._next
+        slot = end - self._count + index
+        return {name: float(self._columns[name][slot]) for name in TICK_FIELDS}
+
+    def prefix_sum(self, field: str) -> np.ndarray:
+        """Cumulative sums of a column with a leading zero, cached until the next append."""
+        cached = self._prefix_cache.get(field)
+        if cached is None or cached[0] != self.total:
+            prefix = np.zeros(self._count + 1, dtype=np.float64)
+            np.cumsum(self.last(field), out=prefix[1:])
+            cached = self._prefix_cache[field] = (self.total, prefix)
+        return cached[1]
+
+    def window_means(self, field: str, centers: np.ndarray, half_width: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Mean of `field` over the ticks whose timestamp lies within `half_width` seconds
+        of each center, plus the tick counts. Uses binary search on the timestamp
+        column and prefix sums, so each window costs O(log n).
+        """
+        timestamps = self.last('timestamp')
+        if not self.monotonic:
+            # Clock went backwards: fall back to a sorted copy (not cached).
+            order = np.argsort(timestamps, kind='stable')
+            timestamps = timestamps[order]
+            prefix = np.concatenate(([0.0], np.cumsum(self.last(field)[order])))
+        else:
+            prefix = self.prefix_sum(field)
+        lo = np.searchsorted(timestamps, centers - half_width, side='left')
+        hi = np.searchsorted(timestamps, centers + half_width, side='right')
+        counts = hi - lo
+        sums = prefix[hi] - prefix[lo]
+        return np.divide(sums, counts, out=np.full(counts.shape, np.nan), where=counts > 0), counts
+
+    def __getstate__(self) -> Dict:
+        # Only the stored rows travel (oldest first), not the mirrored backing arrays.
+        return {'columns': {name: self.last(name).copy() for name in TICK_FIELDS}, 'total': self.total, 'backstep': self._backstep}
+
+    def __setstate__(self, state: Dict):
+        self.__init__(max(len(state['columns']['bid']), 1))
+        self.restore(state['columns'], state['total'], state.get('backstep'))
+
+    def restore(self, columns: Dict[str, np.ndarray], total: int, backstep: Optional[int] = None):
+        """
+        Replaces the contents with oldest-first columns (only the newest `capacity` rows are kept).
+        `backstep` carries the ordering state over; without it the timestamps are scanned once.
+        """
+        count = min(len(columns['bid']), self.capacity)
+        for name in TICK_FIELDS:
+            values = columns[name][len(columns[name]) - count:]
+            self._columns[name][:count] = values
+            self._columns[name][self.capacity:self.capacity + count] = values
+        self._count, self._next, self.total = count, count % self.capacity, int(total)
+        if backstep is None:
+            steps = np.flatnonzero(self.last('timestamp')[1:] < self.last('timestamp')[:-1])
+            backstep = self.total - count + int(steps[-1]) + 1 if steps.size else -1
+        self._backstep = int(backstep)
+        self._prefix_cache = {}
+
+    def resized(self, capacity: int) -> 'TickBuffer':
+        """A copy with a different capacity, holding the newest rows that fit (all of them when growing)."""
+        state = self.__getstate__()
+        clone = TickBuffer(capacity)
+        clone.restore(state['columns'], state['total'], state['backstep'])
+        return clone
+
+    def copy(self) -> 'TickBuffer':
+        """A compact, independent copy of the stored rows (capacity = current length)."""
+        clone = TickBuffer.__new__(TickBuffer)
+        clone.__setstate__(self.__getstate__())
+        return clone
+
+    # Column shortcuts over the whole stored window.
+    @property
+    def bid(self) -> np.ndarray: return self.last('bid')
+    @property
+    def ask(self) -> np.ndarray: return self.last('ask')
+    @property
+    def spread(self) -> np.ndarray: return self.last('spread')
+    @property
+    def timestamp(self) -> np.ndarray: return self.last('timestamp')
+    @property
+    def price_change(self) -> np.ndarray: return self.last('price_change')